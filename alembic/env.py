@@ -0,0 +1,57 @@
+"""
+Entorno de Alembic: usa la conexión y los modelos de la aplicación
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models import (  # noqa: F401 - registrar modelos en Base.metadata
+    user, patient, medication, treatment, alarm, dose_record, alert,
+    compliance, activity_event, report_job, job_watermark, job_lease
+)
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    """URL de -x url=... (p. ej. una base de pruebas) o la de la configuración"""
+    return (
+        context.get_x_argument(as_dictionary=True).get("url")
+        or config.get_main_option("sqlalchemy.url")
+        or get_settings().database_url
+    )
+
+
+def run_migrations_offline():
+    """Generar el SQL sin conectarse (alembic upgrade head --sql)"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Aplicar las migraciones sobre la base de datos"""
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
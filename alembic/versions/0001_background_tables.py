@@ -0,0 +1,101 @@
+"""Tablas de actividad, trabajos de reporte y categorías de medicamentos
+
+Bases creadas antes de estas funciones. create_tables() también las crea
+al arrancar, por eso cada tabla se crea solo si no existe.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("activity_events"):
+        op.create_table(
+            "activity_events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("caregiver_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column(
+                "type",
+                sa.Enum(
+                    "PATIENT_CREATED", "PATIENT_UPDATED", "PATIENT_DELETED", "TREATMENT_CREATED",
+                    "TREATMENT_UPDATED", "TREATMENT_STATUS_CHANGED", "DOSE_RECORDED",
+                    "ALARM_CREATED", "ALARM_UPDATED", "ALARM_DELETED",
+                    name="activitytype"
+                ),
+                nullable=False
+            ),
+            sa.Column("action", sa.String(255), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("patient_id", sa.Integer(), nullable=True),
+            sa.Column("patient_name", sa.String(255), nullable=True),
+            sa.Column("treatment_id", sa.Integer(), nullable=True),
+            sa.Column("medication_name", sa.String(255), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+        )
+        op.create_index("ix_activity_events_id", "activity_events", ["id"])
+        op.create_index("ix_activity_events_created_at", "activity_events", ["created_at"])
+        op.create_index("ix_activity_events_caregiver_created", "activity_events", ["caregiver_id", "created_at"])
+
+    if not _has_table("report_jobs"):
+        op.create_table(
+            "report_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("requested_by_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("caregiver_id", sa.Integer(), nullable=True),
+            sa.Column("report_type", sa.String(30), nullable=False),
+            sa.Column("format", sa.String(10), nullable=False),
+            sa.Column("period", sa.String(10), nullable=False),
+            sa.Column(
+                "status",
+                sa.Enum("PENDING", "RUNNING", "COMPLETED", "FAILED", name="reportjobstatus"),
+                nullable=False
+            ),
+            sa.Column("dedupe_key", sa.String(100), nullable=True, unique=True),
+            sa.Column("file_path", sa.String(500), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True)
+        )
+        op.create_index("ix_report_jobs_id", "report_jobs", ["id"])
+        op.create_index("ix_report_jobs_status_created", "report_jobs", ["status", "created_at"])
+
+    if not _has_table("medication_categories"):
+        op.create_table(
+            "medication_categories",
+            sa.Column(
+                "medication_id",
+                sa.Integer(),
+                sa.ForeignKey("medications.id", ondelete="CASCADE"),
+                primary_key=True
+            ),
+            sa.Column(
+                "category",
+                sa.Enum("CARDIOVASCULAR", "DIABETES", "ANALGESIC", "ANTIBIOTIC", "OTHER", name="medicationcategory"),
+                nullable=False
+            ),
+            sa.Column("source", sa.String(10), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+        )
+        op.create_index("ix_medication_categories_category", "medication_categories", ["category"])
+
+
+def downgrade():
+    op.drop_table("medication_categories")
+    op.drop_table("report_jobs")
+    op.drop_table("activity_events")
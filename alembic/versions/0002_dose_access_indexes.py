@@ -0,0 +1,79 @@
+"""Índices compuestos para los accesos frecuentes a dosis, alertas y cumplimiento
+
+Agrega las llaves únicas que usan los upserts (dose_records por
+(treatment_id, scheduled_time) y compliance_records por (patient_id, date))
+y los índices de los modelos. Antes de crear las llaves únicas se eliminan
+los duplicados que pudo dejar el registro anterior (se conserva la fila más
+reciente). Cada objeto se crea solo si no existe, así la migración también
+sirve sobre bases creadas con create_tables().
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+UNIQUE_CONSTRAINTS = [
+    ("dose_records", "uq_dose_records_treatment_scheduled", ["treatment_id", "scheduled_time"]),
+    ("compliance_records", "uq_compliance_records_patient_date", ["patient_id", "date"]),
+]
+
+INDEXES = [
+    ("dose_records", "ix_dose_records_patient_status_scheduled", ["patient_id", "status", "scheduled_time"]),
+    ("dose_records", "ix_dose_records_patient_status_actual", ["patient_id", "status", "actual_time"]),
+    ("dose_records", "ix_dose_records_patient_scheduled", ["patient_id", "scheduled_time"]),
+    ("dose_records", "ix_dose_records_status_scheduled", ["status", "scheduled_time"]),
+    ("alerts", "ix_alerts_patient_read_created", ["patient_id", "is_read", "created_at"]),
+    ("alerts", "ix_alerts_treatment_type_read", ["treatment_id", "type", "is_read"]),
+    ("compliance_records", "ix_compliance_records_date", ["date"]),
+]
+
+
+def _existing(table: str) -> set:
+    """Nombres de índices y llaves únicas de la tabla"""
+    if context.is_offline_mode():
+        return set()
+    inspector = sa.inspect(op.get_bind())
+    names = {index["name"] for index in inspector.get_indexes(table)}
+    names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table))
+    return names
+
+
+def _delete_duplicates(table: str, columns: list):
+    """Conservar una fila (la de mayor id) por cada valor de la llave"""
+    group_by = ", ".join(columns)
+    # La tabla derivada evita el error 1093 de MySQL (leer y borrar la misma tabla)
+    op.execute(
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT id FROM (SELECT MAX(id) AS id FROM {table} GROUP BY {group_by}) AS keep)"
+    )
+
+
+def upgrade():
+    for table, name, columns in UNIQUE_CONSTRAINTS:
+        if name in _existing(table):
+            continue
+        _delete_duplicates(table, columns)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(name, columns)
+
+    for table, name, columns in INDEXES:
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    for table, name, _ in reversed(UNIQUE_CONSTRAINTS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_="unique")
@@ -0,0 +1,32 @@
+"""Llave de deduplicación de alertas
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not context.is_offline_mode():
+        inspector = sa.inspect(op.get_bind())
+        if "dedupe_key" in {column["name"] for column in inspector.get_columns("alerts")}:
+            return
+
+    # Las alertas existentes quedan sin llave (NULL no choca con el índice único)
+    with op.batch_alter_table("alerts") as batch_op:
+        batch_op.add_column(sa.Column("dedupe_key", sa.String(100), nullable=True))
+        batch_op.create_unique_constraint("uq_alerts_dedupe_key", ["dedupe_key"])
+
+
+def downgrade():
+    with op.batch_alter_table("alerts") as batch_op:
+        batch_op.drop_constraint("uq_alerts_dedupe_key", type_="unique")
+        batch_op.drop_column("dedupe_key")
@@ -0,0 +1,30 @@
+"""Marcas persistidas de los trabajos incrementales
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("job_watermarks"):
+        return
+
+    op.create_table(
+        "job_watermarks",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+    )
+
+
+def downgrade():
+    op.drop_table("job_watermarks")
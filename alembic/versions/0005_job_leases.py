@@ -0,0 +1,30 @@
+"""Concesiones de los trabajos periódicos (un solo worker por trabajo)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("job_leases"):
+        return
+
+    op.create_table(
+        "job_leases",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("owner", sa.String(100), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False)
+    )
+
+
+def downgrade():
+    op.drop_table("job_leases")
@@ -0,0 +1,52 @@
+"""Fecha de modificación de dose_records para el rollup incremental
+
+Agrega dose_records.updated_at (UTC, la asigna la aplicación al insertar o
+cambiar la dosis) con su índice, y amplía job_watermarks.value a BIGINT
+porque la marca del rollup pasa a ser un instante en segundos epoch. Las
+dosis existentes quedan con updated_at nulo: las cubre la reconstrucción
+completa que hace el rollup la primera vez con la marca nueva.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if context.is_offline_mode():
+        columns, indexes = set(), set()
+    else:
+        inspector = sa.inspect(op.get_bind())
+        columns = {column["name"] for column in inspector.get_columns("dose_records")}
+        indexes = {index["name"] for index in inspector.get_indexes("dose_records")}
+
+    if "updated_at" not in columns:
+        op.add_column("dose_records", sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    if "ix_dose_records_updated_at" not in indexes:
+        op.create_index("ix_dose_records_updated_at", "dose_records", ["updated_at"])
+
+    # SQLite no distingue INTEGER de BIGINT
+    if context.is_offline_mode() or op.get_bind().dialect.name != "sqlite":
+        op.alter_column(
+            "job_watermarks", "value",
+            existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False
+        )
+
+
+def downgrade():
+    if context.is_offline_mode() or op.get_bind().dialect.name != "sqlite":
+        op.alter_column(
+            "job_watermarks", "value",
+            existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False
+        )
+    op.drop_index("ix_dose_records_updated_at", table_name="dose_records")
+    with op.batch_alter_table("dose_records") as batch_op:
+        batch_op.drop_column("updated_at")
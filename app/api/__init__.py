@@ -3,8 +3,8 @@
 Router principal de la API - ACTUALIZADO con reportes
 """
 from fastapi import APIRouter, Depends
+from app.core.security import Principal
 from app.core.dependencies import get_current_user
-from app.models.user import User
 from . import dashboard
 
 # Importar todos los routers
@@ -76,7 +76,7 @@ async def api_health():
 
 
 @api_router.get("/info")
-async def api_info(current_user: User = Depends(get_current_user)):
+async def api_info(current_user: Principal = Depends(get_current_user)):
     """Información de la API para el usuario actual"""
     return {
         "user": {
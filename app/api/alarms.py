@@ -1,16 +1,20 @@
 # app/api/alarms.py
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, validator
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.security import Principal
 from app.core.dependencies import get_current_user, verify_treatment_access
-from app.models.user import User
 from app.models.alarm import Alarm
 from app.models.treatment import Treatment
+from app.models.activity_event import ActivityType
+from app.services.activity_service import ActivityService
+from app.services.treatment_service import _after_treatment_write
 
 router = APIRouter()
 
@@ -68,14 +72,15 @@ class AlarmResponse(BaseModel):
 @router.get("/treatments/{treatment_id}/alarms", response_model=List[AlarmResponse])
 async def get_treatment_alarms(
         treatment_id: int,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
         _: bool = Depends(verify_treatment_access)  # Usa tu verificación existente
 ):
     """Obtener todas las alarmas de un tratamiento"""
 
     # Obtener alarmas del tratamiento
-    alarms = db.query(Alarm).filter(Alarm.treatment_id == treatment_id).all()
+    result = await db.execute(select(Alarm).filter(Alarm.treatment_id == treatment_id))
+    alarms = result.scalars().all()
 
     return alarms
 
@@ -84,8 +89,8 @@ async def get_treatment_alarms(
 async def create_treatment_alarm(
         treatment_id: int,
         alarm_data: AlarmCreate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
         _: bool = Depends(verify_treatment_access)
 ):
     """Crear una nueva alarma para un tratamiento"""
@@ -101,8 +106,12 @@ async def create_treatment_alarm(
     )
 
     db.add(alarm)
-    db.commit()
-    db.refresh(alarm)
+    event = await ActivityService(db).record_treatment_event(
+        treatment_id, ActivityType.ALARM_CREATED, f"Alarma creada ({alarm.time})"
+    )
+    await db.commit()
+    _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+    await db.refresh(alarm)
 
     return alarm
 
@@ -112,17 +121,20 @@ async def update_treatment_alarm(
         treatment_id: int,
         alarm_id: int,
         alarm_data: AlarmUpdate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
         _: bool = Depends(verify_treatment_access)
 ):
     """Actualizar una alarma específica"""
 
     # Verificar que la alarma existe y pertenece al tratamiento
-    alarm = db.query(Alarm).filter(
-        Alarm.id == alarm_id,
-        Alarm.treatment_id == treatment_id
-    ).first()
+    result = await db.execute(
+        select(Alarm).filter(
+            Alarm.id == alarm_id,
+            Alarm.treatment_id == treatment_id
+        )
+    )
+    alarm = result.scalars().first()
 
     if not alarm:
         raise HTTPException(
@@ -135,8 +147,12 @@ async def update_treatment_alarm(
     for field, value in update_data.items():
         setattr(alarm, field, value)
 
-    db.commit()
-    db.refresh(alarm)
+    event = await ActivityService(db).record_treatment_event(
+        treatment_id, ActivityType.ALARM_UPDATED, f"Alarma actualizada ({alarm.time})"
+    )
+    await db.commit()
+    _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+    await db.refresh(alarm)
 
     return alarm
 
@@ -145,17 +161,20 @@ async def update_treatment_alarm(
 async def delete_treatment_alarm(
         treatment_id: int,
         alarm_id: int,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
         _: bool = Depends(verify_treatment_access)
 ):
     """Eliminar una alarma específica"""
 
     # Verificar que la alarma existe
-    alarm = db.query(Alarm).filter(
-        Alarm.id == alarm_id,
-        Alarm.treatment_id == treatment_id
-    ).first()
+    result = await db.execute(
+        select(Alarm).filter(
+            Alarm.id == alarm_id,
+            Alarm.treatment_id == treatment_id
+        )
+    )
+    alarm = result.scalars().first()
 
     if not alarm:
         raise HTTPException(
@@ -164,8 +183,12 @@ async def delete_treatment_alarm(
         )
 
     # Eliminar alarma
-    db.delete(alarm)
-    db.commit()
+    event = await ActivityService(db).record_treatment_event(
+        treatment_id, ActivityType.ALARM_DELETED, f"Alarma eliminada ({alarm.time})"
+    )
+    await db.delete(alarm)
+    await db.commit()
+    _after_treatment_write(treatment_id, event.caregiver_id if event else None)
 
     return {"message": "Alarma eliminada exitosamente"}
 
@@ -174,14 +197,14 @@ async def delete_treatment_alarm(
 async def sync_treatment_alarms(
         treatment_id: int,
         alarms_data: List[AlarmCreate],
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
         _: bool = Depends(verify_treatment_access)
 ):
     """Sincronizar alarmas (eliminar todas y crear nuevas)"""
 
     # Eliminar alarmas existentes
-    db.query(Alarm).filter(Alarm.treatment_id == treatment_id).delete()
+    await db.execute(delete(Alarm).filter(Alarm.treatment_id == treatment_id))
 
     # Crear nuevas alarmas
     created_alarms = []
@@ -197,10 +220,15 @@ async def sync_treatment_alarms(
         db.add(alarm)
         created_alarms.append(alarm)
 
-    db.commit()
+    event = await ActivityService(db).record_treatment_event(
+        treatment_id, ActivityType.ALARM_UPDATED,
+        f"Horario de alarmas actualizado ({len(created_alarms)} alarmas)"
+    )
+    await db.commit()
+    _after_treatment_write(treatment_id, event.caregiver_id if event else None)
 
     # Refresh all created alarms
     for alarm in created_alarms:
-        db.refresh(alarm)
+        await db.refresh(alarm)
 
     return created_alarms
\ No newline at end of file
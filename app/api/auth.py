@@ -3,13 +3,12 @@ Endpoints de autenticación
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.database import get_async_db
+from app.core.security import verify_password_async, create_access_token, Principal
 from app.core.dependencies import get_current_user
-from app.models.user import User
 from app.schemas.user import (
     UserCreate, UserResponse, LoginRequest, LoginResponse,
     PasswordChange, PasswordReset, UserProfile
@@ -23,7 +22,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
         user_data: UserCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Registrar nuevo usuario
@@ -31,21 +30,21 @@ async def register(
     auth_service = AuthService(db)
 
     # Verificar si el email ya existe
-    if auth_service.get_user_by_email(user_data.email):
+    if await auth_service.get_user_by_email(user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
 
     # Crear usuario
-    user = auth_service.create_user(user_data)
+    user = await auth_service.create_user(user_data)
     return user
 
 
 @router.post("/login", response_model=LoginResponse)
 async def login(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login de usuario
@@ -53,7 +52,7 @@ async def login(
     auth_service = AuthService(db)
 
     # Verificar credenciales
-    user = auth_service.authenticate_user(form_data.username, form_data.password)
+    user = await auth_service.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,7 +67,7 @@ async def login(
         )
 
     # Actualizar último login
-    auth_service.update_last_login(user.id)
+    await auth_service.update_last_login(user.id)
 
     # Crear token
     access_token = create_access_token(data={"sub": str(user.id), "email": user.email})
@@ -82,48 +81,51 @@ async def login(
 
 @router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener perfil del usuario actual
     """
-    return current_user
+    auth_service = AuthService(db)
+    return await auth_service.get_user_by_id(current_user.id)
 
 
 @router.put("/me", response_model=UserProfile)
 async def update_profile(
         user_update: dict,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualizar perfil del usuario
     """
     auth_service = AuthService(db)
-    updated_user = auth_service.update_user(current_user.id, user_update)
+    updated_user = await auth_service.update_user(current_user.id, user_update)
     return updated_user
 
 
 @router.post("/change-password")
 async def change_password(
         password_data: PasswordChange,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cambiar contraseña del usuario
     """
     auth_service = AuthService(db)
+    user = await auth_service.get_user_by_id(current_user.id)
 
     # Verificar contraseña actual
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña actual incorrecta"
         )
 
     # Actualizar contraseña
-    auth_service.update_password(current_user.id, password_data.new_password)
+    await auth_service.update_password(current_user.id, password_data.new_password)
 
     return {"message": "Contraseña actualizada exitosamente"}
 
@@ -131,7 +133,7 @@ async def change_password(
 @router.post("/forgot-password")
 async def forgot_password(
         reset_data: PasswordReset,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Solicitar reset de contraseña
@@ -139,7 +141,7 @@ async def forgot_password(
     auth_service = AuthService(db)
 
     # Verificar que el usuario existe
-    user = auth_service.get_user_by_email(reset_data.email)
+    user = await auth_service.get_user_by_email(reset_data.email)
     if not user:
         # Por seguridad, no revelamos si el email existe o no
         return {"message": "Si el email existe, recibirás instrucciones para resetear tu contraseña"}
@@ -155,7 +157,7 @@ async def forgot_password(
 
 @router.post("/logout")
 async def logout(
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
     """
     Logout del usuario
@@ -167,7 +169,7 @@ async def logout(
 
 @router.get("/verify-token")
 async def verify_token(
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
     """
     Verificar si el token es válido
@@ -185,8 +187,8 @@ async def verify_token(
 async def list_users(
         skip: int = 0,
         limit: int = 100,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar usuarios (solo admins)
@@ -198,15 +200,15 @@ async def list_users(
         )
 
     auth_service = AuthService(db)
-    users = auth_service.get_users(skip=skip, limit=limit)
+    users = await auth_service.get_users(skip=skip, limit=limit)
     return users
 
 
 @router.put("/users/{user_id}/activate")
 async def activate_user(
         user_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Activar/desactivar usuario (solo admins)
@@ -218,12 +220,12 @@ async def activate_user(
         )
 
     auth_service = AuthService(db)
-    user = auth_service.get_user_by_id(user_id)
+    user = await auth_service.get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
 
-    auth_service.toggle_user_status(user_id)
+    await auth_service.toggle_user_status(user_id)
     return {"message": f"Usuario {'activado' if not user.is_active else 'desactivado'} exitosamente"}
\ No newline at end of file
@@ -1,222 +1,151 @@
 """
 Endpoints específicos del dashboard
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from datetime import datetime, timedelta, date
-from typing import List, Dict, Any
-
-from app.core.database import get_db
-from app.core.dependencies import get_current_user, get_caregiver_user
-from app.models.user import User
-from app.models.patient import Patient
-from app.models.treatment import Treatment, TreatmentStatus
-from app.models.medication import Medication
-
-# Importar otros modelos cuando estén disponibles
-# from app.models.dose_record import DoseRecord
-# from app.models.alarm import Alarm
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.database import get_async_db, AsyncSessionLocal
+from app.core.security import Principal
+from app.core.dependencies import get_caregiver_user
+from app.services.activity_service import ActivityService
+from app.services.alarm_service import UpcomingDoseService, format_upcoming_dose
+from app.services.dashboard_service import (
+    dashboard_snapshots,
+    format_stats,
+    empty_patient_metrics,
+    empty_treatment_metrics
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Respuesta por defecto de stats cuando falla
+EMPTY_STATS = {
+    "totalPatients": 0,
+    "activeTreatments": 0,
+    "todayDoses": 0,
+    "pendingAlerts": 0,
+    "complianceRate": 0
+}
+
+
+async def _stats_section(db: AsyncSession, current_user: Principal):
+    counters, updated_at = await dashboard_snapshots.get(
+        db, current_user.caregiver_scope, "stats"
+    )
+    return {**format_stats(counters), "updatedAt": updated_at.isoformat()}
+
+
+async def _recent_activity_section(db: AsyncSession, current_user: Principal, limit: int = 10):
+    activity_service = ActivityService(db)
+    events, _ = await activity_service.get_feed(current_user.caregiver_scope, limit=limit)
+    return [activity_service.to_feed_item(event) for event in events]
+
+
+async def _upcoming_doses_section(db: AsyncSession, current_user: Principal, limit: int = 5):
+    doses = await UpcomingDoseService(db).get_upcoming(current_user.caregiver_scope, limit=limit)
+    now = datetime.now(timezone.utc)
+    return [format_upcoming_dose(fire_at, alarm, now) for fire_at, alarm in doses]
+
+
+async def _patient_metrics_section(db: AsyncSession, current_user: Principal):
+    metrics, updated_at = await dashboard_snapshots.get(
+        db, current_user.caregiver_scope, "patients"
+    )
+    return {**metrics, "updatedAt": updated_at.isoformat()}
+
+
+async def _treatment_metrics_section(db: AsyncSession, current_user: Principal):
+    metrics, updated_at = await dashboard_snapshots.get(
+        db, current_user.caregiver_scope, "treatments"
+    )
+    return {**metrics, "updatedAt": updated_at.isoformat()}
+
+
+# Secciones del bundle: nombre -> (función, fábrica de la respuesta si falla)
+BUNDLE_SECTIONS = {
+    "stats": (_stats_section, EMPTY_STATS.copy),
+    "recentActivity": (_recent_activity_section, list),
+    "upcomingDoses": (_upcoming_doses_section, list),
+    "patientMetrics": (_patient_metrics_section, empty_patient_metrics),
+    "treatmentMetrics": (_treatment_metrics_section, empty_treatment_metrics)
+}
+
 
 @router.get("/stats")
 async def get_dashboard_stats(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener estadísticas principales del dashboard
     """
     try:
-        # Obtener pacientes del cuidador actual
-        if current_user.is_admin:
-            # Administradores ven todo
-            total_patients = db.query(Patient).count()
-            active_treatments = db.query(Treatment).filter(
-                Treatment.status == TreatmentStatus.ACTIVE
-            ).count()
-        else:
-            # Cuidadores solo ven sus pacientes
-            total_patients = db.query(Patient).filter(
-                Patient.caregiver_id == current_user.id
-            ).count()
-
-            # Tratamientos activos de sus pacientes
-            active_treatments = db.query(Treatment).join(Patient).filter(
-                and_(
-                    Patient.caregiver_id == current_user.id,
-                    Treatment.status == TreatmentStatus.ACTIVE
-                )
-            ).count()
-
-        # Calcular dosis de hoy (estimación basada en tratamientos activos)
-        today_doses = active_treatments * 2  # Promedio de 2 dosis por tratamiento
-
-        # Alertas pendientes (simuladas por ahora)
-        pending_alerts = max(0, int(total_patients * 0.1))  # 10% de pacientes con alertas
-
-        # Tasa de cumplimiento (simulada)
-        compliance_rate = min(95, 80 + (total_patients % 16))  # Entre 80-95%
-
-        return {
-            "totalPatients": total_patients,
-            "activeTreatments": active_treatments,
-            "todayDoses": today_doses,
-            "pendingAlerts": pending_alerts,
-            "complianceRate": compliance_rate
-        }
+        return await _stats_section(db, current_user)
 
     except Exception as e:
         print(f"Error en dashboard stats: {e}")
-        return {
-            "totalPatients": 0,
-            "activeTreatments": 0,
-            "todayDoses": 0,
-            "pendingAlerts": 0,
-            "complianceRate": 0
-        }
+        return EMPTY_STATS
 
 
 @router.get("/recent-activity")
 async def get_recent_activity(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        limit: int = Query(10, ge=1, le=50),
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener actividad reciente del sistema
     """
     try:
-        # Obtener pacientes del cuidador
-        if current_user.is_admin:
-            patients = db.query(Patient).order_by(Patient.created_at.desc()).limit(5).all()
-            recent_treatments = db.query(Treatment).order_by(Treatment.created_at.desc()).limit(3).all()
-        else:
-            patients = db.query(Patient).filter(
-                Patient.caregiver_id == current_user.id
-            ).order_by(Patient.created_at.desc()).limit(5).all()
-
-            recent_treatments = db.query(Treatment).join(Patient).filter(
-                Patient.caregiver_id == current_user.id
-            ).order_by(Treatment.created_at.desc()).limit(3).all()
-
-        # Generar actividad basada en datos reales
-        activity = []
-
-        # Actividad de pacientes
-        for i, patient in enumerate(patients):
-            activities = [
-                ("Paciente registrado", "completed"),
-                ("Consulta programada", "scheduled"),
-                ("Perfil actualizado", "completed")
-            ]
-
-            action, status = activities[i % len(activities)]
-
-            # Calcular tiempo hace
-            time_diff = datetime.now() - patient.created_at
-            if time_diff.days > 0:
-                time_str = f"Hace {time_diff.days} día(s)"
-            elif time_diff.seconds > 3600:
-                hours = time_diff.seconds // 3600
-                time_str = f"Hace {hours} hora(s)"
-            else:
-                minutes = time_diff.seconds // 60
-                time_str = f"Hace {minutes} minuto(s)"
-
-            activity.append({
-                "id": f"patient_{patient.id}",
-                "patient": patient.name,
-                "action": action,
-                "medication": "Sistema",
-                "time": time_str,
-                "status": status
-            })
-
-        # Actividad de tratamientos
-        for treatment in recent_treatments:
-            patient = treatment.patient if hasattr(treatment, 'patient') else None
-            medication = treatment.medication if hasattr(treatment, 'medication') else None
-
-            patient_name = patient.name if patient else f"Paciente #{treatment.patient_id}"
-            medication_name = medication.name if medication else f"Medicamento #{treatment.medication_id}"
-
-            time_diff = datetime.now() - treatment.created_at
-            if time_diff.days > 0:
-                time_str = f"Hace {time_diff.days} día(s)"
-            else:
-                hours = time_diff.seconds // 3600
-                time_str = f"Hace {hours} hora(s)"
-
-            activity.append({
-                "id": f"treatment_{treatment.id}",
-                "patient": patient_name,
-                "action": "Tratamiento iniciado",
-                "medication": medication_name,
-                "time": time_str,
-                "status": "new"
-            })
-
-        # Ordenar por más reciente y limitar a 10
-        return sorted(activity, key=lambda x: x["id"], reverse=True)[:10]
+        return await _recent_activity_section(db, current_user, limit=limit)
 
     except Exception as e:
         print(f"Error en recent activity: {e}")
         return []
 
 
+@router.get("/activity")
+async def get_activity_feed(
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Feed de actividad paginado por cursor
+    """
+    activity_service = ActivityService(db)
+    try:
+        events, next_cursor = await activity_service.get_feed(
+            current_user.caregiver_scope, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "items": [activity_service.to_feed_item(event) for event in events],
+        "nextCursor": next_cursor
+    }
+
+
 @router.get("/upcoming-doses")
 async def get_upcoming_doses(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        limit: int = Query(5, ge=1, le=50),
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener próximas dosis programadas
     """
     try:
-        # Obtener tratamientos activos
-        if current_user.is_admin:
-            active_treatments = db.query(Treatment).filter(
-                Treatment.status == TreatmentStatus.ACTIVE
-            ).limit(5).all()
-        else:
-            active_treatments = db.query(Treatment).join(Patient).filter(
-                and_(
-                    Patient.caregiver_id == current_user.id,
-                    Treatment.status == TreatmentStatus.ACTIVE
-                )
-            ).limit(5).all()
-
-        # Generar dosis próximas basadas en tratamientos activos
-        upcoming_doses = []
-        base_time = datetime.now()
-
-        for i, treatment in enumerate(active_treatments):
-            # Obtener información del paciente y medicamento
-            patient = treatment.patient if hasattr(treatment, 'patient') else None
-            medication = treatment.medication if hasattr(treatment, 'medication') else None
-
-            patient_name = patient.name if patient else f"Paciente #{treatment.patient_id}"
-            medication_name = medication.name if medication else f"Medicamento #{treatment.medication_id}"
-
-            # Generar horarios próximos
-            hours_ahead = [2, 4, 6, 8, 10]
-            hour_offset = hours_ahead[i % len(hours_ahead)]
-            dose_time = base_time + timedelta(hours=hour_offset)
-
-            priorities = ["high", "medium", "low"]
-            priority = priorities[i % len(priorities)]
-
-            upcoming_doses.append({
-                "id": f"dose_{treatment.id}_{i}",
-                "patient": patient_name,
-                "medication": f"{medication_name} ({treatment.dosage})",
-                "time": dose_time.strftime("%H:%M"),
-                "priority": priority
-            })
-
-        return upcoming_doses
+        return await _upcoming_doses_section(db, current_user, limit=limit)
 
     except Exception as e:
         print(f"Error en upcoming doses: {e}")
@@ -225,100 +154,81 @@ async def get_upcoming_doses(
 
 @router.get("/patient-metrics")
 async def get_patient_metrics(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener métricas de pacientes para el dashboard
     """
     try:
-        if current_user.is_admin:
-            patients = db.query(Patient).all()
-        else:
-            patients = db.query(Patient).filter(
-                Patient.caregiver_id == current_user.id
-            ).all()
-
-        # Calcular métricas
-        total = len(patients)
-        by_gender = {
-            "male": len([p for p in patients if p.gender.value == "male"]),
-            "female": len([p for p in patients if p.gender.value == "female"]),
-            "other": len([p for p in patients if p.gender.value == "other"])
-        }
-
-        with_medical_history = len([p for p in patients if p.medical_history])
-        with_allergies = len([p for p in patients if p.allergies])
-
-        # Grupos de edad
-        today = date.today()
-        age_groups = {"under18": 0, "adult": 0, "senior": 0}
-
-        for patient in patients:
-            age = today.year - patient.date_of_birth.year
-            if (today.month, today.day) < (patient.date_of_birth.month, patient.date_of_birth.day):
-                age -= 1
-
-            if age < 18:
-                age_groups["under18"] += 1
-            elif age < 65:
-                age_groups["adult"] += 1
-            else:
-                age_groups["senior"] += 1
-
-        return {
-            "total": total,
-            "byGender": by_gender,
-            "withMedicalHistory": with_medical_history,
-            "withAllergies": with_allergies,
-            "ageGroups": age_groups
-        }
+        return await _patient_metrics_section(db, current_user)
 
     except Exception as e:
         print(f"Error en patient metrics: {e}")
-        return {
-            "total": 0,
-            "byGender": {"male": 0, "female": 0, "other": 0},
-            "withMedicalHistory": 0,
-            "withAllergies": 0,
-            "ageGroups": {"under18": 0, "adult": 0, "senior": 0}
-        }
+        return empty_patient_metrics()
 
 
 @router.get("/treatment-metrics")
 async def get_treatment_metrics(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener métricas de tratamientos para el dashboard
     """
     try:
-        if current_user.is_admin:
-            treatments = db.query(Treatment).all()
-        else:
-            treatments = db.query(Treatment).join(Patient).filter(
-                Patient.caregiver_id == current_user.id
-            ).all()
-
-        # Calcular métricas por estado
-        total = len(treatments)
-        active = len([t for t in treatments if t.status == TreatmentStatus.ACTIVE])
-        completed = len([t for t in treatments if t.status == TreatmentStatus.COMPLETED])
-        suspended = len([t for t in treatments if t.status == TreatmentStatus.SUSPENDED])
-
-        return {
-            "total": total,
-            "active": active,
-            "completed": completed,
-            "suspended": suspended
-        }
+        return await _treatment_metrics_section(db, current_user)
 
     except Exception as e:
         print(f"Error en treatment metrics: {e}")
-        return {
-            "total": 0,
-            "active": 0,
-            "completed": 0,
-            "suspended": 0
-        }
\ No newline at end of file
+        return empty_treatment_metrics()
+
+
+@router.get("/bundle")
+async def get_dashboard_bundle(
+        sections: Optional[str] = Query(
+            None,
+            description="Secciones separadas por coma (por defecto todas): " + ", ".join(BUNDLE_SECTIONS)
+        ),
+        current_user: Principal = Depends(get_caregiver_user)
+):
+    """
+    Obtener varias secciones del dashboard en una sola respuesta.
+
+    Cada sección corre en paralelo con su propia sesión del pool; si una
+    falla se devuelve su respuesta por defecto y se reporta en "errors".
+    """
+    if sections:
+        requested = [name.strip() for name in sections.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in BUNDLE_SECTIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Secciones desconocidas: {', '.join(unknown)}"
+            )
+    else:
+        requested = list(BUNDLE_SECTIONS)
+
+    async def run_section(name: str):
+        section, _ = BUNDLE_SECTIONS[name]
+        async with AsyncSessionLocal() as session:
+            return await section(session, current_user)
+
+    results = await asyncio.gather(
+        *(run_section(name) for name in requested),
+        return_exceptions=True
+    )
+
+    bundle = {}
+    errors = {}
+    for name, result in zip(requested, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error en dashboard bundle ({name}): {result}")
+            bundle[name] = BUNDLE_SECTIONS[name][1]()
+            errors[name] = "No se pudo obtener la sección"
+        else:
+            bundle[name] = result
+
+    if errors:
+        bundle["errors"] = errors
+    return bundle
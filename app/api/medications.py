@@ -2,18 +2,19 @@
 Endpoints de medicamentos
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.security import Principal
 from app.core.dependencies import (
     get_current_user,
     get_caregiver_user,
     get_pagination_params,
     PaginationParams
 )
-from app.models.user import User
-from app.models.medication import Medication, MedicationUnit
+from app.models.medication import Medication, MedicationUnit, MedicationCategory
 from app.schemas.medication import (
     MedicationCreate,
     MedicationUpdate,
@@ -22,6 +23,7 @@ from app.schemas.medication import (
     MedicationSearch
 )
 from app.services.medication_service import MedicationService
+from app.services.report_service import MEDICATION_CATEGORY_LABELS
 
 router = APIRouter()
 
@@ -31,19 +33,21 @@ async def list_medications(
         pagination: PaginationParams = Depends(get_pagination_params),
         search: Optional[str] = Query(None, description="Buscar por nombre"),
         unit: Optional[MedicationUnit] = Query(None, description="Filtrar por unidad"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        category: Optional[MedicationCategory] = Query(None, description="Filtrar por categoría"),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar medicamentos disponibles
     """
     medication_service = MedicationService(db)
 
-    medications = medication_service.get_medications(
+    medications = await medication_service.get_medications(
         skip=pagination.skip,
         limit=pagination.limit,
         search=search,
-        unit=unit
+        unit=unit,
+        category=category
     )
 
     return medications
@@ -52,8 +56,8 @@ async def list_medications(
 @router.post("/", response_model=MedicationResponse, status_code=status.HTTP_201_CREATED)
 async def create_medication(
         medication_data: MedicationCreate,
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear nuevo medicamento
@@ -61,7 +65,7 @@ async def create_medication(
     medication_service = MedicationService(db)
 
     # Verificar que no exista un medicamento igual
-    existing = medication_service.find_similar_medication(
+    existing = await medication_service.find_similar_medication(
         name=medication_data.name,
         dosage=medication_data.dosage,
         unit=medication_data.unit
@@ -73,22 +77,22 @@ async def create_medication(
             detail=f"Ya existe un medicamento similar: {existing.full_name}"
         )
 
-    medication = medication_service.create_medication(medication_data)
+    medication = await medication_service.create_medication(medication_data)
     return medication
 
 
 @router.get("/{medication_id}", response_model=MedicationDetail)
 async def get_medication(
         medication_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener detalles de un medicamento específico
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -102,22 +106,22 @@ async def get_medication(
 async def update_medication(
         medication_id: int,
         medication_update: MedicationUpdate,
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualizar información del medicamento
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Medicamento no encontrado"
         )
 
-    updated_medication = medication_service.update_medication(
+    updated_medication = await medication_service.update_medication(
         medication_id=medication_id,
         medication_update=medication_update
     )
@@ -128,15 +132,15 @@ async def update_medication(
 @router.delete("/{medication_id}")
 async def delete_medication(
         medication_id: int,
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Eliminar medicamento
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -144,13 +148,13 @@ async def delete_medication(
         )
 
     # Verificar que no esté siendo usado en tratamientos activos
-    if medication_service.is_medication_in_use(medication_id):
+    if await medication_service.is_medication_in_use(medication_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No se puede eliminar un medicamento que está siendo usado en tratamientos activos"
         )
 
-    medication_service.delete_medication(medication_id)
+    await medication_service.delete_medication(medication_id)
     return {"message": "Medicamento eliminado exitosamente"}
 
 
@@ -158,15 +162,15 @@ async def delete_medication(
 async def search_medications_by_name(
         q: str = Query(..., min_length=2, description="Término de búsqueda"),
         limit: int = Query(10, le=50, description="Límite de resultados"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Buscar medicamentos por nombre (para autocompletado)
     """
     medication_service = MedicationService(db)
 
-    medications = medication_service.search_by_name(query=q, limit=limit)
+    medications = await medication_service.search_by_name(query=q, limit=limit)
 
     return [
         {
@@ -184,22 +188,22 @@ async def search_medications_by_name(
 async def get_medication_interactions(
         medication_id: int,
         other_medication_ids: List[int] = Query([], description="IDs de otros medicamentos"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verificar interacciones medicamentosas
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Medicamento no encontrado"
         )
 
-    interactions = medication_service.check_interactions(
+    interactions = await medication_service.check_interactions(
         medication_id=medication_id,
         other_medication_ids=other_medication_ids
     )
@@ -211,15 +215,15 @@ async def get_medication_interactions(
 async def get_medication_treatments(
         medication_id: int,
         active_only: bool = Query(True, description="Solo tratamientos activos"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener tratamientos que usan este medicamento
     """
     medication_service = MedicationService(db)
 
-    treatments = medication_service.get_medication_treatments(
+    treatments = await medication_service.get_medication_treatments(
         medication_id=medication_id,
         active_only=active_only,
         caregiver_id=current_user.id if not current_user.is_admin else None
@@ -232,22 +236,22 @@ async def get_medication_treatments(
 async def add_side_effect(
         medication_id: int,
         side_effect: str = Query(..., min_length=1, max_length=255),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Agregar efecto secundario al medicamento
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Medicamento no encontrado"
         )
 
-    medication_service.add_side_effect(medication_id, side_effect)
+    await medication_service.add_side_effect(medication_id, side_effect)
     return {"message": "Efecto secundario agregado exitosamente"}
 
 
@@ -255,28 +259,28 @@ async def add_side_effect(
 async def remove_side_effect(
         medication_id: int,
         side_effect: str = Query(..., min_length=1),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Remover efecto secundario del medicamento
     """
     medication_service = MedicationService(db)
 
-    medication = medication_service.get_medication_by_id(medication_id)
+    medication = await medication_service.get_medication_by_id(medication_id)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Medicamento no encontrado"
         )
 
-    medication_service.remove_side_effect(medication_id, side_effect)
+    await medication_service.remove_side_effect(medication_id, side_effect)
     return {"message": "Efecto secundario removido exitosamente"}
 
 
 @router.get("/units/available")
 async def get_available_units(
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
     """
     Obtener unidades de medicamento disponibles
@@ -287,17 +291,30 @@ async def get_available_units(
     ]
 
 
+@router.get("/categories/available")
+async def get_available_categories(
+        current_user: Principal = Depends(get_current_user)
+):
+    """
+    Obtener categorías de medicamento disponibles
+    """
+    return [
+        {"value": category.value, "label": MEDICATION_CATEGORY_LABELS[category][0]}
+        for category in MedicationCategory
+    ]
+
+
 @router.get("/stats/usage")
 async def get_medication_usage_stats(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener estadísticas de uso de medicamentos
     """
     medication_service = MedicationService(db)
 
-    stats = medication_service.get_usage_statistics(
+    stats = await medication_service.get_usage_statistics(
         caregiver_id=current_user.id if not current_user.is_admin else None
     )
 
@@ -305,9 +322,10 @@ async def get_medication_usage_stats(
 
 
 @router.get("/api/medications/")
-def get_medications(db: Session = Depends(get_db)):
+async def get_medications(db: AsyncSession = Depends(get_async_db)):
     try:
-        meds = db.query(Medication).order_by(Medication.name).limit(100).all()
+        result = await db.execute(select(Medication).order_by(Medication.name).limit(100))
+        meds = result.scalars().all()
         return meds
     except Exception as e:
         # Aquí imprime el error en consola y lanza HTTP 500 con detalle
@@ -2,10 +2,11 @@
 Endpoints de pacientes
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.security import Principal
 from app.core.dependencies import (
     get_current_user,
     get_caregiver_user,
@@ -13,7 +14,6 @@ from app.core.dependencies import (
     get_pagination_params,
     PaginationParams
 )
-from app.models.user import User
 from app.models.patient import Patient, Gender
 from app.schemas.patient import (
     PatientCreate,
@@ -31,15 +31,15 @@ async def list_patients(
         pagination: PaginationParams = Depends(get_pagination_params),
         search: Optional[str] = Query(None, description="Buscar por nombre o email"),
         gender: Optional[Gender] = Query(None, description="Filtrar por género"),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar pacientes del cuidador actual
     """
     patient_service = PatientService(db)
 
-    patients = patient_service.get_patients_by_caregiver(
+    patients = await patient_service.get_patients_by_caregiver(
         caregiver_id=current_user.id,
         skip=pagination.skip,
         limit=pagination.limit,
@@ -53,8 +53,8 @@ async def list_patients(
 @router.post("/", response_model=PatientResponse, status_code=status.HTTP_201_CREATED)
 async def create_patient(
         patient_data: PatientCreate,
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear nuevo paciente
@@ -62,13 +62,13 @@ async def create_patient(
     patient_service = PatientService(db)
 
     # Verificar que el email no esté en uso
-    if patient_service.get_patient_by_email(patient_data.email):
+    if await patient_service.get_patient_by_email(patient_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
 
-    patient = patient_service.create_patient(
+    patient = await patient_service.create_patient(
         patient_data=patient_data,
         caregiver_id=current_user.id
     )
@@ -79,8 +79,8 @@ async def create_patient(
 @router.get("/{patient_id}", response_model=PatientDetail)
 async def get_patient(
         patient_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -88,7 +88,7 @@ async def get_patient(
     """
     patient_service = PatientService(db)
 
-    patient = patient_service.get_patient_by_id(patient_id)
+    patient = await patient_service.get_patient_by_id(patient_id)
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -102,8 +102,8 @@ async def get_patient(
 async def update_patient(
         patient_id: int,
         patient_update: PatientUpdate,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -111,7 +111,7 @@ async def update_patient(
     """
     patient_service = PatientService(db)
 
-    patient = patient_service.get_patient_by_id(patient_id)
+    patient = await patient_service.get_patient_by_id(patient_id)
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -120,13 +120,13 @@ async def update_patient(
 
     # Si se está actualizando el email, verificar que no esté en uso
     if patient_update.email and patient_update.email != patient.email:
-        if patient_service.get_patient_by_email(patient_update.email):
+        if await patient_service.get_patient_by_email(patient_update.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="El email ya está registrado"
             )
 
-    updated_patient = patient_service.update_patient(
+    updated_patient = await patient_service.update_patient(
         patient_id=patient_id,
         patient_update=patient_update
     )
@@ -137,8 +137,8 @@ async def update_patient(
 @router.delete("/{patient_id}")
 async def delete_patient(
         patient_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -146,7 +146,7 @@ async def delete_patient(
     """
     patient_service = PatientService(db)
 
-    patient = patient_service.get_patient_by_id(patient_id)
+    patient = await patient_service.get_patient_by_id(patient_id)
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -154,13 +154,13 @@ async def delete_patient(
         )
 
     # Verificar que no tenga tratamientos activos
-    if patient_service.has_active_treatments(patient_id):
+    if await patient_service.has_active_treatments(patient_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No se puede eliminar un paciente con tratamientos activos"
         )
 
-    patient_service.delete_patient(patient_id)
+    await patient_service.delete_patient(patient_id)
 
     return {"message": "Paciente eliminado exitosamente"}
 
@@ -168,8 +168,8 @@ async def delete_patient(
 @router.get("/{patient_id}/treatments")
 async def get_patient_treatments(
         patient_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -177,7 +177,7 @@ async def get_patient_treatments(
     """
     patient_service = PatientService(db)
 
-    treatments = patient_service.get_patient_treatments(patient_id)
+    treatments = await patient_service.get_patient_treatments(patient_id)
 
     return treatments
 
@@ -186,8 +186,8 @@ async def get_patient_treatments(
 async def get_patient_compliance(
         patient_id: int,
         days: int = Query(30, description="Número de días para el reporte"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -195,7 +195,7 @@ async def get_patient_compliance(
     """
     patient_service = PatientService(db)
 
-    compliance = patient_service.get_patient_compliance_report(
+    compliance = await patient_service.get_patient_compliance_report(
         patient_id=patient_id,
         days=days
     )
@@ -207,8 +207,8 @@ async def get_patient_compliance(
 async def add_patient_note(
         patient_id: int,
         note_data: dict,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -216,7 +216,7 @@ async def add_patient_note(
     """
     patient_service = PatientService(db)
 
-    note = patient_service.add_patient_note(
+    note = await patient_service.add_patient_note(
         patient_id=patient_id,
         note_data=note_data,
         created_by=current_user.id
@@ -229,8 +229,8 @@ async def add_patient_note(
 async def get_patient_alerts(
         patient_id: int,
         unread_only: bool = Query(False, description="Solo alertas no leídas"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -238,7 +238,7 @@ async def get_patient_alerts(
     """
     patient_service = PatientService(db)
 
-    alerts = patient_service.get_patient_alerts(
+    alerts = await patient_service.get_patient_alerts(
         patient_id=patient_id,
         unread_only=unread_only
     )
@@ -2,34 +2,41 @@
 Endpoints de tratamientos
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date
 
-from app.core.database import get_db
+from app.core.config import get_settings
+from app.core.database import get_async_db, MissingUniqueKeyError
+from app.core.security import Principal
 from app.core.dependencies import (
     get_current_user,
     get_caregiver_user,
     verify_treatment_access,
     verify_patient_access,
+    verify_patients_access,
     get_pagination_params,
     get_date_range_params,
     PaginationParams,
     DateRangeParams
 )
-from app.models.user import User
 from app.models.treatment import Treatment, TreatmentStatus
 from app.schemas.treatment import (
     TreatmentCreate,
     TreatmentUpdate,
     TreatmentResponse,
     TreatmentDetail,
-    TreatmentStats
+    TreatmentStats,
+    DoseEventCreate,
+    DoseEventBatch
 )
+from app.services.dose_service import DoseService
 from app.services.treatment_service import TreatmentService
 
 router = APIRouter()
 
+settings = get_settings()
+
 
 @router.get("/", response_model=List[TreatmentResponse])
 async def list_treatments(
@@ -37,15 +44,15 @@ async def list_treatments(
         patient_id: Optional[int] = Query(None, description="Filtrar por paciente"),
         status: Optional[TreatmentStatus] = Query(None, description="Filtrar por estado"),
         medication_id: Optional[int] = Query(None, description="Filtrar por medicamento"),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar tratamientos del cuidador actual
     """
     treatment_service = TreatmentService(db)
 
-    treatments = treatment_service.get_treatments_by_caregiver(
+    treatments = await treatment_service.get_treatments_by_caregiver(
         caregiver_id=current_user.id,
         skip=pagination.skip,
         limit=pagination.limit,
@@ -60,8 +67,8 @@ async def list_treatments(
 @router.post("/", response_model=TreatmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_treatment(
         treatment_data: TreatmentCreate,
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear nuevo tratamiento
@@ -72,7 +79,7 @@ async def create_treatment(
     await verify_patient_access(treatment_data.patient_id, current_user, db)
 
     # Verificar que el medicamento existe
-    if not treatment_service.medication_exists(treatment_data.medication_id):
+    if not await treatment_service.medication_exists(treatment_data.medication_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Medicamento no encontrado"
@@ -86,7 +93,7 @@ async def create_treatment(
         )
 
     # Verificar conflictos de medicamentos
-    conflicts = treatment_service.check_medication_conflicts(
+    conflicts = await treatment_service.check_medication_conflicts(
         patient_id=treatment_data.patient_id,
         medication_id=treatment_data.medication_id
     )
@@ -97,7 +104,7 @@ async def create_treatment(
             detail=f"Conflicto detectado: {conflicts['message']}"
         )
 
-    treatment = treatment_service.create_treatment(
+    treatment = await treatment_service.create_treatment(
         treatment_data=treatment_data,
         created_by_id=current_user.id
     )
@@ -108,8 +115,8 @@ async def create_treatment(
 @router.get("/{treatment_id}", response_model=TreatmentDetail)
 async def get_treatment(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -117,7 +124,7 @@ async def get_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    treatment = treatment_service.get_treatment_detail(treatment_id)
+    treatment = await treatment_service.get_treatment_detail(treatment_id)
     if not treatment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,8 +138,8 @@ async def get_treatment(
 async def update_treatment(
         treatment_id: int,
         treatment_update: TreatmentUpdate,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -140,7 +147,7 @@ async def update_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    treatment = treatment_service.get_treatment_by_id(treatment_id)
+    treatment = await treatment_service.get_treatment_by_id(treatment_id)
     if not treatment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -155,7 +162,7 @@ async def update_treatment(
             detail="La fecha de inicio debe ser anterior a la fecha de fin"
         )
 
-    updated_treatment = treatment_service.update_treatment(
+    updated_treatment = await treatment_service.update_treatment(
         treatment_id=treatment_id,
         treatment_update=treatment_update
     )
@@ -166,8 +173,8 @@ async def update_treatment(
 @router.delete("/{treatment_id}")
 async def delete_treatment(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -175,7 +182,7 @@ async def delete_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    treatment = treatment_service.get_treatment_by_id(treatment_id)
+    treatment = await treatment_service.get_treatment_by_id(treatment_id)
     if not treatment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -183,7 +190,7 @@ async def delete_treatment(
         )
 
     # Cancelar en lugar de eliminar
-    treatment_service.cancel_treatment(treatment_id)
+    await treatment_service.cancel_treatment(treatment_id)
 
     return {"message": "Tratamiento cancelado exitosamente"}
 
@@ -191,8 +198,8 @@ async def delete_treatment(
 @router.post("/{treatment_id}/activate")
 async def activate_treatment(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -200,7 +207,7 @@ async def activate_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    success = treatment_service.activate_treatment(treatment_id)
+    success = await treatment_service.activate_treatment(treatment_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -214,8 +221,8 @@ async def activate_treatment(
 async def suspend_treatment(
         treatment_id: int,
         reason: str = Query(..., description="Razón de la suspensión"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -223,7 +230,7 @@ async def suspend_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    success = treatment_service.suspend_treatment(treatment_id, reason)
+    success = await treatment_service.suspend_treatment(treatment_id, reason)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -237,8 +244,8 @@ async def suspend_treatment(
 async def complete_treatment(
         treatment_id: int,
         notes: Optional[str] = Query(None, description="Notas de finalización"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -246,7 +253,7 @@ async def complete_treatment(
     """
     treatment_service = TreatmentService(db)
 
-    success = treatment_service.complete_treatment(treatment_id, notes)
+    success = await treatment_service.complete_treatment(treatment_id, notes)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -259,8 +266,8 @@ async def complete_treatment(
 @router.get("/{treatment_id}/alarms")
 async def get_treatment_alarms(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -268,7 +275,7 @@ async def get_treatment_alarms(
     """
     treatment_service = TreatmentService(db)
 
-    alarms = treatment_service.get_treatment_alarms(treatment_id)
+    alarms = await treatment_service.get_treatment_alarms(treatment_id)
     return alarms
 
 
@@ -276,8 +283,8 @@ async def get_treatment_alarms(
 async def create_treatment_alarm(
         treatment_id: int,
         alarm_data: dict,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -285,7 +292,7 @@ async def create_treatment_alarm(
     """
     treatment_service = TreatmentService(db)
 
-    alarm = treatment_service.create_alarm(treatment_id, alarm_data)
+    alarm = await treatment_service.create_alarm(treatment_id, alarm_data)
     return alarm
 
 
@@ -293,8 +300,8 @@ async def create_treatment_alarm(
 async def get_treatment_dose_records(
         treatment_id: int,
         date_range: DateRangeParams = Depends(get_date_range_params),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -302,7 +309,7 @@ async def get_treatment_dose_records(
     """
     treatment_service = TreatmentService(db)
 
-    dose_records = treatment_service.get_dose_records(
+    dose_records = await treatment_service.get_dose_records(
         treatment_id=treatment_id,
         start_date=date_range.start_date,
         end_date=date_range.end_date
@@ -314,9 +321,9 @@ async def get_treatment_dose_records(
 @router.post("/{treatment_id}/dose-records")
 async def record_dose_taken(
         treatment_id: int,
-        dose_data: dict,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        dose_data: DoseEventCreate,
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -324,16 +331,56 @@ async def record_dose_taken(
     """
     treatment_service = TreatmentService(db)
 
-    dose_record = treatment_service.record_dose(treatment_id, dose_data)
-    return dose_record
+    result = await treatment_service.record_dose(treatment_id, dose_data)
+    if result["result"] == "error":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    return result
+
+
+@router.post("/dose-records/batch")
+async def record_dose_batch(
+        batch: DoseEventBatch,
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Registrar en lote eventos de dosis acumulados sin conexión.
+
+    La propiedad de los tratamientos se valida para todo el lote y cada
+    evento recibe su propio resultado (created, updated, unchanged,
+    superseded o error); los eventos con error no impiden guardar el resto.
+    """
+    if len(batch.events) > settings.DOSE_SYNC_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {settings.DOSE_SYNC_MAX_EVENTS} eventos por lote"
+        )
+
+    dose_service = DoseService(db)
+    try:
+        results = await dose_service.ingest(batch.events, current_user.caregiver_scope)
+    except MissingUniqueKeyError:
+        # Sin la llave única el upsert duplicaría dosis: rechazar hasta migrar
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Sincronización no disponible temporalmente"
+        )
+
+    summary = {"received": len(results)}
+    for outcome in ("created", "updated", "unchanged", "superseded", "error"):
+        summary[outcome] = sum(1 for result in results if result["result"] == outcome)
+    return {**summary, "results": results}
 
 
 @router.get("/{treatment_id}/compliance")
 async def get_treatment_compliance(
         treatment_id: int,
         days: int = Query(30, description="Número de días para el reporte"),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -341,15 +388,15 @@ async def get_treatment_compliance(
     """
     treatment_service = TreatmentService(db)
 
-    compliance = treatment_service.get_compliance_report(treatment_id, days)
+    compliance = await treatment_service.get_compliance_report(treatment_id, days)
     return compliance
 
 
 @router.get("/{treatment_id}/stats", response_model=TreatmentStats)
 async def get_treatment_statistics(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -357,15 +404,15 @@ async def get_treatment_statistics(
     """
     treatment_service = TreatmentService(db)
 
-    stats = treatment_service.get_treatment_statistics(treatment_id)
+    stats = await treatment_service.get_treatment_statistics(treatment_id)
     return stats
 
 
 @router.get("/patient/{patient_id}/active")
 async def get_patient_active_treatments(
         patient_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_patient_access)
 ):
     """
@@ -373,22 +420,22 @@ async def get_patient_active_treatments(
     """
     treatment_service = TreatmentService(db)
 
-    treatments = treatment_service.get_active_treatments_by_patient(patient_id)
+    treatments = await treatment_service.get_active_treatments_by_patient(patient_id)
     return treatments
 
 
 @router.get("/expiring")
 async def get_expiring_treatments(
         days_ahead: int = Query(7, description="Días hacia adelante para verificar"),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener tratamientos que están por vencer
     """
     treatment_service = TreatmentService(db)
 
-    expiring = treatment_service.get_expiring_treatments(
+    expiring = await treatment_service.get_expiring_treatments(
         caregiver_id=current_user.id,
         days_ahead=days_ahead
     )
@@ -398,23 +445,23 @@ async def get_expiring_treatments(
 
 @router.get("/dashboard/summary")
 async def get_treatments_dashboard(
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener resumen de tratamientos para dashboard
     """
     treatment_service = TreatmentService(db)
 
-    summary = treatment_service.get_dashboard_summary(current_user.id)
+    summary = await treatment_service.get_dashboard_summary(current_user.id)
     return summary
 
 
 @router.post("/bulk/create")
 async def create_bulk_treatments(
         treatments_data: List[TreatmentCreate],
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear múltiples tratamientos
@@ -422,10 +469,13 @@ async def create_bulk_treatments(
     treatment_service = TreatmentService(db)
 
     # Validar acceso a todos los pacientes
-    for treatment_data in treatments_data:
-        await verify_patient_access(treatment_data.patient_id, current_user, db)
+    await verify_patients_access(
+        {treatment_data.patient_id for treatment_data in treatments_data},
+        current_user,
+        db
+    )
 
-    results = treatment_service.create_bulk_treatments(
+    results = await treatment_service.create_bulk_treatments(
         treatments_data=treatments_data,
         created_by_id=current_user.id
     )
@@ -442,15 +492,15 @@ async def create_bulk_treatments(
 async def get_compliance_analytics(
         date_range: DateRangeParams = Depends(get_date_range_params),
         patient_id: Optional[int] = Query(None, description="Filtrar por paciente"),
-        current_user: User = Depends(get_caregiver_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_caregiver_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener análisis de cumplimiento de tratamientos
     """
     treatment_service = TreatmentService(db)
 
-    analytics = treatment_service.get_compliance_analytics(
+    analytics = await treatment_service.get_compliance_analytics(
         caregiver_id=current_user.id,
         start_date=date_range.start_date,
         end_date=date_range.end_date,
@@ -466,8 +516,8 @@ async def get_compliance_analytics(
 async def delete_treatment_alarm(
         treatment_id: int,
         alarm_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
@@ -476,7 +526,7 @@ async def delete_treatment_alarm(
     treatment_service = TreatmentService(db)
 
     try:
-        success = treatment_service.delete_alarm(treatment_id, alarm_id)
+        success = await treatment_service.delete_alarm(treatment_id, alarm_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -505,13 +555,13 @@ async def delete_treatment_alarm(
 @router.get("/{treatment_id}/alarms/debug")
 async def debug_treatment_alarms(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
         _: bool = Depends(verify_treatment_access)
 ):
     """
     Endpoint de debugging para verificar el estado de las alarmas
     """
     treatment_service = TreatmentService(db)
-    debug_info = treatment_service.debug_treatment_alarms(treatment_id)
+    debug_info = await treatment_service.debug_treatment_alarms(treatment_id)
     return debug_info
\ No newline at end of file
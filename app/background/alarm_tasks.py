@@ -0,0 +1,67 @@
+"""
+Tareas en segundo plano de alarmas y calendario de dosis
+"""
+import asyncio
+import logging
+
+from app.core.config import get_settings
+from app.core import database
+from app.services.dose_schedule_service import DoseScheduleService, schedule_changes
+from app.services.dose_service import DoseService
+from app.services.job_lease_service import JobLeaseService
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+async def dose_schedule_loop():
+    """
+    Mantener materializado el calendario de dosis.
+
+    Cada DOSE_SCHEDULE_INTERVAL segundos (y al arrancar) hace una pasada
+    completa que avanza el horizonte; entre pasadas rematerializa solo los
+    tratamientos y pacientes que cambiaron en este proceso.
+
+    La pasada completa la hace un solo worker (concesión "dose_schedule");
+    los cambios locales los rematerializa cada proceso, es idempotente.
+    """
+    loop = asyncio.get_running_loop()
+    next_full_run = loop.time()
+    while True:
+        treatment_ids, patient_ids = await schedule_changes.wait(max(0.0, next_full_run - loop.time()))
+        try:
+            async with database.AsyncSessionLocal() as db:
+                service = DoseScheduleService(db)
+                if loop.time() >= next_full_run:
+                    next_full_run = loop.time() + settings.DOSE_SCHEDULE_INTERVAL
+                    if await JobLeaseService(db).acquire("dose_schedule", settings.DOSE_SCHEDULE_INTERVAL):
+                        await service.materialize()
+                else:
+                    if treatment_ids:
+                        await service.materialize(treatment_ids=treatment_ids)
+                    if patient_ids:
+                        await service.materialize(patient_ids=patient_ids)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error materializando calendario de dosis: {e}")
+
+
+async def missed_dose_loop():
+    """
+    Marcar dosis vencidas como omitidas cada ALARM_CHECK_INTERVAL segundos.
+
+    Solo el worker con la concesión "missed_doses" lo hace.
+    """
+    while True:
+        try:
+            async with database.AsyncSessionLocal() as db:
+                if await JobLeaseService(db).acquire("missed_doses", settings.ALARM_CHECK_INTERVAL):
+                    await DoseService(db).mark_missed()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error detectando dosis omitidas: {e}")
+
+        await asyncio.sleep(settings.ALARM_CHECK_INTERVAL)
@@ -0,0 +1,52 @@
+"""
+Tareas en segundo plano de generación de alertas
+"""
+import asyncio
+import logging
+
+from app.core.config import get_settings
+from app.core import database
+from app.services.alert_service import AlertService, alert_events
+from app.services.job_lease_service import JobLeaseService
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+async def alert_generation_loop():
+    """
+    Convertir los eventos de dosis y cumplimiento en alertas.
+
+    Cada ALERT_BATCH_INTERVAL segundos toma lo acumulado en alert_events
+    (ya fusionado por tratamiento y paciente) y lo procesa en un lote. Al
+    arrancar y cada ALERT_SWEEP_INTERVAL segundos hace además una revisión
+    completa de cumplimiento y de tratamientos por terminar.
+
+    Los eventos son de este proceso y cada worker procesa los suyos (la
+    dedupe_key evita duplicados); la revisión completa la hace solo el
+    worker con la concesión "alert_sweep".
+    """
+    loop = asyncio.get_running_loop()
+    next_sweep = loop.time()
+    while True:
+        missed_doses, patient_ids = alert_events.drain()
+        sweep_due = loop.time() >= next_sweep
+        if missed_doses or patient_ids or sweep_due:
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    sweep = sweep_due and await JobLeaseService(db).acquire(
+                        "alert_sweep", settings.ALERT_SWEEP_INTERVAL
+                    )
+                    await AlertService(db).generate(missed_doses, patient_ids, sweep=sweep)
+                if sweep_due:
+                    next_sweep = loop.time() + settings.ALERT_SWEEP_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # La revisión completa no recupera las dosis omitidas: se
+                # reintentan en el siguiente ciclo
+                alert_events.requeue(missed_doses, patient_ids)
+                logger.error(f"Error generando alertas: {e}")
+
+        await asyncio.sleep(settings.ALERT_BATCH_INTERVAL)
@@ -0,0 +1,35 @@
+"""
+Tareas en segundo plano de cumplimiento
+"""
+import asyncio
+import logging
+
+from app.core.config import get_settings
+from app.core import database
+from app.services.compliance_service import ComplianceService
+from app.services.job_lease_service import JobLeaseService
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+async def compliance_rollup_loop():
+    """
+    Ejecutar el rollup de cumplimiento cada COMPLIANCE_ROLLUP_INTERVAL segundos.
+
+    La marca se guarda en job_watermarks: la historia se reconstruye solo
+    la primera vez y los reinicios siguen desde donde se quedó. Solo el
+    worker con la concesión "compliance_rollup" lo ejecuta.
+    """
+    while True:
+        try:
+            async with database.AsyncSessionLocal() as db:
+                if await JobLeaseService(db).acquire("compliance_rollup", settings.COMPLIANCE_ROLLUP_INTERVAL):
+                    await ComplianceService(db).rollup()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en rollup de cumplimiento: {e}")
+
+        await asyncio.sleep(settings.COMPLIANCE_ROLLUP_INTERVAL)
@@ -0,0 +1,50 @@
+"""
+Workers de generación de reportes
+"""
+import asyncio
+import logging
+from typing import List
+
+from app.core.config import get_settings
+from app.core import database
+from app.services.report_job_service import ReportJobService, job_queue
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+async def report_worker(worker_id: int):
+    """
+    Procesar trabajos de reporte uno a la vez.
+
+    Espera avisos de la cola en memoria; si no llega ninguno en
+    REPORT_JOB_POLL_INTERVAL segundos busca pendientes en la tabla
+    (trabajos de otros procesos o que quedaron de un reinicio).
+    """
+    while True:
+        try:
+            job_id = await asyncio.wait_for(job_queue.get(), timeout=settings.REPORT_JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            job_id = None
+
+        try:
+            async with database.AsyncSessionLocal() as db:
+                service = ReportJobService(db)
+                if job_id is None:
+                    job_id = await service.next_pending_id()
+                if job_id is not None and await service.claim(job_id):
+                    logger.info(f"Worker {worker_id} generando reporte {job_id}")
+                    await service.run(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en worker de reportes {worker_id}: {e}")
+
+
+def start_report_workers() -> List[asyncio.Task]:
+    """Lanzar REPORT_WORKERS workers"""
+    return [
+        asyncio.create_task(report_worker(worker_id))
+        for worker_id in range(settings.REPORT_WORKERS)
+    ]
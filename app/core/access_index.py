@@ -0,0 +1,150 @@
+"""
+Índice en memoria de pertenencia cuidador → pacientes/tratamientos
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Iterable, Optional, Set
+
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.models.patient import Patient
+from app.models.treatment import Treatment
+
+settings = get_settings()
+
+
+class CaregiverScope:
+    """IDs de pacientes y tratamientos que pertenecen a un cuidador"""
+
+    __slots__ = ("patient_ids", "treatment_ids")
+
+    def __init__(self, patient_ids: Set[int], treatment_ids: Set[int]):
+        self.patient_ids = patient_ids
+        self.treatment_ids = treatment_ids
+
+
+class AccessIndex:
+    """
+    Índice de pertenencia usado por las verificaciones de acceso.
+
+    El alcance de cada cuidador se carga de forma perezosa (dos consultas)
+    y se mantiene al crear/eliminar pacientes y tratamientos. Un ID que no
+    está en el índice se confirma contra la base de datos antes de negar
+    el acceso, así que los cambios hechos por otro proceso no producen
+    falsos 403. El dueño de cada paciente se guarda aparte (owner_size
+    entradas) con el mismo TTL que los alcances.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, owner_size: int):
+        self._scopes = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._patient_owner = TTLCache(maxsize=owner_size, ttl=ttl)
+
+    async def _get_scope(self, db: AsyncSession, caregiver_id: int) -> CaregiverScope:
+        """Obtener alcance del cuidador, cargándolo si no está en memoria"""
+        scope = self._scopes.get(caregiver_id)
+        if scope is not None:
+            return scope
+
+        patient_ids = set((await db.execute(
+            select(Patient.id).filter(Patient.caregiver_id == caregiver_id)
+        )).scalars().all())
+        treatment_ids = set((await db.execute(
+            select(Treatment.id).join(Patient).filter(Patient.caregiver_id == caregiver_id)
+        )).scalars().all())
+
+        scope = CaregiverScope(patient_ids, treatment_ids)
+        self._scopes.set(caregiver_id, scope)
+        for patient_id in patient_ids:
+            self._patient_owner.set(patient_id, caregiver_id)
+        return scope
+
+    async def unauthorized_patients(
+            self,
+            db: AsyncSession,
+            caregiver_id: int,
+            patient_ids: Iterable[int]
+    ) -> Set[int]:
+        """Devolver los IDs de pacientes a los que el cuidador NO tiene acceso"""
+        scope = await self._get_scope(db, caregiver_id)
+        missing = set(patient_ids) - scope.patient_ids
+        if not missing:
+            return set()
+
+        found = set((await db.execute(
+            select(Patient.id).filter(
+                Patient.id.in_(missing),
+                Patient.caregiver_id == caregiver_id
+            )
+        )).scalars().all())
+        for patient_id in found:
+            self.add_patient(caregiver_id, patient_id)
+        return missing - found
+
+    async def unauthorized_treatments(
+            self,
+            db: AsyncSession,
+            caregiver_id: int,
+            treatment_ids: Iterable[int]
+    ) -> Set[int]:
+        """Devolver los IDs de tratamientos a los que el cuidador NO tiene acceso"""
+        scope = await self._get_scope(db, caregiver_id)
+        missing = set(treatment_ids) - scope.treatment_ids
+        if not missing:
+            return set()
+
+        found = set((await db.execute(
+            select(Treatment.id).join(Patient).filter(
+                Treatment.id.in_(missing),
+                Patient.caregiver_id == caregiver_id
+            )
+        )).scalars().all())
+        scope.treatment_ids.update(found)
+        return missing - found
+
+    async def has_patient(self, db: AsyncSession, caregiver_id: int, patient_id: int) -> bool:
+        """Verificar acceso a un paciente"""
+        return not await self.unauthorized_patients(db, caregiver_id, [patient_id])
+
+    async def has_treatment(self, db: AsyncSession, caregiver_id: int, treatment_id: int) -> bool:
+        """Verificar acceso a un tratamiento"""
+        return not await self.unauthorized_treatments(db, caregiver_id, [treatment_id])
+
+    def add_patient(self, caregiver_id: int, patient_id: int):
+        """Registrar un paciente nuevo del cuidador"""
+        self._patient_owner.set(patient_id, caregiver_id)
+        scope = self._scopes.get(caregiver_id)
+        if scope is not None:
+            scope.patient_ids.add(patient_id)
+
+    def remove_patient(self, caregiver_id: int, patient_id: int, treatment_ids: Iterable[int] = ()):
+        """Quitar un paciente eliminado (y sus tratamientos)"""
+        self._patient_owner.invalidate(patient_id)
+        scope = self._scopes.get(caregiver_id)
+        if scope is not None:
+            scope.patient_ids.discard(patient_id)
+            scope.treatment_ids.difference_update(treatment_ids)
+
+    def add_treatment(self, patient_id: int, treatment_id: int):
+        """Registrar un tratamiento nuevo en el alcance del dueño del paciente"""
+        caregiver_id = self.owner_of(patient_id)
+        if caregiver_id is None:
+            return
+        scope = self._scopes.get(caregiver_id)
+        if scope is not None:
+            scope.treatment_ids.add(treatment_id)
+
+    def owner_of(self, patient_id: int) -> Optional[int]:
+        """Cuidador dueño de un paciente, si se conoce"""
+        return self._patient_owner.get(patient_id)
+
+    def clear(self):
+        """Vaciar el índice"""
+        self._scopes.clear()
+        self._patient_owner.clear()
+
+
+access_index = AccessIndex(
+    maxsize=settings.ACCESS_INDEX_SIZE,
+    ttl=settings.ACCESS_INDEX_TTL,
+    owner_size=settings.ACCESS_INDEX_OWNER_SIZE
+)
@@ -0,0 +1,60 @@
+"""
+Cache en memoria por proceso
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Cache con expiración por tiempo (TTL) y desalojo LRU.
+
+    Es local a cada proceso: con varios workers de gunicorn cada uno
+    mantiene su propia copia, por lo que el TTL acota la inconsistencia
+    entre procesos.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Obtener valor si existe y no ha expirado"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Guardar valor, desalojando el menos usado si se excede el tamaño"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Eliminar una entrada"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Vaciar el cache"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
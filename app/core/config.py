@@ -26,6 +26,15 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(env="SECRET_KEY")
     ALGORITHM: str = Field(default="HS256", env="ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
+    PASSWORD_HASH_WORKERS: int = Field(default=4, env="PASSWORD_HASH_WORKERS")
+    PASSWORD_HASH_QUEUE_SIZE: int = Field(default=64, env="PASSWORD_HASH_QUEUE_SIZE")  # solicitudes en espera
+    PRINCIPAL_CACHE_TTL: int = Field(default=60, env="PRINCIPAL_CACHE_TTL")  # segundos
+    PRINCIPAL_CACHE_SIZE: int = Field(default=10000, env="PRINCIPAL_CACHE_SIZE")
+    ACCESS_INDEX_TTL: int = Field(default=300, env="ACCESS_INDEX_TTL")  # segundos
+    ACCESS_INDEX_SIZE: int = Field(default=5000, env="ACCESS_INDEX_SIZE")  # cuidadores en memoria
+    ACCESS_INDEX_OWNER_SIZE: int = Field(default=50000, env="ACCESS_INDEX_OWNER_SIZE")  # pacientes en memoria
+    DASHBOARD_SNAPSHOT_TTL: int = Field(default=300, env="DASHBOARD_SNAPSHOT_TTL")  # segundos
+    DASHBOARD_SNAPSHOT_SIZE: int = Field(default=5000, env="DASHBOARD_SNAPSHOT_SIZE")
 
     # Base de datos MySQL
     DB_HOST: str = Field(default="localhost", env="DB_HOST")
@@ -34,6 +43,7 @@ class Settings(BaseSettings):
     DB_USER: str = Field(env="DB_USER")
     DB_PASSWORD: str = Field(env="DB_PASSWORD")
     DB_CHARSET: str = Field(default="utf8mb4", env="DB_CHARSET")
+    DB_ASYNC_DRIVER: str = Field(default="aiomysql", env="DB_ASYNC_DRIVER")
 
     # Email (AWS SES o SMTP)
     EMAIL_HOST: str = Field(default="localhost", env="EMAIL_HOST")
@@ -57,10 +67,32 @@ class Settings(BaseSettings):
     ALARM_CHECK_INTERVAL: int = Field(default=60, env="ALARM_CHECK_INTERVAL")  # segundos
     COMPLIANCE_THRESHOLD: float = Field(default=75.0, env="COMPLIANCE_THRESHOLD")  # porcentaje
     MAX_SNOOZE_ATTEMPTS: int = Field(default=3, env="MAX_SNOOZE_ATTEMPTS")
+    COMPLIANCE_ROLLUP_INTERVAL: int = Field(default=300, env="COMPLIANCE_ROLLUP_INTERVAL")  # segundos
+    DOSE_SYNC_MAX_EVENTS: int = Field(default=5000, env="DOSE_SYNC_MAX_EVENTS")
+    DOSE_SCHEDULE_HORIZON_HOURS: int = Field(default=48, env="DOSE_SCHEDULE_HORIZON_HOURS")
+    DOSE_SCHEDULE_INTERVAL: int = Field(default=900, env="DOSE_SCHEDULE_INTERVAL")  # segundos
+    MISSED_DOSE_GRACE_MINUTES: int = Field(default=60, env="MISSED_DOSE_GRACE_MINUTES")
+    MISSED_DOSE_BATCH_SIZE: int = Field(default=5000, env="MISSED_DOSE_BATCH_SIZE")
+    MISSED_DOSE_ALERT_MAX_AGE_HOURS: int = Field(default=24, env="MISSED_DOSE_ALERT_MAX_AGE_HOURS")
+
+    # Generación de alertas
+    ALERT_BATCH_INTERVAL: int = Field(default=5, env="ALERT_BATCH_INTERVAL")  # segundos
+    ALERT_SWEEP_INTERVAL: int = Field(default=3600, env="ALERT_SWEEP_INTERVAL")  # segundos
+    LOW_COMPLIANCE_WINDOW_DAYS: int = Field(default=7, env="LOW_COMPLIANCE_WINDOW_DAYS")
+    LOW_COMPLIANCE_ALERT_COOLDOWN_HOURS: int = Field(default=24, env="LOW_COMPLIANCE_ALERT_COOLDOWN_HOURS")
+    TREATMENT_END_ALERT_DAYS: int = Field(default=3, env="TREATMENT_END_ALERT_DAYS")
 
     # Archivos
     UPLOAD_FOLDER: str = Field(default="uploads", env="UPLOAD_FOLDER")
     REPORTS_FOLDER: str = Field(default="reports", env="REPORTS_FOLDER")
+    REPORT_WORKERS: int = Field(default=2, env="REPORT_WORKERS")
+    REPORT_JOB_POLL_INTERVAL: int = Field(default=10, env="REPORT_JOB_POLL_INTERVAL")  # segundos
+    REPORT_JOB_TIMEOUT: int = Field(default=600, env="REPORT_JOB_TIMEOUT")  # segundos
+    PDF_RENDER_WORKERS: int = Field(default=2, env="PDF_RENDER_WORKERS")  # procesos
+    PDF_RENDER_TIMEOUT: int = Field(default=300, env="PDF_RENDER_TIMEOUT")  # segundos por reporte
+    PDF_RENDER_TASKS_PER_CHILD: int = Field(default=50, env="PDF_RENDER_TASKS_PER_CHILD")  # reportes por proceso
+    REPORT_CACHE_TTL: int = Field(default=600, env="REPORT_CACHE_TTL")  # segundos
+    REPORT_CACHE_SIZE: int = Field(default=5000, env="REPORT_CACHE_SIZE")
     MAX_FILE_SIZE: int = Field(default=5*1024*1024, env="MAX_FILE_SIZE")  # 5MB
 
     # Logging
@@ -74,6 +106,11 @@ class Settings(BaseSettings):
         """Construir URL de conexión MySQL"""
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset={self.DB_CHARSET}"
 
+    @property
+    def async_database_url(self) -> str:
+        """Construir URL de conexión MySQL para el driver asíncrono"""
+        return f"mysql+{self.DB_ASYNC_DRIVER}://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset={self.DB_CHARSET}"
+
     @property
     def is_production(self) -> bool:
         """Verificar si estamos en producción"""
@@ -1,10 +1,12 @@
 """
 Configuración de base de datos MySQL con SQLAlchemy
 """
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, UniqueConstraint, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.pool import QueuePool
+from typing import Set
 import logging
 
 # Crear Base ANTES de importar config para evitar import circular
@@ -30,12 +32,17 @@ def get_settings_safe():
                 self.DB_USER = "pillcare360_user"
                 self.DB_PASSWORD = "password"
                 self.DB_CHARSET = "utf8mb4"
+                self.DB_ASYNC_DRIVER = "aiomysql"
                 self.DEBUG = True
 
             @property
             def database_url(self):
                 return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset={self.DB_CHARSET}"
 
+            @property
+            def async_database_url(self):
+                return f"mysql+{self.DB_ASYNC_DRIVER}://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset={self.DB_CHARSET}"
+
         return DefaultSettings()
 
 settings = get_settings_safe()
@@ -58,6 +65,29 @@ except Exception as e:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) if engine else None
 
+# Engine asíncrono para los endpoints async (no bloquea el event loop)
+try:
+    async_engine = create_async_engine(
+        settings.async_database_url,
+        pool_size=20,
+        max_overflow=30,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=getattr(settings, 'DEBUG', False),
+    )
+except Exception as e:
+    logger.warning(f"No se pudo crear engine asíncrono: {e}")
+    async_engine = None
+
+# expire_on_commit=False: los objetos se serializan después del commit
+# y un lazy load fuera del contexto async fallaría
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+) if async_engine else None
+
 # Metadata para operaciones de esquema
 metadata = MetaData()
 
@@ -76,6 +106,108 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency para obtener sesión asíncrona de base de datos
+    """
+    if not AsyncSessionLocal:
+        raise Exception("Base de datos asíncrona no configurada")
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """
+    Cerrar el pool de conexiones asíncronas
+    """
+    if async_engine:
+        await async_engine.dispose()
+
+
+# Tablas cuya llave única declarada en el modelo no existe en la base
+# (create_all no altera tablas existentes); se llenan al arrancar
+missing_upsert_keys: Set[str] = set()
+
+
+class MissingUniqueKeyError(Exception):
+    """El upsert de la tabla duplicaría filas: falta su llave única"""
+
+
+def verify_upsert_keys():
+    """
+    Revisar que las llaves únicas nombradas de los modelos existan en la
+    base. Las tablas a las que les falta quedan en missing_upsert_keys y
+    build_upsert las rechaza hasta aplicar las migraciones
+    (alembic upgrade head) y reiniciar.
+    """
+    if not engine:
+        return
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        declared = {
+            constraint.name for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint) and constraint.name
+        }
+        if not declared or not inspector.has_table(table.name):
+            continue
+
+        # MySQL reporta las llaves únicas también como índices únicos
+        present = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        present.update(index["name"] for index in inspector.get_indexes(table.name) if index.get("unique"))
+        missing = declared - present
+        if missing:
+            missing_upsert_keys.add(table.name)
+            logger.error(
+                f"❌ Faltan llaves únicas en {table.name}: {', '.join(sorted(missing))}; "
+                f"ejecutar alembic upgrade head"
+            )
+        else:
+            missing_upsert_keys.discard(table.name)
+
+
+def build_upsert(session, table, key_columns, update_columns):
+    """
+    INSERT que actualiza las filas existentes por llave única.
+
+    Se ejecuta con la lista de filas (session.execute(stmt, rows)): la
+    sentencia se compila una sola vez y el driver envía las filas en
+    INSERTs de varios valores. MySQL usa ON DUPLICATE KEY UPDATE (la llave
+    es el índice único de la tabla); SQLite, usado en desarrollo, ON
+    CONFLICT sobre key_columns. Sin update_columns las filas existentes se
+    dejan intactas (INSERT IGNORE / DO NOTHING) y rowcount es el número de
+    filas insertadas.
+    """
+    if table.name in missing_upsert_keys:
+        raise MissingUniqueKeyError(
+            f"La tabla {table.name} no tiene su llave única; ejecutar alembic upgrade head"
+        )
+
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        if not update_columns:
+            return stmt.prefix_with("IGNORE")
+        return stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in update_columns}
+        )
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = sqlite_insert(table)
+        if not update_columns:
+            return stmt.on_conflict_do_nothing(index_elements=key_columns)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+
+    raise NotImplementedError(f"Upsert no soportado para {dialect}")
+
+
 def create_tables():
     """
     Crear todas las tablas si no existen
@@ -88,7 +220,7 @@ def create_tables():
         from app.models import user, patient, medication, treatment
         # Importar modelos adicionales cuando los crees
         try:
-            from app.models import alarm, dose_record, alert, compliance
+            from app.models import alarm, dose_record, alert, compliance, activity_event, report_job, job_watermark, job_lease
         except ImportError:
             logger.warning("Algunos modelos no están disponibles todavía")
 
@@ -3,14 +3,15 @@ Dependencias globales de la aplicación
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from typing import Optional
+from typing import Iterable, Optional
 
-from app.core.database import get_db
+from app.core.access_index import access_index
+from app.core.database import get_async_db
 from app.core.config import get_settings
-from app.core.security import verify_token
-from app.models.user import User, UserRole
+from app.core.security import verify_token, Principal, principal_cache
+from app.models.user import UserRole
 from app.services.auth_service import AuthService
 
 settings = get_settings()
@@ -24,10 +25,13 @@ oauth2_scheme = OAuth2PasswordBearer(
 
 async def get_current_user(
         token: Optional[str] = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-) -> User:
+        db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     """
     Obtener usuario actual del token JWT
+
+    El principal se resuelve desde cache; solo se consulta la base de
+    datos cuando no está en cache o expiró.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,23 +50,40 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    auth_service = AuthService(db)
-    user = auth_service.get_user_by_id(int(user_id))
-    if user is None:
+    principal = await _resolve_principal(int(user_id), db)
+    if principal is None:
         raise credentials_exception
 
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Usuario inactivo"
         )
 
-    return user
+    return principal
+
+
+async def _resolve_principal(user_id: int, db: AsyncSession) -> Optional[Principal]:
+    """
+    Obtener principal desde cache o, si no está, desde la base de datos
+    """
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    auth_service = AuthService(db)
+    user = await auth_service.get_user_by_id(user_id)
+    if user is None:
+        return None
+
+    principal = Principal.from_user(user)
+    principal_cache.set(user_id, principal)
+    return principal
 
 
 async def get_current_active_user(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Obtener usuario activo actual
     """
@@ -75,8 +96,8 @@ async def get_current_active_user(
 
 
 async def get_admin_user(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Verificar que el usuario sea administrador
     """
@@ -89,8 +110,8 @@ async def get_admin_user(
 
 
 async def get_caregiver_user(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Verificar que el usuario sea cuidador o admin
     """
@@ -104,8 +125,8 @@ async def get_caregiver_user(
 
 async def get_optional_user(
         token: Optional[str] = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-) -> Optional[User]:
+        db: AsyncSession = Depends(get_async_db)
+) -> Optional[Principal]:
     """
     Obtener usuario actual si existe token, sino None
     """
@@ -118,9 +139,8 @@ async def get_optional_user(
         if user_id is None:
             return None
 
-        auth_service = AuthService(db)
-        user = auth_service.get_user_by_id(int(user_id))
-        return user if user and user.is_active else None
+        principal = await _resolve_principal(int(user_id), db)
+        return principal if principal and principal.is_active else None
     except JWTError:
         return None
 
@@ -128,8 +148,8 @@ async def get_optional_user(
 # Dependencias para validar permisos específicos
 async def verify_patient_access(
         patient_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verificar que el usuario tenga acceso al paciente
@@ -140,13 +160,7 @@ async def verify_patient_access(
 
     # Los cuidadores solo pueden acceder a sus pacientes
     if current_user.role == UserRole.CAREGIVER:
-        from app.models.patient import Patient
-        patient = db.query(Patient).filter(
-            Patient.id == patient_id,
-            Patient.caregiver_id == current_user.id
-        ).first()
-
-        if not patient:
+        if not await access_index.has_patient(db, current_user.id, patient_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes acceso a este paciente"
@@ -159,10 +173,36 @@ async def verify_patient_access(
     )
 
 
+async def verify_patients_access(
+        patient_ids: Iterable[int],
+        current_user: Principal,
+        db: AsyncSession
+):
+    """
+    Verificar en una sola consulta al índice el acceso a varios pacientes
+    """
+    if current_user.is_admin:
+        return True
+
+    if current_user.role == UserRole.CAREGIVER:
+        denied = await access_index.unauthorized_patients(db, current_user.id, patient_ids)
+        if denied:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"No tienes acceso a los pacientes: {sorted(denied)}"
+            )
+        return True
+
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="No tienes permisos para acceder a esta información"
+    )
+
+
 async def verify_treatment_access(
         treatment_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verificar que el usuario tenga acceso al tratamiento
@@ -173,15 +213,7 @@ async def verify_treatment_access(
 
     # Los cuidadores solo pueden acceder a tratamientos de sus pacientes
     if current_user.role == UserRole.CAREGIVER:
-        from app.models.treatment import Treatment
-        from app.models.patient import Patient
-
-        treatment = db.query(Treatment).join(Patient).filter(
-            Treatment.id == treatment_id,
-            Patient.caregiver_id == current_user.id
-        ).first()
-
-        if not treatment:
+        if not await access_index.has_treatment(db, current_user.id, treatment_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes acceso a este tratamiento"
@@ -266,7 +298,7 @@ def get_request_id() -> str:
 
 
 def rate_limit_key(
-        current_user: Optional[User] = Depends(get_optional_user)
+        current_user: Optional[Principal] = Depends(get_optional_user)
 ) -> str:
     """
     Generar clave para rate limiting
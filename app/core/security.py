@@ -2,12 +2,19 @@
 Utilidades de seguridad y autenticación
 """
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Callable, Any
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import asyncio
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 
 from app.core.config import get_settings
+from app.core.cache import TTLCache
+from app.models.user import UserRole
 
 settings = get_settings()
 
@@ -29,6 +36,151 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHashingPool:
+    """
+    Pool acotado para ejecutar bcrypt fuera del event loop.
+
+    Cuando hay más solicitudes en curso que workers + cola permitida,
+    se rechaza con 503 en lugar de acumular latencia.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._started = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Ejecutar una función de hashing en el pool"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Servicio de autenticación saturado, intente de nuevo",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            self._record_wait(time.perf_counter() - submitted_at)
+            return func(*args)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+    def _record_wait(self, waited: float):
+        """Registrar tiempo de espera en cola"""
+        with self._lock:
+            self._started += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def metrics(self) -> dict:
+        """Métricas del pool (tiempos en milisegundos)"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(self._total_wait / self._started * 1000, 2) if self._started else 0.0,
+                "max_queue_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+    def shutdown(self):
+        """Cerrar el pool"""
+        self._executor.shutdown(wait=False)
+
+
+password_hashing_pool = PasswordHashingPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_SIZE
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verificar contraseña sin bloquear el event loop
+    """
+    return await password_hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash de contraseña sin bloquear el event loop
+    """
+    return await password_hashing_pool.run(get_password_hash, password)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Identidad inmutable del usuario autenticado.
+
+    Es lo que resuelven las dependencias de autenticación; se guarda en
+    cache para no consultar la tabla users en cada request.
+    """
+    id: int
+    email: str
+    name: str
+    role: UserRole
+    is_active: bool
+    caregiver_scope: Optional[int]  # None = acceso a todos los pacientes (admin)
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        """Construir a partir de un modelo User"""
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            role=user.role,
+            is_active=bool(user.is_active),
+            caregiver_scope=None if user.role == UserRole.ADMIN else user.id
+        )
+
+    @property
+    def is_admin(self) -> bool:
+        """Verificar si el usuario es administrador"""
+        return self.role == UserRole.ADMIN
+
+    @property
+    def is_caregiver(self) -> bool:
+        """Verificar si el usuario es cuidador"""
+        return self.role == UserRole.CAREGIVER
+
+    @property
+    def is_patient(self) -> bool:
+        """Verificar si el usuario es paciente"""
+        return self.role == UserRole.PATIENT
+
+
+# Cache de principals por ID de usuario
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Crear token JWT
@@ -1,14 +1,26 @@
 """
 Archivo principal de la aplicación FastAPI - PillCare 360
 """
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import get_settings
-from app.core.database import create_tables, test_connection, get_db_info
+from app.core.database import (
+    create_tables, verify_upsert_keys, test_connection, get_db_info, dispose_async_engine, AsyncSessionLocal
+)
+from app.core.security import password_hashing_pool
 from app.api import api_router
+from app.background.alarm_tasks import dose_schedule_loop, missed_dose_loop
+from app.background.alert_tasks import alert_generation_loop
+from app.background.compliance_tasks import compliance_rollup_loop
+from app.background.report_tasks import start_report_workers
+from app.services.job_lease_service import JobLeaseService
+from app.services.medication_service import MedicationService
+from app.services.pdf_service import pdf_renderer
 import logging
 
 # Configurar logging
@@ -29,6 +41,8 @@ async def lifespan(app: FastAPI):
     logger.info(f"🌍 Ambiente: {settings.ENVIRONMENT}")
     logger.info(f"🔑 Debug: {settings.DEBUG}")
 
+    background_tasks = []
+
     # Verificar conexión a la base de datos
     if test_connection():
         logger.info("✅ Conexión a MySQL exitosa")
@@ -41,9 +55,24 @@ async def lifespan(app: FastAPI):
         # Crear tablas si no existen
         try:
             create_tables()
+            verify_upsert_keys()
             logger.info("✅ Esquema de base de datos verificado")
         except Exception as e:
             logger.error(f"❌ Error al verificar esquema: {e}")
+
+        # Clasificar medicamentos creados antes de las categorías
+        try:
+            async with AsyncSessionLocal() as db:
+                await MedicationService(db).assign_missing_categories()
+        except Exception as e:
+            logger.error(f"❌ Error al clasificar medicamentos: {e}")
+
+        # Tareas en segundo plano
+        background_tasks.append(asyncio.create_task(compliance_rollup_loop()))
+        background_tasks.append(asyncio.create_task(dose_schedule_loop()))
+        background_tasks.append(asyncio.create_task(missed_dose_loop()))
+        background_tasks.append(asyncio.create_task(alert_generation_loop()))
+        background_tasks.extend(start_report_workers())
     else:
         logger.error("❌ Error de conexión a MySQL")
         logger.warning("⚠️ La aplicación continuará pero sin base de datos")
@@ -53,6 +82,19 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("🛑 Cerrando PillCare 360 API...")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if background_tasks:
+        # Otro worker puede tomar los trabajos sin esperar a que venzan
+        try:
+            async with AsyncSessionLocal() as db:
+                await JobLeaseService(db).release_all()
+        except Exception as e:
+            logger.error(f"❌ Error al liberar trabajos periódicos: {e}")
+    await dispose_async_engine()
+    password_hashing_pool.shutdown()
+    pdf_renderer.shutdown()
 
 
 def create_application() -> FastAPI:
@@ -205,6 +247,7 @@ def setup_routes(app: FastAPI):
                 "status": db_status,
                 "type": "MySQL"
             },
+            "password_hashing": password_hashing_pool.metrics(),
             "timestamp": "2025-01-01T00:00:00Z"  # En implementación real, usar datetime.utcnow()
         }
 
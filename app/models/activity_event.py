@@ -0,0 +1,50 @@
+"""
+Modelo de Evento de Actividad
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+import enum
+
+from app.core.database import Base
+
+
+class ActivityType(str, enum.Enum):
+    """Tipos de evento de actividad"""
+    PATIENT_CREATED = "patient_created"
+    PATIENT_UPDATED = "patient_updated"
+    PATIENT_DELETED = "patient_deleted"
+    TREATMENT_CREATED = "treatment_created"
+    TREATMENT_UPDATED = "treatment_updated"
+    TREATMENT_STATUS_CHANGED = "treatment_status_changed"
+    DOSE_RECORDED = "dose_recorded"
+    ALARM_CREATED = "alarm_created"
+    ALARM_UPDATED = "alarm_updated"
+    ALARM_DELETED = "alarm_deleted"
+
+
+class ActivityEvent(Base):
+    """
+    Evento de actividad (solo se inserta, nunca se modifica).
+
+    Los nombres de paciente y medicamento se copian al escribir para que el
+    feed se lea sin joins y sobreviva a la eliminación del paciente; por la
+    misma razón patient_id y treatment_id no son llaves foráneas.
+    """
+    __tablename__ = "activity_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    caregiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    type = Column(Enum(ActivityType), nullable=False)
+    action = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default="completed")
+
+    patient_id = Column(Integer, nullable=True)
+    patient_name = Column(String(255), nullable=True)
+    treatment_id = Column(Integer, nullable=True)
+    medication_name = Column(String(255), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_activity_events_caregiver_created", "caregiver_id", "created_at"),
+    )
@@ -1,7 +1,7 @@
 """
 Modelo de Alerta
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -24,7 +24,13 @@ class AlertSeverity(str, enum.Enum):
 
 
 class Alert(Base):
-    """Modelo de Alerta"""
+    """
+    Modelo de Alerta
+
+    dedupe_key identifica las alertas generadas automáticamente; el índice
+    único hace que dos procesos que generan la misma alerta a la vez
+    terminen en una sola fila.
+    """
     __tablename__ = "alerts"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -34,8 +40,17 @@ class Alert(Base):
     severity = Column(Enum(AlertSeverity), nullable=False)
     message = Column(Text, nullable=False)
     is_read = Column(Boolean, default=False)
+    dedupe_key = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relaciones
     patient = relationship("Patient", back_populates="alerts")
-    treatment = relationship("Treatment", back_populates="alerts")
\ No newline at end of file
+    treatment = relationship("Treatment", back_populates="alerts")
+
+    # Alertas sin leer de un paciente (más recientes primero) y deduplicación
+    # de alertas abiertas por tratamiento
+    __table_args__ = (
+        UniqueConstraint("dedupe_key", name="uq_alerts_dedupe_key"),
+        Index("ix_alerts_patient_read_created", "patient_id", "is_read", "created_at"),
+        Index("ix_alerts_treatment_type_read", "treatment_id", "type", "is_read"),
+    )
@@ -2,7 +2,7 @@
 """
 Modelo de Cumplimiento
 """
-from sqlalchemy import Column, Integer, Date, Float, ForeignKey
+from sqlalchemy import Column, Integer, Date, Float, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -20,4 +20,12 @@ class ComplianceRecord(Base):
     compliance_rate = Column(Float, default=0.0)  # Porcentaje
 
     # Relaciones
-    patient = relationship("Patient", back_populates="compliance_records")
\ No newline at end of file
+    patient = relationship("Patient", back_populates="compliance_records")
+
+    # Un registro por paciente y día (llave del upsert del rollup); también
+    # sirve las consultas por paciente y rango de fechas. El índice por
+    # fecha cubre las ventanas de todos los pacientes (reportes, alertas).
+    __table_args__ = (
+        UniqueConstraint("patient_id", "date", name="uq_compliance_records_patient_date"),
+        Index("ix_compliance_records_date", "date"),
+    )
\ No newline at end of file
@@ -2,10 +2,11 @@
 """
 Modelo de Registro de Dosis
 """
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, Text, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
+from datetime import datetime
 from app.core.database import Base
 
 
@@ -29,7 +30,27 @@ class DoseRecord(Base):
     status = Column(Enum(DoseStatus), default=DoseStatus.PENDING)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # UTC como scheduled_time; marca del rollup incremental de cumplimiento.
+    # Los upserts no aplican onupdate: quien los usa la asigna explícitamente
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relaciones
     treatment = relationship("Treatment", back_populates="dose_records")
     patient = relationship("Patient", back_populates="dose_records")
+
+    # Una dosis por tratamiento y hora programada (llave del upsert de la
+    # sincronización desde dispositivos y del calendario materializado).
+    # Índices según los accesos frecuentes (ver tests/test_query_plans.py):
+    # - (patient_id, status, scheduled_time): próxima dosis y dosis omitidas
+    # - (patient_id, status, actual_time): última dosis tomada
+    # - (patient_id, scheduled_time): rollup de cumplimiento por paciente y día
+    # - (status, scheduled_time): detector de dosis omitidas
+    # - (updated_at): días modificados desde el último rollup
+    __table_args__ = (
+        UniqueConstraint("treatment_id", "scheduled_time", name="uq_dose_records_treatment_scheduled"),
+        Index("ix_dose_records_patient_status_scheduled", "patient_id", "status", "scheduled_time"),
+        Index("ix_dose_records_patient_status_actual", "patient_id", "status", "actual_time"),
+        Index("ix_dose_records_patient_scheduled", "patient_id", "scheduled_time"),
+        Index("ix_dose_records_status_scheduled", "status", "scheduled_time"),
+        Index("ix_dose_records_updated_at", "updated_at"),
+    )
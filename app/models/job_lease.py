@@ -0,0 +1,21 @@
+"""
+Modelo de Concesión de Trabajo en Segundo Plano
+"""
+from sqlalchemy import Column, String, DateTime
+
+from app.core.database import Base
+
+
+class JobLease(Base):
+    """
+    Concesión de un trabajo periódico a un solo worker.
+
+    Cada worker de uvicorn arranca los mismos loops; el que tiene la
+    concesión vigente ejecuta el trabajo y la renueva en cada ciclo, los
+    demás lo omiten. Si el dueño muere, otro la toma al vencer expires_at.
+    """
+    __tablename__ = "job_leases"
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
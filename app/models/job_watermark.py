@@ -0,0 +1,22 @@
+"""
+Modelo de Marca de Trabajo en Segundo Plano
+"""
+from sqlalchemy import Column, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class JobWatermark(Base):
+    """
+    Avance persistido de un trabajo incremental (p. ej. el instante, en
+    segundos epoch, hasta el que agregó el rollup de cumplimiento).
+
+    Vive en la base de datos para que reiniciar el proceso, o tener varios
+    workers, no obligue a reprocesar la historia completa.
+    """
+    __tablename__ = "job_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """
 Modelo de Medicamento
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -18,6 +18,15 @@ class MedicationUnit(str, enum.Enum):
     patches = "patches"
 
 
+class MedicationCategory(str, enum.Enum):
+    """Categorías terapéuticas de medicamentos"""
+    CARDIOVASCULAR = "cardiovascular"
+    DIABETES = "diabetes"
+    ANALGESIC = "analgesic"
+    ANTIBIOTIC = "antibiotic"
+    OTHER = "other"
+
+
 
 class Medication(Base):
     """Modelo de Medicamento"""
@@ -47,10 +56,25 @@ class Medication(Base):
 
     # Relaciones
     treatments = relationship("Treatment", back_populates="medication", cascade="all, delete-orphan")
+    # Una fila por medicamento; se carga junto con el medicamento (selectin)
+    # para que `category` no dispare cargas perezosas en sesiones async
+    category_assignment = relationship(
+        "MedicationCategoryAssignment",
+        uselist=False,
+        lazy="selectin",
+        cascade="all, delete-orphan"
+    )
 
     def __repr__(self):
         return f"<Medication(id={self.id}, name='{self.name}', dosage='{self.dosage}{self.unit}')>"
 
+    @property
+    def category(self) -> "MedicationCategory":
+        """Categoría asignada (OTHER si aún no se clasifica)"""
+        if self.category_assignment is None:
+            return MedicationCategory.OTHER
+        return self.category_assignment.category
+
     @property
     def full_name(self) -> str:
         """Nombre completo del medicamento"""
@@ -78,4 +102,20 @@ class Medication(Base):
     def remove_contraindication(self, contraindication: str):
         """Remover contraindicación"""
         if self.contraindications and contraindication in self.contraindications:
-            self.contraindications.remove(contraindication)
\ No newline at end of file
+            self.contraindications.remove(contraindication)
+
+
+class MedicationCategoryAssignment(Base):
+    """
+    Categoría de un medicamento.
+
+    Se asigna al crear o actualizar el medicamento (reglas de
+    app/utils/medication_rules.py o valor manual) para que los reportes
+    agrupen por categoría con un GROUP BY indexado.
+    """
+    __tablename__ = "medication_categories"
+
+    medication_id = Column(Integer, ForeignKey("medications.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(Enum(MedicationCategory), nullable=False, index=True)
+    source = Column(String(10), nullable=False, default="rule")  # rule | manual
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
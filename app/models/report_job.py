@@ -0,0 +1,49 @@
+"""
+Modelo de Trabajo de Reporte
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+import enum
+
+from app.core.database import Base
+
+
+class ReportJobStatus(str, enum.Enum):
+    """Estados de un trabajo de reporte"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class ReportJob(Base):
+    """
+    Reporte generado en segundo plano.
+
+    dedupe_key solo tiene valor mientras el trabajo está pendiente o en
+    curso; el índice único hace que dos solicitudes idénticas simultáneas
+    terminen en el mismo trabajo. Al terminar se limpia para permitir
+    volver a pedir el mismo reporte.
+    """
+    __tablename__ = "report_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    requested_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    caregiver_id = Column(Integer, nullable=True)  # None = todos los pacientes (admin)
+
+    report_type = Column(String(30), nullable=False)
+    format = Column(String(10), nullable=False)
+    period = Column(String(10), nullable=False)
+
+    status = Column(Enum(ReportJobStatus), default=ReportJobStatus.PENDING, nullable=False)
+    dedupe_key = Column(String(100), nullable=True, unique=True)
+    file_path = Column(String(500), nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_report_jobs_status_created", "status", "created_at"),
+    )
@@ -4,7 +4,7 @@ Esquemas Pydantic para Medicamentos
 from pydantic import BaseModel, validator, Field
 from typing import Optional, List
 from datetime import datetime
-from app.models.medication import MedicationUnit
+from app.models.medication import MedicationUnit, MedicationCategory
 
 
 # Esquemas base
@@ -36,6 +36,7 @@ class MedicationCreate(MedicationBase):
     brand_name: Optional[str] = Field(None, max_length=255, description="Nombre comercial")
     generic_name: Optional[str] = Field(None, max_length=255, description="Nombre genérico")
     manufacturer: Optional[str] = Field(None, max_length=255, description="Fabricante")
+    category: Optional[MedicationCategory] = Field(None, description="Categoría (si se omite se clasifica automáticamente)")
 
     @validator('side_effects', 'contraindications')
     def validate_lists(cls, v):
@@ -57,6 +58,7 @@ class MedicationUpdate(BaseModel):
     brand_name: Optional[str] = Field(None, max_length=255)
     generic_name: Optional[str] = Field(None, max_length=255)
     manufacturer: Optional[str] = Field(None, max_length=255)
+    category: Optional[MedicationCategory] = None
 
     @validator('side_effects', 'contraindications')
     def validate_lists(cls, v):
@@ -73,6 +75,7 @@ class MedicationResponse(MedicationBase):
     brand_name: Optional[str] = None
     generic_name: Optional[str] = None
     manufacturer: Optional[str] = None
+    category: MedicationCategory = MedicationCategory.OTHER
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -5,6 +5,7 @@ from pydantic import BaseModel, validator, Field
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 from app.models.treatment import TreatmentStatus
+from app.models.dose_record import DoseStatus
 
 
 # Esquemas base
@@ -194,6 +195,24 @@ class DoseRecord(BaseModel):
         from_attributes = True
 
 
+class DoseEventCreate(BaseModel):
+    """Evento de dosis registrado en el dispositivo del paciente"""
+    scheduled_time: datetime = Field(..., description="Hora programada de la dosis (UTC si no trae zona)")
+    status: DoseStatus = Field(..., description="taken, missed o snoozed")
+    actual_time: Optional[datetime] = Field(None, description="Hora real en que se tomó")
+    notes: Optional[str] = Field(None, max_length=1000)
+
+
+class DoseEvent(DoseEventCreate):
+    """Evento de dosis dentro de un lote de sincronización"""
+    treatment_id: int
+
+
+class DoseEventBatch(BaseModel):
+    """Lote de eventos de dosis acumulados sin conexión"""
+    events: List[DoseEvent] = Field(..., min_length=1)
+
+
 class TreatmentAlarm(BaseModel):
     """Alarma de tratamiento"""
     id: int
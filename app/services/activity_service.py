@@ -0,0 +1,176 @@
+"""
+Servicio del feed de actividad
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import base64
+import logging
+
+from app.models.activity_event import ActivityEvent, ActivityType
+from app.models.medication import Medication
+from app.models.patient import Patient
+from app.models.treatment import Treatment
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(event: ActivityEvent) -> str:
+    """Cursor opaco con la posición (created_at, id) de un evento"""
+    raw = f"{event.created_at.isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodificar cursor; lanza ValueError si no es válido"""
+    try:
+        created_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(event_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def time_ago(moment: datetime) -> str:
+    """Texto relativo ("Hace 2 hora(s)") para el feed"""
+    now = datetime.now(moment.tzinfo) if moment.tzinfo else datetime.now()
+    time_diff = now - moment
+    if time_diff.days > 0:
+        return f"Hace {time_diff.days} día(s)"
+    if time_diff.seconds >= 3600:
+        return f"Hace {time_diff.seconds // 3600} hora(s)"
+    return f"Hace {time_diff.seconds // 60} minuto(s)"
+
+
+class ActivityService:
+    """
+    Servicio para el feed de actividad.
+
+    Los métodos record* solo agregan el evento a la sesión: quien llama
+    hace el commit junto con el cambio que lo origina.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def record(
+            self,
+            caregiver_id: int,
+            type: ActivityType,
+            action: str,
+            status: str = "completed",
+            patient_id: Optional[int] = None,
+            patient_name: Optional[str] = None,
+            treatment_id: Optional[int] = None,
+            medication_name: Optional[str] = None
+    ) -> ActivityEvent:
+        """Registrar evento"""
+        event = ActivityEvent(
+            caregiver_id=caregiver_id,
+            type=type,
+            action=action,
+            status=status,
+            patient_id=patient_id,
+            patient_name=patient_name,
+            treatment_id=treatment_id,
+            medication_name=medication_name
+        )
+        self.db.add(event)
+        return event
+
+    def record_patient_event(
+            self,
+            patient: Patient,
+            type: ActivityType,
+            action: str,
+            status: str = "completed"
+    ) -> ActivityEvent:
+        """Registrar evento de un paciente"""
+        return self.record(
+            caregiver_id=patient.caregiver_id,
+            type=type,
+            action=action,
+            status=status,
+            patient_id=patient.id,
+            patient_name=patient.name
+        )
+
+    async def record_treatment_event(
+            self,
+            treatment_id: int,
+            type: ActivityType,
+            action: str,
+            status: str = "completed"
+    ) -> Optional[ActivityEvent]:
+        """Registrar evento de un tratamiento (una consulta para cuidador y nombres)"""
+        row = (await self.db.execute(
+            select(Patient.caregiver_id, Patient.id, Patient.name, Medication.name)
+            .select_from(Treatment)
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .join(Medication, Treatment.medication_id == Medication.id)
+            .filter(Treatment.id == treatment_id)
+        )).first()
+        if row is None:
+            logger.warning(f"No se registró actividad: tratamiento {treatment_id} no encontrado")
+            return None
+
+        caregiver_id, patient_id, patient_name, medication_name = row
+        return self.record(
+            caregiver_id=caregiver_id,
+            type=type,
+            action=action,
+            status=status,
+            patient_id=patient_id,
+            patient_name=patient_name,
+            treatment_id=treatment_id,
+            medication_name=medication_name
+        )
+
+    async def get_feed(
+            self,
+            caregiver_id: Optional[int],
+            limit: int = 20,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[ActivityEvent], Optional[str]]:
+        """
+        Página del feed, del más reciente al más antiguo.
+
+        Paginación por llave (created_at, id): cada página es un rango sobre
+        ix_activity_events_caregiver_created sin importar el tamaño del
+        historial. caregiver_id=None devuelve el feed global (admin).
+        """
+        query = select(ActivityEvent)
+        if caregiver_id is not None:
+            query = query.filter(ActivityEvent.caregiver_id == caregiver_id)
+
+        if cursor:
+            created_at, event_id = decode_cursor(cursor)
+            query = query.filter(
+                tuple_(ActivityEvent.created_at, ActivityEvent.id) < tuple_(created_at, event_id)
+            )
+
+        query = query.order_by(
+            ActivityEvent.created_at.desc(),
+            ActivityEvent.id.desc()
+        ).limit(limit + 1)
+
+        events = (await self.db.execute(query)).scalars().all()
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = encode_cursor(events[-1])
+        return events, next_cursor
+
+    @staticmethod
+    def to_feed_item(event: ActivityEvent) -> Dict[str, Any]:
+        """Formato de /dashboard/recent-activity"""
+        return {
+            "id": f"activity_{event.id}",
+            "type": event.type.value,
+            "patient": event.patient_name or "Sistema",
+            "action": event.action,
+            "medication": event.medication_name or "Sistema",
+            "time": time_ago(event.created_at),
+            "createdAt": event.created_at.isoformat(),
+            "status": event.status
+        }
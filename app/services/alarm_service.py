@@ -0,0 +1,94 @@
+"""
+Servicio de próximas dosis a partir del calendario materializado
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
+import logging
+
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import Medication
+from app.models.patient import Patient
+from app.models.treatment import Treatment, TreatmentStatus
+from app.utils.date_utils import get_zone, to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+
+class UpcomingDoseService:
+    """
+    Próximas dosis de un cuidador (None = vista global del admin).
+
+    Lee las dose_records PENDING que mantiene DoseScheduleService para las
+    próximas DOSE_SCHEDULE_HORIZON_HOURS horas: una consulta ordenada por
+    scheduled_time con LIMIT sobre el índice (status, scheduled_time). Al
+    vivir en la base de datos todos los workers ven el mismo calendario, sin
+    índices en memoria que invalidar.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_upcoming(
+            self,
+            caregiver_id: Optional[int],
+            limit: int = 5,
+            now: Optional[datetime] = None
+    ) -> List[Tuple[datetime, Dict[str, Any]]]:
+        """Próximas dosis (fire_at_utc, datos de la dosis) del cuidador"""
+        now = to_utc_naive(now or datetime.now(timezone.utc))
+        query = (
+            select(
+                DoseRecord.id,
+                DoseRecord.scheduled_time,
+                Treatment.id.label("treatment_id"),
+                Treatment.dosage,
+                Patient.id.label("patient_id"),
+                Patient.name.label("patient_name"),
+                Patient.timezone,
+                Medication.name.label("medication_name")
+            )
+            .join(Treatment, DoseRecord.treatment_id == Treatment.id)
+            .join(Patient, DoseRecord.patient_id == Patient.id)
+            .join(Medication, Treatment.medication_id == Medication.id)
+            .filter(
+                DoseRecord.status == DoseStatus.PENDING,
+                DoseRecord.scheduled_time > now,
+                # La siguiente pasada del calendario elimina las de
+                # tratamientos que dejaron de estar activos
+                Treatment.status == TreatmentStatus.ACTIVE
+            )
+            .order_by(DoseRecord.scheduled_time, DoseRecord.id)
+            .limit(limit)
+        )
+        if caregiver_id is not None:
+            query = query.filter(Patient.caregiver_id == caregiver_id)
+
+        return [
+            (to_utc_naive(row.scheduled_time).replace(tzinfo=timezone.utc), dict(row._mapping))
+            for row in (await self.db.execute(query)).all()
+        ]
+
+
+def format_upcoming_dose(fire_at: datetime, dose: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Formato de /dashboard/upcoming-doses (hora local del paciente)"""
+    local_time = fire_at.astimezone(get_zone(dose["timezone"]))
+    minutes_left = (fire_at - now).total_seconds() / 60
+
+    if minutes_left <= 60:
+        priority = "high"
+    elif minutes_left <= 180:
+        priority = "medium"
+    else:
+        priority = "low"
+
+    return {
+        "id": f"dose_{dose['treatment_id']}_{dose['id']}",
+        "patient": dose["patient_name"],
+        "medication": f"{dose['medication_name']} ({dose['dosage']})",
+        "time": local_time.strftime("%H:%M"),
+        "scheduledAt": fire_at.isoformat(),
+        "timezone": dose["timezone"],
+        "priority": priority
+    }
@@ -0,0 +1,356 @@
+"""
+Servicio de generación de alertas
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, or_
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple, NamedTuple
+from datetime import date, datetime, timedelta, timezone
+import logging
+
+from app.core.config import get_settings
+from app.core.database import build_upsert
+from app.models.alert import Alert, AlertType, AlertSeverity
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import Medication
+from app.models.patient import Patient
+from app.models.treatment import Treatment, TreatmentStatus
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.report_service import report_cache
+from app.utils.date_utils import get_zone, to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+INSERT_BATCH_SIZE = 1000
+
+# Mínimo de dosis en la ventana para evaluar cumplimiento (evita alertas
+# por una sola dosis omitida de un tratamiento que recién empieza)
+LOW_COMPLIANCE_MIN_DOSES = 3
+
+
+class MissedDose(NamedTuple):
+    """Dosis omitida publicada en alert_events (mismas columnas que las filas de mark_missed)"""
+    treatment_id: int
+    patient_id: int
+    caregiver_id: int
+    scheduled_time: datetime
+    timezone: Optional[str]
+    medication_name: str
+    dosage: str
+
+
+class AlertEvents:
+    """
+    Cambios de dosis y cumplimiento pendientes de convertirse en alertas.
+
+    Los servicios que escriben dosis los publican después del commit y
+    alert_generation_loop los toma cada ALERT_BATCH_INTERVAL segundos. Los
+    eventos repetidos se fusionan aquí mismo: un tratamiento con varias
+    dosis omitidas o un paciente con muchos cambios cuentan una sola vez
+    por lote.
+    """
+
+    def __init__(self):
+        self.missed_doses: Dict[int, List[Any]] = {}
+        self.patient_ids: Set[int] = set()
+
+    def doses_missed(self, doses: Iterable[Any]):
+        """Dosis marcadas como omitidas (filas de mark_missed o MissedDose)"""
+        for dose in doses:
+            self.missed_doses.setdefault(dose.treatment_id, []).append(dose)
+            self.patient_ids.add(dose.patient_id)
+
+    def compliance_changed(self, patient_ids: Iterable[int]):
+        """Pacientes cuyo cumplimiento se recalculó"""
+        self.patient_ids.update(patient_ids)
+
+    def drain(self) -> Tuple[Dict[int, List[Any]], Set[int]]:
+        """Tomar los eventos acumulados"""
+        missed_doses, self.missed_doses = self.missed_doses, {}
+        patient_ids, self.patient_ids = self.patient_ids, set()
+        return missed_doses, patient_ids
+
+    def requeue(self, missed_doses: Dict[int, List[Any]], patient_ids: Set[int]):
+        """Devolver un lote tomado con drain() que no se pudo procesar"""
+        for treatment_id, doses in missed_doses.items():
+            self.missed_doses.setdefault(treatment_id, []).extend(doses)
+        self.patient_ids.update(patient_ids)
+
+
+alert_events = AlertEvents()
+
+
+class AlertService:
+    """
+    Servicio que convierte eventos de dosis y cumplimiento en alertas.
+
+    Las alertas se deduplican contra las ya abiertas antes de insertarse
+    por lotes, así el volumen queda acotado aunque lleguen muchos eventos;
+    la dedupe_key única cubre a los workers que generan la misma alerta a
+    la vez:
+
+    - MISSED_DOSE: una por tratamiento y día UTC de la dosis; las demás
+      omitidas de ese día no generan otra.
+    - LOW_COMPLIANCE: una por paciente, y no más de una cada
+      LOW_COMPLIANCE_ALERT_COOLDOWN_HOURS aunque ya se haya leído.
+    - TREATMENT_END: una por tratamiento.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._created: Dict[int, int] = {}
+        self._stale: Set[int] = set()
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insertar alertas por lotes; rows incluyen caregiver_id (no es columna).
+        Devuelve cuántas se insertaron.
+
+        Las filas cuya dedupe_key ya existe (otro proceso generó la misma
+        alerta entre la revisión y el insert) se omiten.
+        """
+        stmt = build_upsert(self.db, Alert.__table__, key_columns=["dedupe_key"], update_columns=[])
+        inserted = 0
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            caregiver_ids = [row.pop("caregiver_id") for row in batch]
+            result = await self.db.execute(stmt, batch)
+            if result.rowcount == len(batch):
+                for caregiver_id in caregiver_ids:
+                    self._created[caregiver_id] = self._created.get(caregiver_id, 0) + 1
+            else:
+                # No se sabe cuáles se omitieron: recalcular sus contadores
+                self._stale.update(caregiver_ids)
+            inserted += result.rowcount
+        return inserted
+
+    async def _alerted(self, type: AlertType, column, ids: Iterable[int], *conditions) -> Set[int]:
+        """Ids (de paciente o tratamiento) que ya tienen una alerta del tipo"""
+        ids = set(ids)
+        if not ids:
+            return set()
+        query = select(column).filter(Alert.type == type, column.in_(ids)).distinct()
+        if conditions:
+            query = query.filter(*conditions)
+        return set((await self.db.execute(query)).scalars().all())
+
+    async def create_missed_dose_alerts(self, missed_doses: Dict[int, List[Any]]) -> int:
+        """
+        Una alerta MISSED_DOSE por tratamiento y día UTC con dosis omitidas.
+
+        `missed_doses` agrupa por tratamiento las filas de
+        DoseService.mark_missed (treatment_id, patient_id, caregiver_id,
+        scheduled_time en UTC, timezone, medication_name y dosage).
+        """
+        if not missed_doses:
+            return 0
+        # La llave lleva el día de la dosis: no depende de que alguien marque
+        # la alerta como leída para que al día siguiente se pueda crear otra
+        groups: Dict[str, List[Any]] = {}
+        for treatment_id, doses in missed_doses.items():
+            for dose in doses:
+                day = to_utc_naive(dose.scheduled_time).date()
+                groups.setdefault(f"missed_dose:{treatment_id}:{day.isoformat()}", []).append(dose)
+
+        existing = set((await self.db.execute(
+            select(Alert.dedupe_key).filter(Alert.dedupe_key.in_(groups))
+        )).scalars().all())
+
+        rows = []
+        for dedupe_key, doses in groups.items():
+            if dedupe_key in existing:
+                continue
+            last = max(doses, key=lambda dose: to_utc_naive(dose.scheduled_time))
+            local_time = (
+                to_utc_naive(last.scheduled_time)
+                .replace(tzinfo=timezone.utc)
+                .astimezone(get_zone(last.timezone))
+            )
+            if len(doses) == 1:
+                message = (
+                    f"Dosis omitida: {last.medication_name} ({last.dosage}) "
+                    f"programada para las {local_time:%H:%M} del {local_time:%d/%m/%Y}"
+                )
+            else:
+                message = (
+                    f"{len(doses)} dosis omitidas de {last.medication_name} ({last.dosage}); "
+                    f"la última programada para las {local_time:%H:%M} del {local_time:%d/%m/%Y}"
+                )
+            rows.append({
+                "patient_id": last.patient_id,
+                "treatment_id": last.treatment_id,
+                "caregiver_id": last.caregiver_id,
+                "type": AlertType.MISSED_DOSE,
+                "dedupe_key": dedupe_key,
+                "severity": AlertSeverity.HIGH if len(doses) > 1 else AlertSeverity.MEDIUM,
+                "message": message,
+                "is_read": False
+            })
+
+        return await self._insert(rows)
+
+    async def check_low_compliance(self, patient_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Alertar pacientes bajo COMPLIANCE_THRESHOLD en los últimos
+        LOW_COMPLIANCE_WINDOW_DAYS días (None = todos los pacientes).
+
+        La alerta se asocia al tratamiento con más dosis omitidas de la
+        ventana.
+        """
+        since = date.today() - timedelta(days=settings.LOW_COMPLIANCE_WINDOW_DAYS)
+        scheduled = func.sum(ComplianceRecord.scheduled_doses)
+        rate = 100.0 * func.sum(ComplianceRecord.taken_doses) / scheduled
+        query = (
+            select(ComplianceRecord.patient_id, rate.label("rate"))
+            .filter(ComplianceRecord.date >= since)
+            .group_by(ComplianceRecord.patient_id)
+            .having(scheduled >= LOW_COMPLIANCE_MIN_DOSES, rate < settings.COMPLIANCE_THRESHOLD)
+        )
+        if patient_ids is not None:
+            patient_ids = set(patient_ids)
+            if not patient_ids:
+                return 0
+            query = query.filter(ComplianceRecord.patient_id.in_(patient_ids))
+        low = {row.patient_id: float(row.rate) for row in (await self.db.execute(query)).all()}
+
+        cooldown = datetime.utcnow() - timedelta(hours=settings.LOW_COMPLIANCE_ALERT_COOLDOWN_HOURS)
+        low_ids = set(low) - await self._alerted(
+            AlertType.LOW_COMPLIANCE, Alert.patient_id, low,
+            or_(Alert.is_read == False, Alert.created_at >= cooldown)
+        )
+        if not low_ids:
+            return 0
+
+        # Tratamiento con más dosis omitidas de cada paciente en la ventana
+        missed = func.sum(case((DoseRecord.status == DoseStatus.MISSED, 1), else_=0))
+        treatments = (await self.db.execute(
+            select(
+                DoseRecord.patient_id,
+                DoseRecord.treatment_id,
+                missed.label("missed"),
+                Patient.caregiver_id,
+                Patient.name.label("patient_name"),
+                Medication.name.label("medication_name")
+            )
+            .join(Patient, DoseRecord.patient_id == Patient.id)
+            .join(Treatment, DoseRecord.treatment_id == Treatment.id)
+            .join(Medication, Treatment.medication_id == Medication.id)
+            .filter(
+                DoseRecord.patient_id.in_(low_ids),
+                DoseRecord.scheduled_time >= datetime.combine(since, datetime.min.time())
+            )
+            .group_by(
+                DoseRecord.patient_id, DoseRecord.treatment_id,
+                Patient.caregiver_id, Patient.name, Medication.name
+            )
+        )).all()
+        worst: Dict[int, Any] = {}
+        for row in treatments:
+            if row.patient_id not in worst or row.missed > worst[row.patient_id].missed:
+                worst[row.patient_id] = row
+
+        # Un periodo de cooldown por llave: dos procesos que revisan a la vez
+        # generan la misma
+        cooldown_bucket = int(datetime.utcnow().timestamp() // (settings.LOW_COMPLIANCE_ALERT_COOLDOWN_HOURS * 3600))
+        rows = []
+        for patient_id, treatment in worst.items():
+            patient_rate = low[patient_id]
+            rows.append({
+                "patient_id": patient_id,
+                "treatment_id": treatment.treatment_id,
+                "caregiver_id": treatment.caregiver_id,
+                "type": AlertType.LOW_COMPLIANCE,
+                "dedupe_key": f"low_compliance:{patient_id}:{cooldown_bucket}",
+                "severity": AlertSeverity.HIGH if patient_rate < settings.COMPLIANCE_THRESHOLD / 2 else AlertSeverity.MEDIUM,
+                "message": (
+                    f"Cumplimiento de {treatment.patient_name} en {patient_rate:.0f}% "
+                    f"en los últimos {settings.LOW_COMPLIANCE_WINDOW_DAYS} días "
+                    f"(mínimo {settings.COMPLIANCE_THRESHOLD:.0f}%); "
+                    f"más dosis omitidas: {treatment.medication_name}"
+                ),
+                "is_read": False
+            })
+
+        return await self._insert(rows)
+
+    async def check_treatment_ends(self) -> int:
+        """Alertar tratamientos activos que terminan en TREATMENT_END_ALERT_DAYS días"""
+        today = date.today()
+        ending = (await self.db.execute(
+            select(
+                Treatment.id,
+                Treatment.patient_id,
+                Treatment.end_date,
+                Patient.caregiver_id,
+                Patient.name.label("patient_name"),
+                Medication.name.label("medication_name")
+            )
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .join(Medication, Treatment.medication_id == Medication.id)
+            .filter(
+                Treatment.status == TreatmentStatus.ACTIVE,
+                Treatment.end_date >= today,
+                Treatment.end_date <= today + timedelta(days=settings.TREATMENT_END_ALERT_DAYS)
+            )
+        )).all()
+
+        alerted = await self._alerted(AlertType.TREATMENT_END, Alert.treatment_id, {row.id for row in ending})
+        rows = []
+        for row in ending:
+            if row.id in alerted:
+                continue
+            days_left = (row.end_date - today).days
+            when = "hoy" if days_left == 0 else f"en {days_left} día(s)"
+            rows.append({
+                "patient_id": row.patient_id,
+                "treatment_id": row.id,
+                "caregiver_id": row.caregiver_id,
+                "type": AlertType.TREATMENT_END,
+                "dedupe_key": f"treatment_end:{row.id}",
+                "severity": AlertSeverity.LOW,
+                "message": f"El tratamiento de {row.medication_name} de {row.patient_name} termina {when}",
+                "is_read": False
+            })
+
+        return await self._insert(rows)
+
+    async def generate(
+            self,
+            missed_doses: Dict[int, List[Any]],
+            patient_ids: Optional[Set[int]],
+            sweep: bool = False
+    ) -> int:
+        """
+        Procesar un lote de eventos y hacer commit; devuelve alertas creadas.
+
+        sweep=True revisa además el cumplimiento de todos los pacientes y
+        los tratamientos por terminar (recupera eventos que se perdieron
+        al reiniciar el proceso o que ocurrieron en otro).
+        """
+        created = 0
+        if missed_doses:
+            created += await self.create_missed_dose_alerts(missed_doses)
+        if sweep:
+            created += await self.check_low_compliance()
+            created += await self.check_treatment_ends()
+        elif patient_ids:
+            created += await self.check_low_compliance(patient_ids)
+
+        if not created:
+            return 0
+
+        await self.db.commit()
+        for caregiver_id, count in self._created.items():
+            if caregiver_id not in self._stale:
+                dashboard_snapshots.unread_alerts_changed(caregiver_id, count)
+        for caregiver_id in self._stale:
+            dashboard_snapshots.invalidate(caregiver_id, "stats")
+        for caregiver_id in set(self._created) | self._stale:
+            report_cache.bump(caregiver_id)
+        self._created = {}
+        self._stale = set()
+
+        logger.info(f"Alertas generadas: {created}")
+        return created
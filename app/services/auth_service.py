@@ -1,32 +1,35 @@
 """
 Servicio de autenticación
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import Optional
 
 from app.models.user import User
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async, principal_cache
 
 
 class AuthService:
     """Servicio para manejo de autenticación"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_user_by_email(self, email: str) -> Optional[User]:
+    async def get_user_by_email(self, email: str) -> Optional[User]:
         """Obtener usuario por email"""
-        return self.db.query(User).filter(User.email == email).first()
+        result = await self.db.execute(select(User).filter(User.email == email))
+        return result.scalars().first()
 
-    def get_user_by_id(self, user_id: int) -> Optional[User]:
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Obtener usuario por ID"""
-        return self.db.query(User).filter(User.id == user_id).first()
+        result = await self.db.execute(select(User).filter(User.id == user_id))
+        return result.scalars().first()
 
-    def create_user(self, user_data: UserCreate) -> User:
+    async def create_user(self, user_data: UserCreate) -> User:
         """Crear nuevo usuario"""
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
 
         db_user = User(
             email=user_data.email,
@@ -37,30 +40,30 @@ class AuthService:
         )
 
         self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
+        await self.db.commit()
+        await self.db.refresh(db_user)
 
         return db_user
 
-    def authenticate_user(self, email: str, password: str) -> Optional[User]:
+    async def authenticate_user(self, email: str, password: str) -> Optional[User]:
         """Autenticar usuario"""
-        user = self.get_user_by_email(email)
+        user = await self.get_user_by_email(email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             return None
         return user
 
-    def update_last_login(self, user_id: int):
+    async def update_last_login(self, user_id: int):
         """Actualizar último login"""
-        user = self.get_user_by_id(user_id)
+        user = await self.get_user_by_id(user_id)
         if user:
             user.last_login = datetime.utcnow()
-            self.db.commit()
+            await self.db.commit()
 
-    def update_user(self, user_id: int, user_data: dict) -> Optional[User]:
+    async def update_user(self, user_id: int, user_data: dict) -> Optional[User]:
         """Actualizar usuario"""
-        user = self.get_user_by_id(user_id)
+        user = await self.get_user_by_id(user_id)
         if not user:
             return None
 
@@ -68,24 +71,28 @@ class AuthService:
             if hasattr(user, field):
                 setattr(user, field, value)
 
-        self.db.commit()
-        self.db.refresh(user)
+        await self.db.commit()
+        await self.db.refresh(user)
+        principal_cache.invalidate(user_id)
         return user
 
-    def update_password(self, user_id: int, new_password: str):
+    async def update_password(self, user_id: int, new_password: str):
         """Actualizar contraseña"""
-        user = self.get_user_by_id(user_id)
+        user = await self.get_user_by_id(user_id)
         if user:
-            user.hashed_password = get_password_hash(new_password)
-            self.db.commit()
+            user.hashed_password = await get_password_hash_async(new_password)
+            await self.db.commit()
+            principal_cache.invalidate(user_id)
 
-    def get_users(self, skip: int = 0, limit: int = 100):
+    async def get_users(self, skip: int = 0, limit: int = 100):
         """Obtener lista de usuarios"""
-        return self.db.query(User).offset(skip).limit(limit).all()
+        result = await self.db.execute(select(User).offset(skip).limit(limit))
+        return result.scalars().all()
 
-    def toggle_user_status(self, user_id: int):
+    async def toggle_user_status(self, user_id: int):
         """Activar/desactivar usuario"""
-        user = self.get_user_by_id(user_id)
+        user = await self.get_user_by_id(user_id)
         if user:
             user.is_active = not user.is_active
-            self.db.commit()
\ No newline at end of file
+            await self.db.commit()
+            principal_cache.invalidate(user_id)
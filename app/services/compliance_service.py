@@ -0,0 +1,205 @@
+"""
+Servicio de rollup de cumplimiento diario
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, case
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+import logging
+
+from app.core.database import build_upsert
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.job_watermark import JobWatermark
+from app.models.patient import Patient
+from app.utils.date_utils import to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH_SIZE = 1000
+
+# Pacientes por transacción en la reconstrucción inicial de la historia
+REBUILD_PATIENT_BATCH = 500
+
+# Instante UTC (segundos epoch) hasta el que se agregaron las dosis modificadas
+WATERMARK_NAME = "compliance_rollup_updated_at"
+
+# Margen para transacciones que asignaron updated_at antes del inicio del
+# ciclo anterior pero hicieron commit después
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def _as_date(value) -> date:
+    """func.date() devuelve date en MySQL y texto en SQLite"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _to_epoch(value: datetime) -> int:
+    """Segundos epoch de un datetime UTC sin zona"""
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+class ComplianceService:
+    """
+    Servicio que agrega dose_records en compliance_records (paciente + día).
+
+    Cada fila de compliance_records es el resultado completo del día, así
+    que volver a agregar un día es idempotente y el upsert por
+    (patient_id, date) solo reemplaza los contadores.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _aggregate(self, *conditions) -> List[Dict[str, Any]]:
+        """Agregar dosis por paciente y día con las condiciones dadas"""
+        day = func.date(DoseRecord.scheduled_time)
+        query = select(
+            DoseRecord.patient_id,
+            day.label("day"),
+            func.count(DoseRecord.id).label("scheduled"),
+            func.coalesce(func.sum(case((DoseRecord.status == DoseStatus.TAKEN, 1), else_=0)), 0).label("taken"),
+            func.coalesce(func.sum(case((DoseRecord.status == DoseStatus.MISSED, 1), else_=0)), 0).label("missed")
+        ).filter(
+            # Las pendientes son el calendario materializado: aún sin resultado
+            DoseRecord.status != DoseStatus.PENDING
+        ).group_by(DoseRecord.patient_id, day)
+        if conditions:
+            query = query.filter(*conditions)
+
+        rows = []
+        for row in (await self.db.execute(query)).all():
+            scheduled = int(row.scheduled)
+            taken = int(row.taken)
+            rows.append({
+                "patient_id": row.patient_id,
+                "date": _as_date(row.day),
+                "scheduled_doses": scheduled,
+                "taken_doses": taken,
+                "missed_doses": int(row.missed),
+                "compliance_rate": round(taken / scheduled * 100, 2) if scheduled else 0.0
+            })
+        return rows
+
+    async def _upsert(self, rows: List[Dict[str, Any]]):
+        """Escribir filas de cumplimiento por lotes"""
+        stmt = build_upsert(
+            self.db,
+            ComplianceRecord.__table__,
+            key_columns=["patient_id", "date"],
+            update_columns=["scheduled_doses", "taken_doses", "missed_doses", "compliance_rate"]
+        )
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            await self.db.execute(stmt, rows[start:start + UPSERT_BATCH_SIZE])
+
+    async def _delete_stale(self, keys: Iterable[Tuple[int, date]], *conditions):
+        """Eliminar filas de cumplimiento (con las condiciones) que no están en keys"""
+        keys = set(keys)
+        existing = (await self.db.execute(
+            select(ComplianceRecord.id, ComplianceRecord.patient_id, ComplianceRecord.date)
+            .filter(*conditions)
+        )).all()
+        stale_ids = [row.id for row in existing if (row.patient_id, row.date) not in keys]
+        for start in range(0, len(stale_ids), UPSERT_BATCH_SIZE):
+            await self.db.execute(
+                delete(ComplianceRecord).where(ComplianceRecord.id.in_(stale_ids[start:start + UPSERT_BATCH_SIZE]))
+            )
+        return len(stale_ids)
+
+    async def rollup_days(self, keys: Iterable[Tuple[int, date]]) -> int:
+        """
+        Recalcular días concretos (paciente, día UTC).
+
+        Lo usan quienes escriben dosis para reflejar el cambio sin esperar
+        al siguiente ciclo del job, y el propio job con los días que
+        cambiaron. Se agrega un día a la vez (solo sus pacientes) para que
+        días dispersos no recorran el rango completo entre ellos. Los días
+        que ya no tienen dosis registradas se eliminan. No hace commit.
+        """
+        by_day: Dict[date, set] = {}
+        for patient_id, day in keys:
+            by_day.setdefault(day, set()).add(patient_id)
+
+        total = 0
+        for day, patient_ids in sorted(by_day.items()):
+            start = datetime.combine(day, time.min)
+            rows = await self._aggregate(
+                DoseRecord.patient_id.in_(patient_ids),
+                DoseRecord.scheduled_time >= start,
+                DoseRecord.scheduled_time < start + timedelta(days=1)
+            )
+            await self._upsert(rows)
+
+            found = {row["patient_id"] for row in rows}
+            if patient_ids - found:
+                await self._delete_stale(
+                    {(patient_id, day) for patient_id in found},
+                    ComplianceRecord.patient_id.in_(patient_ids - found),
+                    ComplianceRecord.date == day
+                )
+            total += len(rows)
+        return total
+
+    async def _load_watermark(self) -> Optional[int]:
+        return await self.db.scalar(select(JobWatermark.value).filter(JobWatermark.name == WATERMARK_NAME))
+
+    async def _save_watermark(self, value: int):
+        stmt = build_upsert(self.db, JobWatermark.__table__, key_columns=["name"], update_columns=["value"])
+        await self.db.execute(stmt, [{"name": WATERMARK_NAME, "value": value}])
+
+    async def _rebuild(self) -> int:
+        """
+        Reconstruir toda la historia, por lotes de pacientes con su propio
+        commit (solo la primera vez: después la marca persiste).
+        """
+        patient_ids = (await self.db.execute(select(Patient.id).order_by(Patient.id))).scalars().all()
+        total = 0
+        for start in range(0, len(patient_ids), REBUILD_PATIENT_BATCH):
+            batch = patient_ids[start:start + REBUILD_PATIENT_BATCH]
+            rows = await self._aggregate(DoseRecord.patient_id.in_(batch))
+            await self._upsert(rows)
+            await self._delete_stale(
+                {(row["patient_id"], row["date"]) for row in rows},
+                ComplianceRecord.patient_id.in_(batch)
+            )
+            await self.db.commit()
+            total += len(rows)
+        return total
+
+    async def rollup(self, now: Optional[datetime] = None) -> int:
+        """
+        Rollup incremental a partir de la marca guardada en job_watermarks
+        (instante UTC del último ciclo); devuelve días-paciente escritos.
+
+        Sin marca (primera ejecución) se reconstruye la historia. Con marca
+        solo se recalculan los (paciente, día UTC) de las dosis con
+        updated_at posterior, sin importar qué tan atrás estén programadas.
+        La marca retrocede WATERMARK_OVERLAP para no perder dosis escritas
+        con updated_at anterior al ciclo pero confirmadas después.
+        """
+        started = now or datetime.utcnow()
+        watermark = await self._load_watermark()
+        if watermark is None:
+            total = await self._rebuild()
+            await self._save_watermark(_to_epoch(started))
+            await self.db.commit()
+            logger.info(f"Rollup de cumplimiento completo: {total} días-paciente")
+            return total
+
+        since = datetime.utcfromtimestamp(watermark) - WATERMARK_OVERLAP
+        # Rango sobre el índice de updated_at; los días se deduplican aquí
+        touched = (await self.db.execute(
+            select(DoseRecord.patient_id, DoseRecord.scheduled_time)
+            .filter(
+                DoseRecord.updated_at > since,
+                # Las pendientes no cuentan en el cumplimiento
+                DoseRecord.status != DoseStatus.PENDING
+            )
+        )).all()
+        keys = {(patient_id, to_utc_naive(scheduled_time).date()) for patient_id, scheduled_time in touched}
+        total = await self.rollup_days(keys)
+
+        await self._save_watermark(_to_epoch(started))
+        await self.db.commit()
+        logger.info(f"Rollup de cumplimiento: {len(keys)} días modificados, {total} días-paciente escritos")
+        return total
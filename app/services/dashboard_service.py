@@ -0,0 +1,415 @@
+"""
+Servicio de métricas del dashboard
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, true
+from typing import Optional, Dict, Any, Set
+from datetime import datetime, date, time, timedelta
+
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.models.patient import Patient
+from app.models.treatment import Treatment, TreatmentStatus
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.alert import Alert
+import logging
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Estados de tratamiento que se reportan por separado en las métricas
+TREATMENT_METRIC_KEYS = {
+    TreatmentStatus.ACTIVE: "active",
+    TreatmentStatus.COMPLETED: "completed",
+    TreatmentStatus.SUSPENDED: "suspended"
+}
+
+
+def format_stats(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir contadores en la respuesta de /dashboard/stats"""
+    taken = counters["takenDoses"]
+    resolved = taken + counters["missedDoses"]
+    return {
+        "totalPatients": counters["totalPatients"],
+        "activeTreatments": counters["activeTreatments"],
+        "todayDoses": counters["todayDoses"],
+        "pendingAlerts": counters["pendingAlerts"],
+        "complianceRate": round(taken / resolved * 100, 1) if resolved else 0
+    }
+
+
+def empty_patient_metrics() -> Dict[str, Any]:
+    """Métricas de pacientes en cero"""
+    return {
+        "total": 0,
+        "byGender": {"male": 0, "female": 0, "other": 0},
+        "withMedicalHistory": 0,
+        "withAllergies": 0,
+        "ageGroups": {"under18": 0, "adult": 0, "senior": 0}
+    }
+
+
+def empty_treatment_metrics() -> Dict[str, Any]:
+    """Métricas de tratamientos en cero"""
+    return {"total": 0, "active": 0, "completed": 0, "suspended": 0}
+
+
+def years_before(today: date, years: int) -> date:
+    """Misma fecha N años antes (29 de febrero pasa a 28)"""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_group(date_of_birth: date, today: date) -> str:
+    """Grupo de edad de un paciente"""
+    age = today.year - date_of_birth.year
+    if (today.month, today.day) < (date_of_birth.month, date_of_birth.day):
+        age -= 1
+
+    if age < 18:
+        return "under18"
+    if age < 65:
+        return "adult"
+    return "senior"
+
+
+def add_patient_to_metrics(metrics: Dict[str, Any], patient: Patient, today: date, sign: int = 1):
+    """Sumar (o restar con sign=-1) un paciente a las métricas de pacientes"""
+    metrics["total"] += sign
+    gender = patient.gender.value if patient.gender else None
+    if gender in metrics["byGender"]:
+        metrics["byGender"][gender] += sign
+    if patient.medical_history:
+        metrics["withMedicalHistory"] += sign
+    if patient.allergies:
+        metrics["withAllergies"] += sign
+    metrics["ageGroups"][age_group(patient.date_of_birth, today)] += sign
+
+
+class DashboardService:
+    """Servicio para métricas del dashboard"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def _scope(query, caregiver_id: Optional[int]):
+        """Limitar una consulta ya unida a Patient a los pacientes del cuidador"""
+        if caregiver_id is None:
+            return query
+        return query.filter(Patient.caregiver_id == caregiver_id)
+
+    async def get_stats_counters(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Contadores de las estadísticas principales en una sola consulta.
+
+        Cada sección es un agregado de una fila; se combinan con JOIN ON TRUE
+        para que la base de datos devuelva todo en un solo viaje.
+        caregiver_id=None significa vista de administrador (sin filtro).
+        """
+        # scheduled_time está en UTC: el día se toma en UTC
+        day_start = datetime.combine(datetime.utcnow().date(), time.min)
+        day_end = day_start + timedelta(days=1)
+
+        patients = self._scope(
+            select(func.count(Patient.id).label("total_patients")),
+            caregiver_id
+        ).subquery()
+
+        treatments = self._scope(
+            select(func.count(Treatment.id).label("active_treatments"))
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .filter(Treatment.status == TreatmentStatus.ACTIVE),
+            caregiver_id
+        ).subquery()
+
+        doses = self._scope(
+            select(
+                func.count(DoseRecord.id).label("today_doses"),
+                func.coalesce(func.sum(
+                    case((DoseRecord.status == DoseStatus.TAKEN, 1), else_=0)
+                ), 0).label("taken_doses"),
+                func.coalesce(func.sum(
+                    case((DoseRecord.status == DoseStatus.MISSED, 1), else_=0)
+                ), 0).label("missed_doses")
+            )
+            .join(Patient, DoseRecord.patient_id == Patient.id)
+            .filter(
+                DoseRecord.scheduled_time >= day_start,
+                DoseRecord.scheduled_time < day_end
+            ),
+            caregiver_id
+        ).subquery()
+
+        alerts = self._scope(
+            select(func.count(Alert.id).label("pending_alerts"))
+            .join(Patient, Alert.patient_id == Patient.id)
+            .filter(Alert.is_read == False),
+            caregiver_id
+        ).subquery()
+
+        query = (
+            select(
+                patients.c.total_patients,
+                treatments.c.active_treatments,
+                doses.c.today_doses,
+                doses.c.taken_doses,
+                doses.c.missed_doses,
+                alerts.c.pending_alerts
+            )
+            .select_from(patients)
+            .join(treatments, true())
+            .join(doses, true())
+            .join(alerts, true())
+        )
+        row = (await self.db.execute(query)).one()
+
+        return {
+            "totalPatients": int(row.total_patients or 0),
+            "activeTreatments": int(row.active_treatments or 0),
+            "todayDoses": int(row.today_doses or 0),
+            "takenDoses": int(row.taken_doses or 0),
+            "missedDoses": int(row.missed_doses or 0),
+            "pendingAlerts": int(row.pending_alerts or 0)
+        }
+
+    async def get_stats(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
+        """Estadísticas principales del dashboard"""
+        return format_stats(await self.get_stats_counters(caregiver_id))
+
+    async def get_patient_metrics(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Métricas de pacientes (género, historial, alergias, grupos de edad).
+
+        Se agrupa por género y el resto son agregados condicionales, así que
+        la base de datos devuelve a lo sumo una fila por género sin cargar
+        pacientes. Los grupos de edad se comparan contra fechas de corte
+        calculadas en Python, equivalentes a age_group().
+        """
+        today = date.today()
+        adult_cutoff = years_before(today, 18)
+        senior_cutoff = years_before(today, 65)
+
+        def count_if(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        query = select(
+            Patient.gender,
+            func.count(Patient.id).label("total"),
+            count_if(func.json_length(Patient.medical_history) > 0).label("with_medical_history"),
+            count_if(func.json_length(Patient.allergies) > 0).label("with_allergies"),
+            count_if(Patient.date_of_birth > adult_cutoff).label("under18"),
+            count_if(Patient.date_of_birth <= senior_cutoff).label("senior")
+        ).group_by(Patient.gender)
+        if caregiver_id is not None:
+            query = query.filter(Patient.caregiver_id == caregiver_id)
+
+        metrics = empty_patient_metrics()
+        for row in (await self.db.execute(query)).all():
+            total = int(row.total)
+            under18 = int(row.under18)
+            senior = int(row.senior)
+
+            metrics["total"] += total
+            gender = row.gender.value if row.gender else None
+            if gender in metrics["byGender"]:
+                metrics["byGender"][gender] += total
+            metrics["withMedicalHistory"] += int(row.with_medical_history)
+            metrics["withAllergies"] += int(row.with_allergies)
+            metrics["ageGroups"]["under18"] += under18
+            metrics["ageGroups"]["senior"] += senior
+            metrics["ageGroups"]["adult"] += total - under18 - senior
+        return metrics
+
+    async def get_treatment_metrics(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
+        """Métricas de tratamientos por estado"""
+        query = self._scope(
+            select(Treatment.status, func.count(Treatment.id))
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .group_by(Treatment.status),
+            caregiver_id
+        )
+        metrics = empty_treatment_metrics()
+        for status, count in (await self.db.execute(query)).all():
+            metrics["total"] += count
+            key = TREATMENT_METRIC_KEYS.get(status)
+            if key:
+                metrics[key] += count
+        return metrics
+
+
+class DashboardSnapshot:
+    """Métricas materializadas del dashboard de un cuidador (o del admin)"""
+
+    def __init__(self):
+        # Día UTC, el mismo de get_stats_counters y de scheduled_time
+        self.day = datetime.utcnow().date()
+        self.sections: Dict[str, Dict[str, Any]] = {}
+        self.updated_at: Dict[str, datetime] = {}
+
+    def touch(self, section: str):
+        self.updated_at[section] = datetime.now()
+
+
+class DashboardSnapshotStore:
+    """
+    Snapshots por cuidador de stats, patient-metrics y treatment-metrics.
+
+    Cada sección se calcula la primera vez que se pide y después se
+    mantiene con deltas que envían los servicios al escribir pacientes,
+    tratamientos, dosis y alertas. Cuando un cambio no se puede expresar
+    como delta la sección se descarta y se recalcula en la siguiente
+    lectura. Los snapshots viven en memoria del proceso y expiran tras
+    DASHBOARD_SNAPSHOT_TTL, lo que acota la deriva por escrituras hechas
+    en otros procesos; el cambio de día también fuerza el recálculo.
+    La clave None corresponde a la vista global del administrador.
+    """
+
+    SECTIONS = ("stats", "patients", "treatments")
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._snapshots = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[Optional[int], int] = {}
+
+    async def get(self, db: AsyncSession, caregiver_id: Optional[int], section: str):
+        """Obtener (datos, actualizado_en) de una sección, calculándola si hace falta"""
+        snapshot = self._snapshots.get(caregiver_id)
+        if snapshot is None or snapshot.day != datetime.utcnow().date():
+            snapshot = DashboardSnapshot()
+            self._snapshots.set(caregiver_id, snapshot)
+
+        if section not in snapshot.sections:
+            version = self._versions.get(caregiver_id, 0)
+            data = await self._compute(db, caregiver_id, section)
+            # Si hubo una escritura mientras se calculaba, no se guarda:
+            # el delta pudo haberse perdido y la siguiente lectura recalcula
+            if self._versions.get(caregiver_id, 0) != version:
+                return data, datetime.now()
+            snapshot.sections[section] = data
+            snapshot.touch(section)
+
+        return snapshot.sections[section], snapshot.updated_at[section]
+
+    async def _compute(self, db: AsyncSession, caregiver_id: Optional[int], section: str):
+        service = DashboardService(db)
+        if section == "stats":
+            return await service.get_stats_counters(caregiver_id)
+        if section == "patients":
+            return await service.get_patient_metrics(caregiver_id)
+        if section == "treatments":
+            return await service.get_treatment_metrics(caregiver_id)
+        raise ValueError(f"Sección de dashboard desconocida: {section}")
+
+    def _apply(self, caregiver_id: Optional[int], section: str, update):
+        """Aplicar un delta a la sección del cuidador y a la vista global"""
+        for key in {caregiver_id, None}:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and section in snapshot.sections:
+                update(snapshot, snapshot.sections[section])
+                snapshot.touch(section)
+
+    def invalidate(self, caregiver_id: Optional[int], *sections: str):
+        """Descartar secciones que no se pueden actualizar con un delta"""
+        for key in {caregiver_id, None}:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                for section in sections or self.SECTIONS:
+                    snapshot.sections.pop(section, None)
+
+    def clear(self):
+        """Descartar todos los snapshots"""
+        for key in list(self._versions):
+            self._versions[key] += 1
+        self._snapshots.clear()
+
+    # ===== DELTAS =====
+
+    def patient_added(self, caregiver_id: int, patient: Patient):
+        """Paciente creado"""
+        def stats(snapshot, data):
+            data["totalPatients"] += 1
+
+        def patients(snapshot, data):
+            add_patient_to_metrics(data, patient, snapshot.day)
+
+        self._apply(caregiver_id, "stats", stats)
+        self._apply(caregiver_id, "patients", patients)
+
+    def patient_updated(self, caregiver_id: int):
+        """Paciente modificado (género, fecha de nacimiento, historial...)"""
+        self.invalidate(caregiver_id, "patients")
+
+    def patient_removed(self, caregiver_id: int, patient: Patient):
+        """Paciente eliminado junto con sus tratamientos, dosis y alertas"""
+        def patients(snapshot, data):
+            add_patient_to_metrics(data, patient, snapshot.day, sign=-1)
+
+        self._apply(caregiver_id, "patients", patients)
+        self.invalidate(caregiver_id, "stats", "treatments")
+
+    def treatment_status_changed(
+            self,
+            caregiver_id: int,
+            old_status: Optional[TreatmentStatus],
+            new_status: Optional[TreatmentStatus]
+    ):
+        """Tratamiento creado (old_status=None) o con cambio de estado"""
+        if old_status == new_status:
+            return
+
+        def stats(snapshot, data):
+            if old_status == TreatmentStatus.ACTIVE:
+                data["activeTreatments"] -= 1
+            if new_status == TreatmentStatus.ACTIVE:
+                data["activeTreatments"] += 1
+
+        def treatments(snapshot, data):
+            if old_status is None:
+                data["total"] += 1
+            if old_status in TREATMENT_METRIC_KEYS:
+                data[TREATMENT_METRIC_KEYS[old_status]] -= 1
+            if new_status in TREATMENT_METRIC_KEYS:
+                data[TREATMENT_METRIC_KEYS[new_status]] += 1
+
+        self._apply(caregiver_id, "stats", stats)
+        self._apply(caregiver_id, "treatments", treatments)
+
+    def dose_status_changed(
+            self,
+            caregiver_id: int,
+            scheduled_time: datetime,
+            old_status: Optional[DoseStatus],
+            new_status: DoseStatus
+    ):
+        """Registro de dosis creado (old_status=None) o con cambio de estado"""
+        counters = {DoseStatus.TAKEN: "takenDoses", DoseStatus.MISSED: "missedDoses"}
+
+        def stats(snapshot, data):
+            if scheduled_time.date() != snapshot.day:
+                return
+            if old_status is None:
+                data["todayDoses"] += 1
+            if old_status in counters:
+                data[counters[old_status]] -= 1
+            if new_status in counters:
+                data[counters[new_status]] += 1
+
+        self._apply(caregiver_id, "stats", stats)
+
+    def unread_alerts_changed(self, caregiver_id: int, delta: int):
+        """Alertas no leídas creadas (delta > 0) o marcadas como leídas (delta < 0)"""
+        def stats(snapshot, data):
+            data["pendingAlerts"] += delta
+
+        self._apply(caregiver_id, "stats", stats)
+
+
+dashboard_snapshots = DashboardSnapshotStore(
+    maxsize=settings.DASHBOARD_SNAPSHOT_SIZE,
+    ttl=settings.DASHBOARD_SNAPSHOT_TTL
+)
@@ -0,0 +1,217 @@
+"""
+Servicio de materialización del calendario de dosis
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, or_
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+
+from app.core.config import get_settings
+from app.core.database import build_upsert
+from app.models.alarm import Alarm
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.patient import Patient
+from app.models.treatment import Treatment, TreatmentStatus
+from app.services.dashboard_service import dashboard_snapshots
+from app.utils.date_utils import fire_times_between, to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+BATCH_SIZE = 1000
+
+
+class ScheduleChanges:
+    """
+    Tratamientos y pacientes cuyo calendario cambió en este proceso.
+
+    Los servicios que modifican alarmas, tratamientos o la zona horaria
+    del paciente los marcan después del commit; dose_schedule_loop los
+    rematerializa sin bloquear la petición. Los cambios hechos en otros
+    procesos se recogen en la siguiente pasada completa.
+    """
+
+    def __init__(self):
+        self.treatment_ids: Set[int] = set()
+        self.patient_ids: Set[int] = set()
+        self._event = asyncio.Event()
+
+    def treatment_changed(self, treatment_id: int):
+        self.treatment_ids.add(treatment_id)
+        self._event.set()
+
+    def patient_changed(self, patient_id: int):
+        self.patient_ids.add(patient_id)
+        self._event.set()
+
+    async def wait(self, timeout: float) -> Tuple[Set[int], Set[int]]:
+        """Esperar cambios (como máximo `timeout` segundos) y tomarlos"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        treatment_ids, self.treatment_ids = self.treatment_ids, set()
+        patient_ids, self.patient_ids = self.patient_ids, set()
+        return treatment_ids, patient_ids
+
+
+schedule_changes = ScheduleChanges()
+
+
+class DoseScheduleService:
+    """
+    Expande alarmas activas × tratamientos activos en dose_records PENDING.
+
+    Mantiene materializadas las dosis de las próximas
+    DOSE_SCHEDULE_HORIZON_HOURS horas, así "próxima dosis" y las dosis del
+    día son lecturas indexadas de dose_records. Es idempotente: solo
+    inserta las dosis que faltan (la llave única (treatment_id,
+    scheduled_time) protege de pasadas concurrentes) y elimina las
+    pendientes futuras que ya no corresponden al calendario. Las dosis con
+    estado registrado nunca se tocan.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _load_alarms(
+            self,
+            treatment_ids: Optional[Set[int]],
+            patient_ids: Optional[Set[int]]
+    ) -> List[Any]:
+        """Alarmas activas de tratamientos activos con la zona del paciente"""
+        query = (
+            select(
+                Alarm.time,
+                Treatment.id.label("treatment_id"),
+                Treatment.patient_id,
+                Treatment.start_date,
+                Treatment.end_date,
+                Patient.timezone,
+                Patient.caregiver_id
+            )
+            .join(Treatment, Alarm.treatment_id == Treatment.id)
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .filter(
+                Treatment.status == TreatmentStatus.ACTIVE,
+                or_(Alarm.is_active == True, Alarm.is_active.is_(None))
+            )
+        )
+        if treatment_ids is not None:
+            query = query.filter(Treatment.id.in_(treatment_ids))
+        if patient_ids is not None:
+            query = query.filter(Treatment.patient_id.in_(patient_ids))
+        return (await self.db.execute(query)).all()
+
+    async def _load_future(
+            self,
+            after: datetime,
+            treatment_ids: Optional[Set[int]],
+            patient_ids: Optional[Set[int]]
+    ) -> List[Any]:
+        """Dosis ya existentes posteriores a `after` (cualquier estado)"""
+        query = (
+            select(
+                DoseRecord.id,
+                DoseRecord.treatment_id,
+                DoseRecord.scheduled_time,
+                DoseRecord.status,
+                Patient.caregiver_id
+            )
+            .join(Patient, DoseRecord.patient_id == Patient.id)
+            .filter(DoseRecord.scheduled_time > after)
+        )
+        if treatment_ids is not None:
+            query = query.filter(DoseRecord.treatment_id.in_(treatment_ids))
+        if patient_ids is not None:
+            query = query.filter(DoseRecord.patient_id.in_(patient_ids))
+        return (await self.db.execute(query)).all()
+
+    async def materialize(
+            self,
+            treatment_ids: Optional[Iterable[int]] = None,
+            patient_ids: Optional[Iterable[int]] = None,
+            now: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """
+        Sincronizar las dosis pendientes con el calendario.
+
+        Sin filtros procesa todos los tratamientos (pasada periódica); con
+        treatment_ids o patient_ids solo los que cambiaron.
+        """
+        treatment_ids = set(treatment_ids) if treatment_ids is not None else None
+        patient_ids = set(patient_ids) if patient_ids is not None else None
+        now = now or datetime.now(timezone.utc)
+        horizon = now + timedelta(hours=settings.DOSE_SCHEDULE_HORIZON_HOURS)
+
+        desired: Dict[Tuple[int, datetime], Any] = {}
+        for alarm in await self._load_alarms(treatment_ids, patient_ids):
+            for fire_at in fire_times_between(
+                    alarm.time,
+                    alarm.timezone,
+                    now,
+                    horizon,
+                    start_date=alarm.start_date,
+                    end_date=alarm.end_date
+            ):
+                desired[(alarm.treatment_id, to_utc_naive(fire_at))] = alarm
+
+        existing = set()
+        stale = []
+        for row in await self._load_future(to_utc_naive(now), treatment_ids, patient_ids):
+            key = (row.treatment_id, to_utc_naive(row.scheduled_time))
+            existing.add(key)
+            if row.status == DoseStatus.PENDING and key not in desired:
+                stale.append(row)
+
+        missing = [key for key in desired if key not in existing]
+        rows = [
+            {
+                "treatment_id": treatment_id,
+                "patient_id": desired[(treatment_id, scheduled_time)].patient_id,
+                "scheduled_time": scheduled_time,
+                "actual_time": None,
+                "status": DoseStatus.PENDING,
+                "notes": None
+            }
+            for treatment_id, scheduled_time in missing
+        ]
+
+        if not rows and not stale:
+            return {"created": 0, "removed": 0}
+
+        # Sin columnas a actualizar: si otra pasada ya la insertó se deja igual
+        stmt = build_upsert(
+            self.db,
+            DoseRecord.__table__,
+            key_columns=["treatment_id", "scheduled_time"],
+            update_columns=[]
+        )
+        for start in range(0, len(rows), BATCH_SIZE):
+            await self.db.execute(stmt, rows[start:start + BATCH_SIZE])
+
+        stale_ids = [row.id for row in stale]
+        for start in range(0, len(stale_ids), BATCH_SIZE):
+            # Volver a exigir PENDING por si el dispositivo la registró entretanto
+            await self.db.execute(
+                delete(DoseRecord).where(
+                    DoseRecord.id.in_(stale_ids[start:start + BATCH_SIZE]),
+                    DoseRecord.status == DoseStatus.PENDING
+                )
+            )
+
+        await self.db.commit()
+
+        # "Dosis de hoy" del dashboard (día UTC) cuenta también las pendientes
+        today = to_utc_naive(now).date()
+        changed = [(desired[key].caregiver_id, key[1]) for key in missing]
+        changed += [(row.caregiver_id, to_utc_naive(row.scheduled_time)) for row in stale]
+        for caregiver_id in {caregiver_id for caregiver_id, scheduled_time in changed if scheduled_time.date() == today}:
+            dashboard_snapshots.invalidate(caregiver_id, "stats")
+
+        logger.info(f"Calendario de dosis: {len(rows)} creadas, {len(stale)} eliminadas")
+        return {"created": len(rows), "removed": len(stale)}
@@ -0,0 +1,322 @@
+"""
+Servicio de registro de dosis
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta
+import logging
+
+from app.core.config import get_settings
+from app.core.database import build_upsert
+from app.models.activity_event import ActivityType
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import Medication
+from app.models.patient import Patient
+from app.models.treatment import Treatment
+from app.schemas.treatment import DoseEvent
+from app.services.activity_service import ActivityService
+from app.services.alert_service import alert_events, MissedDose
+from app.services.compliance_service import ComplianceService
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.report_service import report_cache
+from app.utils.date_utils import to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+UPSERT_BATCH_SIZE = 1000
+
+# Estados que puede reportar el dispositivo (PENDING lo crea el servidor)
+RECORDABLE_STATUSES = {DoseStatus.TAKEN, DoseStatus.MISSED, DoseStatus.SNOOZED}
+
+STATUS_LABELS = {
+    DoseStatus.TAKEN: "tomada(s)",
+    DoseStatus.MISSED: "omitida(s)",
+    DoseStatus.SNOOZED: "pospuesta(s)"
+}
+
+
+class DoseService:
+    """
+    Servicio para registrar eventos de dosis, uno o miles a la vez.
+
+    Un lote se resuelve con una consulta de propiedad de tratamientos, una
+    de dosis existentes y un upsert de varias filas por (treatment_id,
+    scheduled_time), todo en una transacción. Reenviar el mismo lote es
+    idempotente.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _load_treatments(self, treatment_ids: set) -> Dict[int, Any]:
+        """Tratamiento -> (paciente, cuidador, zona, nombres) en una consulta"""
+        rows = (await self.db.execute(
+            select(
+                Treatment.id,
+                Treatment.patient_id,
+                Treatment.dosage,
+                Patient.caregiver_id,
+                Patient.timezone,
+                Patient.name.label("patient_name"),
+                Medication.name.label("medication_name")
+            )
+            .join(Patient, Treatment.patient_id == Patient.id)
+            .join(Medication, Treatment.medication_id == Medication.id)
+            .filter(Treatment.id.in_(treatment_ids))
+        )).all()
+        return {row.id: row for row in rows}
+
+    async def _load_existing(self, keys: set) -> Dict[Tuple[int, datetime], Any]:
+        """Dosis ya registradas para las llaves del lote (una consulta por rango)"""
+        treatment_ids = {treatment_id for treatment_id, _ in keys}
+        times = [scheduled_time for _, scheduled_time in keys]
+        rows = (await self.db.execute(
+            select(
+                DoseRecord.treatment_id,
+                DoseRecord.scheduled_time,
+                DoseRecord.status,
+                DoseRecord.actual_time,
+                DoseRecord.notes
+            ).filter(
+                DoseRecord.treatment_id.in_(treatment_ids),
+                DoseRecord.scheduled_time >= min(times),
+                DoseRecord.scheduled_time <= max(times)
+            )
+        )).all()
+        existing = {}
+        for row in rows:
+            key = (row.treatment_id, to_utc_naive(row.scheduled_time))
+            if key in keys:
+                existing[key] = row
+        return existing
+
+    async def ingest(self, events: List[DoseEvent], caregiver_id: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Registrar eventos de dosis; devuelve un resultado por evento.
+
+        caregiver_id limita los tratamientos aceptados (None = admin). Si un
+        lote trae varias veces la misma dosis gana el último evento y los
+        anteriores se reportan como "superseded".
+        """
+        treatments = await self._load_treatments({event.treatment_id for event in events})
+
+        results: List[Dict[str, Any]] = []
+        latest: Dict[Tuple[int, datetime], int] = {}
+        for index, event in enumerate(events):
+            scheduled_time = to_utc_naive(event.scheduled_time).replace(second=0, microsecond=0)
+            result = {
+                "index": index,
+                "treatmentId": event.treatment_id,
+                "scheduledTime": scheduled_time.isoformat(),
+                "result": None,
+                "error": None
+            }
+            results.append(result)
+
+            treatment = treatments.get(event.treatment_id)
+            if treatment is None or (caregiver_id is not None and treatment.caregiver_id != caregiver_id):
+                result["result"] = "error"
+                result["error"] = "Tratamiento no encontrado"
+                continue
+            if event.status not in RECORDABLE_STATUSES:
+                result["result"] = "error"
+                result["error"] = f"Estado no válido: {event.status.value}"
+                continue
+
+            key = (event.treatment_id, scheduled_time)
+            if key in latest:
+                results[latest[key]]["result"] = "superseded"
+            latest[key] = index
+
+        if not latest:
+            return results
+
+        existing = await self._load_existing(set(latest))
+
+        now = datetime.utcnow()
+        rows = []
+        changes = []
+        for key, index in latest.items():
+            event = events[index]
+            treatment = treatments[event.treatment_id]
+            actual_time = to_utc_naive(event.actual_time) if event.actual_time else None
+            previous = existing.get(key)
+
+            if previous is not None and (
+                    previous.status == event.status
+                    and previous.actual_time == actual_time
+                    and previous.notes == event.notes
+            ):
+                results[index]["result"] = "unchanged"
+                continue
+
+            results[index]["result"] = "updated" if previous is not None else "created"
+            rows.append({
+                "treatment_id": event.treatment_id,
+                "patient_id": treatment.patient_id,
+                "scheduled_time": key[1],
+                "actual_time": actual_time,
+                "status": event.status,
+                "notes": event.notes,
+                "updated_at": now
+            })
+            changes.append((treatment, key[1], previous.status if previous else None, event.status))
+
+        if not rows:
+            return results
+
+        stmt = build_upsert(
+            self.db,
+            DoseRecord.__table__,
+            key_columns=["treatment_id", "scheduled_time"],
+            update_columns=["actual_time", "status", "notes", "updated_at"]
+        )
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            await self.db.execute(stmt, rows[start:start + UPSERT_BATCH_SIZE])
+
+        self._record_activity(changes)
+        await ComplianceService(self.db).rollup_days(
+            (treatment.patient_id, scheduled_time.date()) for treatment, scheduled_time, _, _ in changes
+        )
+        await self.db.commit()
+
+        for treatment, scheduled_time, old_status, new_status in changes:
+            dashboard_snapshots.dose_status_changed(treatment.caregiver_id, scheduled_time, old_status, new_status)
+        for caregiver in {treatment.caregiver_id for treatment, _, _, _ in changes}:
+            report_cache.bump(caregiver)
+        # Las omitidas que reporta el dispositivo generan la misma alerta que
+        # las del detector
+        alert_after = datetime.utcnow() - timedelta(hours=settings.MISSED_DOSE_ALERT_MAX_AGE_HOURS)
+        alert_events.doses_missed(
+            MissedDose(
+                treatment_id=treatment.id,
+                patient_id=treatment.patient_id,
+                caregiver_id=treatment.caregiver_id,
+                scheduled_time=scheduled_time,
+                timezone=treatment.timezone,
+                medication_name=treatment.medication_name,
+                dosage=treatment.dosage
+            )
+            for treatment, scheduled_time, old_status, new_status in changes
+            if new_status == DoseStatus.MISSED and old_status != DoseStatus.MISSED and scheduled_time >= alert_after
+        )
+        alert_events.compliance_changed({treatment.patient_id for treatment, _, _, _ in changes})
+
+        logger.info(f"Dosis registradas: {len(rows)} de {len(events)} eventos")
+        return results
+
+    async def mark_missed(self, now: Optional[datetime] = None) -> int:
+        """
+        Marcar como MISSED las dosis PENDING vencidas; devuelve cuántas.
+
+        Vencida = programada hace más de MISSED_DOSE_GRACE_MINUTES. Se
+        procesa por lotes de MISSED_DOSE_BATCH_SIZE, cada uno con un UPDATE
+        por conjunto de ids y su propio commit para no retener bloqueos;
+        solo se publican las dosis que reclamó el UPDATE de este proceso.
+        Las dosis de las últimas MISSED_DOSE_ALERT_MAX_AGE_HOURS se publican
+        en alert_events; las más antiguas (p. ej. tras días con el job
+        detenido) solo cambian de estado.
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(minutes=settings.MISSED_DOSE_GRACE_MINUTES)
+        alert_after = now - timedelta(hours=settings.MISSED_DOSE_ALERT_MAX_AGE_HOURS)
+
+        total = 0
+        while True:
+            # En orden de scheduled_time (el del índice (status, scheduled_time)):
+            # cada lote cubre pocos días y el rollup de cumplimiento es acotado
+            ids = (await self.db.execute(
+                select(DoseRecord.id)
+                .filter(DoseRecord.status == DoseStatus.PENDING, DoseRecord.scheduled_time < cutoff)
+                .order_by(DoseRecord.scheduled_time)
+                .limit(settings.MISSED_DOSE_BATCH_SIZE)
+                # Filas bloqueadas hasta el commit: ni otro proceso ni el
+                # dispositivo las cambian entre la lectura y el UPDATE
+                .with_for_update()
+            )).scalars().all()
+            if not ids:
+                break
+
+            claimed = await self.db.execute(
+                update(DoseRecord)
+                .where(DoseRecord.id.in_(ids), DoseRecord.status == DoseStatus.PENDING)
+                .values(status=DoseStatus.MISSED)
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != len(ids):
+                # Sin bloqueo de filas (SQLite) alguna cambió entretanto: no
+                # se sabe cuáles marcó este UPDATE, así que se reintenta el lote
+                await self.db.rollback()
+                continue
+
+            # Solo las que marcó este proceso generan eventos y rollups
+            doses = (await self.db.execute(
+                select(
+                    DoseRecord.treatment_id,
+                    DoseRecord.patient_id,
+                    DoseRecord.scheduled_time,
+                    Patient.caregiver_id,
+                    Patient.timezone,
+                    Treatment.dosage,
+                    Medication.name.label("medication_name")
+                )
+                .join(Treatment, DoseRecord.treatment_id == Treatment.id)
+                .join(Patient, DoseRecord.patient_id == Patient.id)
+                .join(Medication, Treatment.medication_id == Medication.id)
+                .filter(DoseRecord.id.in_(ids))
+            )).all()
+
+            await ComplianceService(self.db).rollup_days(
+                (dose.patient_id, to_utc_naive(dose.scheduled_time).date()) for dose in doses
+            )
+            await self.db.commit()
+
+            # Día UTC, como scheduled_time
+            today = now.date()
+            for dose in doses:
+                scheduled_time = to_utc_naive(dose.scheduled_time)
+                if scheduled_time.date() == today:
+                    dashboard_snapshots.dose_status_changed(
+                        dose.caregiver_id, scheduled_time, DoseStatus.PENDING, DoseStatus.MISSED
+                    )
+            for caregiver_id in {dose.caregiver_id for dose in doses}:
+                report_cache.bump(caregiver_id)
+            alert_events.doses_missed(
+                dose for dose in doses if to_utc_naive(dose.scheduled_time) >= alert_after
+            )
+            alert_events.compliance_changed({dose.patient_id for dose in doses})
+
+            total += len(doses)
+            if len(ids) < settings.MISSED_DOSE_BATCH_SIZE:
+                break
+
+        if total:
+            logger.info(f"Dosis marcadas como omitidas: {total}")
+        return total
+
+    def _record_activity(self, changes: List[Tuple[Any, datetime, Optional[DoseStatus], DoseStatus]]):
+        """Un evento de actividad por tratamiento con el resumen de sus dosis"""
+        by_treatment: Dict[int, Dict[DoseStatus, int]] = {}
+        info = {}
+        for treatment, _, _, status in changes:
+            counts = by_treatment.setdefault(treatment.id, {})
+            counts[status] = counts.get(status, 0) + 1
+            info[treatment.id] = treatment
+
+        activity_service = ActivityService(self.db)
+        for treatment_id, counts in by_treatment.items():
+            treatment = info[treatment_id]
+            summary = ", ".join(f"{count} {STATUS_LABELS[status]}" for status, count in counts.items())
+            activity_service.record(
+                caregiver_id=treatment.caregiver_id,
+                type=ActivityType.DOSE_RECORDED,
+                action=f"Dosis registradas: {summary}",
+                status="missed" if DoseStatus.MISSED in counts else "completed",
+                patient_id=treatment.patient_id,
+                patient_name=treatment.patient_name,
+                treatment_id=treatment_id,
+                medication_name=treatment.medication_name
+            )
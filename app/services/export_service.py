@@ -0,0 +1,159 @@
+"""
+Servicio de exportación de datos en streaming
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+from datetime import date, datetime
+import csv
+import enum
+import io
+import json
+import logging
+
+from app.models.dose_record import DoseRecord
+from app.models.medication import Medication
+from app.models.patient import Patient
+from app.models.treatment import Treatment
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+
+# Formato -> media type
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "json": "application/x-ndjson"
+}
+
+# Columnas exportadas por tipo de datos (orden de "all")
+EXPORT_COLUMNS = {
+    "patients": [
+        Patient.id, Patient.name, Patient.email, Patient.phone, Patient.date_of_birth,
+        Patient.gender, Patient.caregiver_id, Patient.timezone, Patient.created_at
+    ],
+    "medications": [
+        Medication.id, Medication.name, Medication.dosage, Medication.unit,
+        Medication.generic_name, Medication.brand_name, Medication.manufacturer, Medication.created_at
+    ],
+    "treatments": [
+        Treatment.id, Treatment.patient_id, Treatment.medication_id, Treatment.dosage,
+        Treatment.frequency, Treatment.duration_days, Treatment.start_date, Treatment.end_date,
+        Treatment.status, Treatment.created_at
+    ],
+    "doses": [
+        DoseRecord.id, DoseRecord.treatment_id, DoseRecord.patient_id, DoseRecord.scheduled_time,
+        DoseRecord.actual_time, DoseRecord.status, DoseRecord.created_at
+    ]
+}
+EXPORT_DATA_TYPES = ["all", *EXPORT_COLUMNS]
+
+
+def export_value(value: Any) -> Any:
+    """Valor serializable (fechas en ISO, enums por su valor)"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_filename(data_type: str, format: str) -> str:
+    """Nombre del archivo exportado"""
+    extension = "ndjson" if format == "json" else format
+    return f"{data_type}_{datetime.utcnow():%Y%m%d_%H%M%S}.{extension}"
+
+
+class ExportService:
+    """
+    Servicio que exporta tablas completas sin cargarlas en memoria.
+
+    Cada tipo de datos se lee con un cursor del servidor (yield_per) y se
+    emite por lotes de EXPORT_BATCH_SIZE filas, así el primer lote sale en
+    cuanto llega y la memoria no depende del tamaño de la tabla.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _query(self, data_type: str, caregiver_id: Optional[int]):
+        query = select(*EXPORT_COLUMNS[data_type])
+        if caregiver_id is None:
+            return query.order_by(EXPORT_COLUMNS[data_type][0])
+
+        if data_type == "patients":
+            query = query.filter(Patient.caregiver_id == caregiver_id)
+        elif data_type == "medications":
+            # Catálogo compartido: solo los medicamentos usados por sus pacientes
+            used = (
+                select(Treatment.medication_id)
+                .join(Patient, Treatment.patient_id == Patient.id)
+                .filter(Patient.caregiver_id == caregiver_id)
+            )
+            query = query.filter(Medication.id.in_(used))
+        elif data_type == "treatments":
+            query = query.join(Patient, Treatment.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+        else:
+            query = query.join(Patient, DoseRecord.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+        return query.order_by(EXPORT_COLUMNS[data_type][0])
+
+    async def iter_batches(
+            self,
+            data_type: str,
+            caregiver_id: Optional[int]
+    ) -> AsyncIterator[Tuple[str, List[str], List[Tuple]]]:
+        """Lotes (tipo, columnas, filas) de uno o todos los tipos de datos"""
+        data_types = list(EXPORT_COLUMNS) if data_type == "all" else [data_type]
+        for current in data_types:
+            columns = [column.key for column in EXPORT_COLUMNS[current]]
+            query = self._query(current, caregiver_id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+            result = await self.db.stream(query)
+            empty = True
+            async for partition in result.partitions():
+                empty = False
+                yield current, columns, partition
+            if empty:
+                # Sin filas igual se emite el encabezado
+                yield current, columns, []
+
+    async def stream_csv(self, data_type: str, caregiver_id: Optional[int]) -> AsyncIterator[str]:
+        """
+        CSV por lotes.
+
+        Con "all" cada tipo de datos va en su propia sección, separada por
+        una línea en blanco y precedida por "# tipo" y su encabezado.
+        """
+        header_written = set()
+        async for current, columns, rows in self.iter_batches(data_type, caregiver_id):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if current not in header_written:
+                if header_written:
+                    buffer.write("\r\n")
+                if data_type == "all":
+                    writer.writerow([f"# {current}"])
+                writer.writerow(columns)
+                header_written.add(current)
+            writer.writerows([export_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+
+    async def stream_ndjson(self, data_type: str, caregiver_id: Optional[int]) -> AsyncIterator[str]:
+        """NDJSON por lotes: un objeto por línea con su tipo en "type" """
+        async for current, columns, rows in self.iter_batches(data_type, caregiver_id):
+            lines = []
+            for row in rows:
+                item: Dict[str, Any] = {"type": current}
+                item.update(zip(columns, (export_value(value) for value in row)))
+                lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+            if lines:
+                yield "".join(lines)
+
+    def stream(self, format: str, data_type: str, caregiver_id: Optional[int]) -> AsyncIterator[str]:
+        """Generador del formato pedido"""
+        if format == "csv":
+            return self.stream_csv(data_type, caregiver_id)
+        return self.stream_ndjson(data_type, caregiver_id)
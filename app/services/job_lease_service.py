@@ -0,0 +1,59 @@
+"""
+Servicio de concesiones de trabajos periódicos
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, or_
+from datetime import datetime, timedelta
+import os
+import socket
+
+from app.core.database import build_upsert
+from app.models.job_lease import JobLease
+
+# Intervalos sin renovar tras los que otro worker puede tomar el trabajo
+LEASE_INTERVALS = 3
+
+
+def worker_id() -> str:
+    """Identificador de este proceso (se calcula tras el fork de los workers)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobLeaseService:
+    """
+    Un solo worker ejecuta cada trabajo periódico.
+
+    La concesión es una fila de job_leases por trabajo: se toma con un
+    INSERT IGNORE si no existe o con un UPDATE condicionado a que sea
+    nuestra o haya vencido; el número de filas afectadas dice si la
+    obtuvimos, sin bloqueos que dependan del motor.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def acquire(self, name: str, interval: float) -> bool:
+        """Tomar o renovar la concesión por LEASE_INTERVALS intervalos del trabajo"""
+        now = datetime.utcnow()
+        owner = worker_id()
+        expires_at = now + timedelta(seconds=interval * LEASE_INTERVALS)
+
+        stmt = build_upsert(self.db, JobLease.__table__, key_columns=["name"], update_columns=[])
+        result = await self.db.execute(stmt, [{"name": name, "owner": owner, "expires_at": expires_at}])
+        if result.rowcount != 1:
+            result = await self.db.execute(
+                update(JobLease)
+                .where(JobLease.name == name, or_(JobLease.owner == owner, JobLease.expires_at < now))
+                .values(owner=owner, expires_at=expires_at)
+            )
+        await self.db.commit()
+        return result.rowcount == 1
+
+    async def release_all(self):
+        """Liberar las concesiones de este proceso (al apagar la aplicación)"""
+        await self.db.execute(
+            update(JobLease)
+            .where(JobLease.owner == worker_id())
+            .values(expires_at=datetime.utcnow())
+        )
+        await self.db.commit()
@@ -1,36 +1,45 @@
 """
 Servicio de gestión de medicamentos
 """
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import select, and_, or_, func, case
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from app.models.medication import Medication, MedicationUnit
+from app.core.database import build_upsert
+from app.models.medication import Medication, MedicationUnit, MedicationCategory, MedicationCategoryAssignment
 from app.models.treatment import Treatment, TreatmentStatus
 from app.models.patient import Patient
 from app.schemas.medication import MedicationCreate, MedicationUpdate
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.report_service import report_cache
+from app.utils.medication_rules import classify_medication
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Campos que usan las reglas de clasificación
+CLASSIFIED_FIELDS = {'name', 'generic_name', 'brand_name', 'description'}
+
 
 class MedicationService:
     """Servicio para gestión de medicamentos"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_medications(
+    async def get_medications(
             self,
             skip: int = 0,
             limit: int = 100,
             search: Optional[str] = None,
-            unit: Optional[MedicationUnit] = None
+            unit: Optional[MedicationUnit] = None,
+            category: Optional[MedicationCategory] = None
     ) -> List[Medication]:
         """Obtener medicamentos con filtros"""
 
-        query = self.db.query(Medication)
+        query = select(Medication)
 
         # Filtro de búsqueda
         if search:
@@ -48,28 +57,56 @@ class MedicationService:
         if unit:
             query = query.filter(Medication.unit == unit)
 
-        return query.order_by(Medication.name).offset(skip).limit(limit).all()
+        # Filtro por categoría
+        if category:
+            query = query.join(
+                MedicationCategoryAssignment,
+                MedicationCategoryAssignment.medication_id == Medication.id
+            ).filter(MedicationCategoryAssignment.category == category)
+
+        result = await self.db.execute(query.order_by(Medication.name).offset(skip).limit(limit))
+        return result.scalars().all()
+
+    def _assign_category(self, medication: Medication, category: Optional[MedicationCategory] = None):
+        """Asignar categoría manual o, si no se indica, la de las reglas"""
+        source = "manual" if category else "rule"
+        if category is None:
+            category = classify_medication(
+                medication.name,
+                medication.generic_name,
+                medication.brand_name,
+                medication.description
+            )
+
+        if medication.category_assignment is None:
+            medication.category_assignment = MedicationCategoryAssignment(category=category, source=source)
+        else:
+            medication.category_assignment.category = category
+            medication.category_assignment.source = source
 
-    def get_medication_by_id(self, medication_id: int) -> Optional[Medication]:
+    async def get_medication_by_id(self, medication_id: int) -> Optional[Medication]:
         """Obtener medicamento por ID"""
-        return self.db.query(Medication).filter(Medication.id == medication_id).first()
+        return await self.db.get(Medication, medication_id)
 
-    def find_similar_medication(
+    async def find_similar_medication(
             self,
             name: str,
             dosage: str,
             unit: MedicationUnit
     ) -> Optional[Medication]:
         """Buscar medicamento similar"""
-        return self.db.query(Medication).filter(
-            and_(
-                func.lower(Medication.name) == name.lower(),
-                Medication.dosage == dosage,
-                Medication.unit == unit
+        result = await self.db.execute(
+            select(Medication).filter(
+                and_(
+                    func.lower(Medication.name) == name.lower(),
+                    Medication.dosage == dosage,
+                    Medication.unit == unit
+                )
             )
-        ).first()
+        )
+        return result.scalars().first()
 
-    def create_medication(self, medication_data: MedicationCreate) -> Medication:
+    async def create_medication(self, medication_data: MedicationCreate) -> Medication:
         """Crear nuevo medicamento"""
 
         db_medication = Medication(
@@ -84,76 +121,96 @@ class MedicationService:
             generic_name=medication_data.generic_name,
             manufacturer=medication_data.manufacturer
         )
+        self._assign_category(db_medication, medication_data.category)
 
         self.db.add(db_medication)
-        self.db.commit()
-        self.db.refresh(db_medication)
+        await self.db.commit()
+        await self.db.refresh(db_medication)
 
         logger.info(f"Medicamento creado: {db_medication.full_name} (ID: {db_medication.id})")
         return db_medication
 
-    def update_medication(
+    async def update_medication(
             self,
             medication_id: int,
             medication_update: MedicationUpdate
     ) -> Optional[Medication]:
         """Actualizar medicamento"""
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if not medication:
             return None
 
         update_data = medication_update.dict(exclude_unset=True)
+        category = update_data.pop('category', None)
 
         for field, value in update_data.items():
             if hasattr(medication, field):
                 setattr(medication, field, value)
 
-        self.db.commit()
-        self.db.refresh(medication)
+        # Categoría manual explícita, o reclasificar si cambió el texto y no era manual
+        if category:
+            self._assign_category(medication, category)
+        elif CLASSIFIED_FIELDS & update_data.keys():
+            assignment = medication.category_assignment
+            if assignment is None or assignment.source != "manual":
+                self._assign_category(medication)
+
+        await self.db.commit()
+        await self.db.refresh(medication)
+        # El nombre define la categoría en los reportes
+        report_cache.bump_all()
 
         logger.info(f"Medicamento actualizado: {medication.full_name} (ID: {medication.id})")
         return medication
 
-    def delete_medication(self, medication_id: int) -> bool:
+    async def delete_medication(self, medication_id: int) -> bool:
         """Eliminar medicamento"""
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if not medication:
             return False
 
-        self.db.delete(medication)
-        self.db.commit()
+        await self.db.delete(medication)
+        await self.db.commit()
+        # Los tratamientos del medicamento se eliminan en cascada
+        dashboard_snapshots.clear()
+        report_cache.bump_all()
 
         logger.info(f"Medicamento eliminado: {medication.full_name} (ID: {medication.id})")
         return True
 
-    def is_medication_in_use(self, medication_id: int) -> bool:
+    async def is_medication_in_use(self, medication_id: int) -> bool:
         """Verificar si el medicamento está siendo usado en tratamientos activos"""
 
-        active_treatments = self.db.query(Treatment).filter(
-            and_(
-                Treatment.medication_id == medication_id,
-                Treatment.status == TreatmentStatus.ACTIVE
+        active_treatments = await self.db.scalar(
+            select(func.count(Treatment.id)).filter(
+                and_(
+                    Treatment.medication_id == medication_id,
+                    Treatment.status == TreatmentStatus.ACTIVE
+                )
             )
-        ).count()
+        )
 
         return active_treatments > 0
 
-    def search_by_name(self, query: str, limit: int = 10) -> List[Medication]:
+    async def search_by_name(self, query: str, limit: int = 10) -> List[Medication]:
         """Buscar medicamentos por nombre (para autocompletado)"""
 
         search_term = f"%{query.lower()}%"
 
-        return self.db.query(Medication).filter(
-            or_(
-                func.lower(Medication.name).like(search_term),
-                func.lower(Medication.brand_name).like(search_term),
-                func.lower(Medication.generic_name).like(search_term)
-            )
-        ).order_by(Medication.name).limit(limit).all()
+        result = await self.db.execute(
+            select(Medication).filter(
+                or_(
+                    func.lower(Medication.name).like(search_term),
+                    func.lower(Medication.brand_name).like(search_term),
+                    func.lower(Medication.generic_name).like(search_term)
+                )
+            ).order_by(Medication.name).limit(limit)
+        )
+        return result.scalars().all()
 
-    def check_interactions(
+    async def check_interactions(
             self,
             medication_id: int,
             other_medication_ids: List[int]
@@ -164,12 +221,12 @@ class MedicationService:
         # En un sistema real, tendrías una base de datos de interacciones
         interactions = []
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if not medication:
             return interactions
 
         for other_id in other_medication_ids:
-            other_medication = self.get_medication_by_id(other_id)
+            other_medication = await self.get_medication_by_id(other_id)
             if other_medication:
                 # Simulación de verificación de interacciones
                 interaction = self._check_medication_pair(medication, other_medication)
@@ -205,7 +262,7 @@ class MedicationService:
         # Aquí agregarías más lógica de interacciones
         return None
 
-    def get_medication_treatments(
+    async def get_medication_treatments(
             self,
             medication_id: int,
             active_only: bool = True,
@@ -213,7 +270,7 @@ class MedicationService:
     ) -> List[Treatment]:
         """Obtener tratamientos que usan este medicamento"""
 
-        query = self.db.query(Treatment).options(
+        query = select(Treatment).options(
             joinedload(Treatment.patient)
         ).filter(Treatment.medication_id == medication_id)
 
@@ -223,57 +280,60 @@ class MedicationService:
         if caregiver_id:
             query = query.join(Patient).filter(Patient.caregiver_id == caregiver_id)
 
-        return query.all()
+        result = await self.db.execute(query)
+        return result.scalars().all()
 
-    def add_side_effect(self, medication_id: int, side_effect: str):
+    async def add_side_effect(self, medication_id: int, side_effect: str):
         """Agregar efecto secundario al medicamento"""
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if medication:
             medication.add_side_effect(side_effect)
-            self.db.commit()
+            await self.db.commit()
             logger.info(f"Efecto secundario agregado a {medication.name}: {side_effect}")
 
-    def remove_side_effect(self, medication_id: int, side_effect: str):
+    async def remove_side_effect(self, medication_id: int, side_effect: str):
         """Remover efecto secundario del medicamento"""
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if medication:
             medication.remove_side_effect(side_effect)
-            self.db.commit()
+            await self.db.commit()
             logger.info(f"Efecto secundario removido de {medication.name}: {side_effect}")
 
-    def add_contraindication(self, medication_id: int, contraindication: str):
+    async def add_contraindication(self, medication_id: int, contraindication: str):
         """Agregar contraindicación al medicamento"""
 
-        medication = self.get_medication_by_id(medication_id)
+        medication = await self.get_medication_by_id(medication_id)
         if medication:
             medication.add_contraindication(contraindication)
-            self.db.commit()
+            await self.db.commit()
             logger.info(f"Contraindicación agregada a {medication.name}: {contraindication}")
 
-    def get_usage_statistics(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
+    async def get_usage_statistics(self, caregiver_id: Optional[int] = None) -> Dict[str, Any]:
         """Obtener estadísticas de uso de medicamentos"""
 
         # Query base
-        query = self.db.query(
+        query = select(
             Medication.id,
             Medication.name,
             func.count(Treatment.id).label('total_treatments'),
-            func.sum(func.case([(Treatment.status == TreatmentStatus.ACTIVE, 1)], else_=0)).label('active_treatments'),
+            func.coalesce(func.sum(case((Treatment.status == TreatmentStatus.ACTIVE, 1), else_=0)), 0).label('active_treatments'),
             func.count(func.distinct(Treatment.patient_id)).label('total_patients')
         ).outerjoin(Treatment)
 
         if caregiver_id:
             query = query.join(Patient).filter(Patient.caregiver_id == caregiver_id)
 
-        results = query.group_by(Medication.id, Medication.name).all()
+        results = (await self.db.execute(query.group_by(Medication.id, Medication.name))).all()
 
         # Estadísticas por unidad
-        unit_stats = self.db.query(
-            Medication.unit,
-            func.count(Medication.id).label('count')
-        ).group_by(Medication.unit).all()
+        unit_stats = (await self.db.execute(
+            select(
+                Medication.unit,
+                func.count(Medication.id).label('count')
+            ).group_by(Medication.unit)
+        )).all()
 
         # Medicamentos más prescritos
         most_prescribed = sorted(results, key=lambda x: x.total_treatments, reverse=True)[:10]
@@ -297,15 +357,15 @@ class MedicationService:
             "generated_at": datetime.utcnow().isoformat()
         }
 
-    def validate_for_patient(
+    async def validate_for_patient(
             self,
             medication_id: int,
             patient_id: int
     ) -> Dict[str, Any]:
         """Validar medicamento para un paciente específico"""
 
-        medication = self.get_medication_by_id(medication_id)
-        patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
+        medication = await self.get_medication_by_id(medication_id)
+        patient = await self.db.get(Patient, patient_id)
 
         if not medication or not patient:
             return {"is_safe": False, "warnings": ["Medicamento o paciente no encontrado"]}
@@ -322,14 +382,17 @@ class MedicationService:
                     warnings.append(f"Posible alergia a {allergy}")
 
         # Verificar con medicamentos actuales
-        current_medications = self.db.query(Treatment).filter(
-            and_(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE
+        result = await self.db.execute(
+            select(Treatment).filter(
+                and_(
+                    Treatment.patient_id == patient_id,
+                    Treatment.status == TreatmentStatus.ACTIVE
+                )
             )
-        ).all()
+        )
+        current_medications = result.scalars().all()
 
-        interactions = self.check_interactions(
+        interactions = await self.check_interactions(
             medication_id,
             [t.medication_id for t in current_medications]
         )
@@ -374,18 +437,79 @@ class MedicationService:
 
         return recommendations
 
-    def get_popular_medications(self, limit: int = 20) -> List[Medication]:
+    async def get_popular_medications(self, limit: int = 20) -> List[Medication]:
         """Obtener medicamentos más populares"""
 
-        return self.db.query(Medication).join(Treatment).group_by(
-            Medication.id
-        ).order_by(
-            func.count(Treatment.id).desc()
-        ).limit(limit).all()
+        result = await self.db.execute(
+            select(Medication).join(Treatment).group_by(
+                Medication.id
+            ).order_by(
+                func.count(Treatment.id).desc()
+            ).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_medications_by_category(self, category: str) -> List[Medication]:
+        """Obtener medicamentos por categoría asignada"""
 
-    def get_medications_by_category(self, category: str) -> List[Medication]:
-        """Obtener medicamentos por categoría (basado en descripción)"""
+        try:
+            category = MedicationCategory(category.lower())
+        except ValueError:
+            return []
 
-        return self.db.query(Medication).filter(
-            func.lower(Medication.description).like(f"%{category.lower()}%")
-        ).all()
\ No newline at end of file
+        result = await self.db.execute(
+            select(Medication)
+            .join(MedicationCategoryAssignment, MedicationCategoryAssignment.medication_id == Medication.id)
+            .filter(MedicationCategoryAssignment.category == category)
+            .order_by(Medication.name)
+        )
+        return result.scalars().all()
+
+    async def assign_missing_categories(self) -> int:
+        """
+        Clasificar los medicamentos que aún no tienen categoría.
+
+        Corre al arrancar en cada worker: INSERT IGNORE por medication_id
+        deja la categoría que otro worker (o el usuario) haya asignado entre
+        la consulta y el insert, en lugar de fallar por llave duplicada.
+        """
+
+        result = await self.db.execute(
+            select(
+                Medication.id,
+                Medication.name,
+                Medication.generic_name,
+                Medication.brand_name,
+                Medication.description
+            )
+            .outerjoin(MedicationCategoryAssignment, MedicationCategoryAssignment.medication_id == Medication.id)
+            .filter(MedicationCategoryAssignment.medication_id.is_(None))
+        )
+        rows = [
+            {
+                "medication_id": medication.id,
+                "category": classify_medication(
+                    medication.name,
+                    medication.generic_name,
+                    medication.brand_name,
+                    medication.description
+                ),
+                "source": "rule"
+            }
+            for medication in result.all()
+        ]
+        if not rows:
+            return 0
+
+        stmt = build_upsert(
+            self.db,
+            MedicationCategoryAssignment.__table__,
+            key_columns=["medication_id"],
+            update_columns=[]
+        )
+        assigned = (await self.db.execute(stmt, rows)).rowcount
+        await self.db.commit()
+        if assigned:
+            report_cache.bump_all()
+            logger.info(f"Categorías asignadas a {assigned} medicamentos")
+        return assigned
\ No newline at end of file
@@ -1,17 +1,24 @@
 """
 Servicio de gestión de pacientes
 """
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import select, and_, or_, func, case
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 
+from app.core.access_index import access_index
 from app.models.patient import Patient, Gender
 from app.models.treatment import Treatment, TreatmentStatus
 from app.models.alert import Alert
 from app.models.dose_record import DoseRecord, DoseStatus
 from app.models.compliance import ComplianceRecord
+from app.models.activity_event import ActivityType
 from app.schemas.patient import PatientCreate, PatientUpdate
+from app.services.activity_service import ActivityService
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.dose_schedule_service import schedule_changes
+from app.services.report_service import report_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,10 +27,10 @@ logger = logging.getLogger(__name__)
 class PatientService:
     """Servicio para gestión de pacientes"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_patients_by_caregiver(
+    async def get_patients_by_caregiver(
             self,
             caregiver_id: int,
             skip: int = 0,
@@ -33,7 +40,7 @@ class PatientService:
     ) -> List[Patient]:
         """Obtener pacientes de un cuidador con filtros"""
 
-        query = self.db.query(Patient).filter(Patient.caregiver_id == caregiver_id)
+        query = select(Patient).filter(Patient.caregiver_id == caregiver_id)
 
         # Filtro de búsqueda
         if search:
@@ -49,20 +56,25 @@ class PatientService:
         if gender:
             query = query.filter(Patient.gender == gender)
 
-        return query.offset(skip).limit(limit).all()
+        result = await self.db.execute(query.offset(skip).limit(limit))
+        return result.scalars().all()
 
-    def get_patient_by_id(self, patient_id: int) -> Optional[Patient]:
+    async def get_patient_by_id(self, patient_id: int) -> Optional[Patient]:
         """Obtener paciente por ID con relaciones"""
-        return self.db.query(Patient).options(
-            joinedload(Patient.treatments),
-            joinedload(Patient.alerts)
-        ).filter(Patient.id == patient_id).first()
+        result = await self.db.execute(
+            select(Patient).options(
+                joinedload(Patient.treatments),
+                joinedload(Patient.alerts)
+            ).filter(Patient.id == patient_id)
+        )
+        return result.unique().scalars().first()
 
-    def get_patient_by_email(self, email: str) -> Optional[Patient]:
+    async def get_patient_by_email(self, email: str) -> Optional[Patient]:
         """Obtener paciente por email"""
-        return self.db.query(Patient).filter(Patient.email == email).first()
+        result = await self.db.execute(select(Patient).filter(Patient.email == email))
+        return result.scalars().first()
 
-    def create_patient(self, patient_data: PatientCreate, caregiver_id: int) -> Patient:
+    async def create_patient(self, patient_data: PatientCreate, caregiver_id: int) -> Patient:
         """Crear nuevo paciente"""
 
         db_patient = Patient(
@@ -81,16 +93,23 @@ class PatientService:
         )
 
         self.db.add(db_patient)
-        self.db.commit()
-        self.db.refresh(db_patient)
+        await self.db.flush()
+        ActivityService(self.db).record_patient_event(
+            db_patient, ActivityType.PATIENT_CREATED, "Paciente registrado"
+        )
+        await self.db.commit()
+        await self.db.refresh(db_patient)
+        access_index.add_patient(caregiver_id, db_patient.id)
+        dashboard_snapshots.patient_added(caregiver_id, db_patient)
+        report_cache.bump(caregiver_id)
 
         logger.info(f"Paciente creado: {db_patient.name} (ID: {db_patient.id})")
         return db_patient
 
-    def update_patient(self, patient_id: int, patient_update: PatientUpdate) -> Optional[Patient]:
+    async def update_patient(self, patient_id: int, patient_update: PatientUpdate) -> Optional[Patient]:
         """Actualizar paciente"""
 
-        patient = self.get_patient_by_id(patient_id)
+        patient = await self.get_patient_by_id(patient_id)
         if not patient:
             return None
 
@@ -104,82 +123,108 @@ class PatientService:
             if hasattr(patient, field):
                 setattr(patient, field, value)
 
-        self.db.commit()
-        self.db.refresh(patient)
+        ActivityService(self.db).record_patient_event(
+            patient, ActivityType.PATIENT_UPDATED, "Perfil actualizado"
+        )
+        await self.db.commit()
+        await self.db.refresh(patient)
+        dashboard_snapshots.patient_updated(patient.caregiver_id)
+        if "timezone" in update_data:
+            schedule_changes.patient_changed(patient.id)
+        report_cache.bump(patient.caregiver_id)
 
         logger.info(f"Paciente actualizado: {patient.name} (ID: {patient.id})")
         return patient
 
-    def delete_patient(self, patient_id: int) -> bool:
+    async def delete_patient(self, patient_id: int) -> bool:
         """Eliminar paciente"""
 
-        patient = self.get_patient_by_id(patient_id)
+        patient = await self.get_patient_by_id(patient_id)
         if not patient:
             return False
 
-        self.db.delete(patient)
-        self.db.commit()
+        treatment_ids = [treatment.id for treatment in patient.treatments]
+        ActivityService(self.db).record_patient_event(
+            patient, ActivityType.PATIENT_DELETED, "Paciente eliminado"
+        )
+        await self.db.delete(patient)
+        await self.db.commit()
+        access_index.remove_patient(patient.caregiver_id, patient.id, treatment_ids)
+        dashboard_snapshots.patient_removed(patient.caregiver_id, patient)
+        report_cache.bump(patient.caregiver_id)
 
         logger.info(f"Paciente eliminado: {patient.name} (ID: {patient.id})")
         return True
 
-    def has_active_treatments(self, patient_id: int) -> bool:
+    async def has_active_treatments(self, patient_id: int) -> bool:
         """Verificar si el paciente tiene tratamientos activos"""
 
-        active_count = self.db.query(Treatment).filter(
-            and_(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE,
-                Treatment.end_date >= date.today()
+        active_count = await self.db.scalar(
+            select(func.count(Treatment.id)).filter(
+                and_(
+                    Treatment.patient_id == patient_id,
+                    Treatment.status == TreatmentStatus.ACTIVE,
+                    Treatment.end_date >= date.today()
+                )
             )
-        ).count()
+        )
 
         return active_count > 0
 
-    def get_patient_treatments(self, patient_id: int) -> List[Treatment]:
+    async def get_patient_treatments(self, patient_id: int) -> List[Treatment]:
         """Obtener tratamientos del paciente"""
 
-        return self.db.query(Treatment).options(
-            joinedload(Treatment.medication)
-        ).filter(Treatment.patient_id == patient_id).all()
+        result = await self.db.execute(
+            select(Treatment).options(
+                joinedload(Treatment.medication)
+            ).filter(Treatment.patient_id == patient_id)
+        )
+        return result.scalars().all()
 
-    def get_patient_active_treatments(self, patient_id: int) -> List[Treatment]:
+    async def get_patient_active_treatments(self, patient_id: int) -> List[Treatment]:
         """Obtener tratamientos activos del paciente"""
 
-        return self.db.query(Treatment).options(
-            joinedload(Treatment.medication)
-        ).filter(
-            and_(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE,
-                Treatment.end_date >= date.today()
+        result = await self.db.execute(
+            select(Treatment).options(
+                joinedload(Treatment.medication)
+            ).filter(
+                and_(
+                    Treatment.patient_id == patient_id,
+                    Treatment.status == TreatmentStatus.ACTIVE,
+                    Treatment.end_date >= date.today()
+                )
             )
-        ).all()
+        )
+        return result.scalars().all()
 
-    def get_patient_alerts(self, patient_id: int, unread_only: bool = False) -> List[Alert]:
+    async def get_patient_alerts(self, patient_id: int, unread_only: bool = False) -> List[Alert]:
         """Obtener alertas del paciente"""
 
-        query = self.db.query(Alert).filter(Alert.patient_id == patient_id)
+        query = select(Alert).filter(Alert.patient_id == patient_id)
 
         if unread_only:
             query = query.filter(Alert.is_read == False)
 
-        return query.order_by(Alert.created_at.desc()).all()
+        result = await self.db.execute(query.order_by(Alert.created_at.desc()))
+        return result.scalars().all()
 
-    def get_patient_compliance_report(self, patient_id: int, days: int = 30) -> dict:
+    async def get_patient_compliance_report(self, patient_id: int, days: int = 30) -> dict:
         """Generar reporte de cumplimiento del paciente"""
 
         start_date = date.today() - timedelta(days=days)
         end_date = date.today()
 
         # Obtener registros de cumplimiento
-        compliance_records = self.db.query(ComplianceRecord).filter(
-            and_(
-                ComplianceRecord.patient_id == patient_id,
-                ComplianceRecord.date >= start_date,
-                ComplianceRecord.date <= end_date
+        result = await self.db.execute(
+            select(ComplianceRecord).filter(
+                and_(
+                    ComplianceRecord.patient_id == patient_id,
+                    ComplianceRecord.date >= start_date,
+                    ComplianceRecord.date <= end_date
+                )
             )
-        ).all()
+        )
+        compliance_records = result.scalars().all()
 
         # Calcular estadísticas
         total_scheduled = sum(record.scheduled_doses for record in compliance_records)
@@ -215,12 +260,12 @@ class PatientService:
             "daily_compliance": daily_compliance
         }
 
-    def add_patient_note(self, patient_id: int, note_data: dict, created_by: int) -> dict:
+    async def add_patient_note(self, patient_id: int, note_data: dict, created_by: int) -> dict:
         """Agregar nota al historial del paciente"""
 
         # Por ahora, esto es un placeholder. En una implementación real,
         # tendrías una tabla de notas separada
-        patient = self.get_patient_by_id(patient_id)
+        patient = await self.get_patient_by_id(patient_id)
         if not patient:
             return None
 
@@ -232,45 +277,46 @@ class PatientService:
             "created_at": datetime.utcnow().isoformat()
         }
 
-        # Agregar a historial médico (temporal)
-        if not patient.medical_history:
-            patient.medical_history = []
-
-        patient.medical_history.append(f"[{note['created_at']}] {note['content']}")
-        self.db.commit()
+        # Agregar a historial médico (temporal). Se reasigna la lista para que
+        # SQLAlchemy detecte el cambio en la columna JSON
+        patient.medical_history = (patient.medical_history or []) + [
+            f"[{note['created_at']}] {note['content']}"
+        ]
+        await self.db.commit()
 
         logger.info(f"Nota agregada al paciente {patient_id}")
         return note
 
-    def get_patient_statistics(self, patient_id: int) -> dict:
+    async def get_patient_statistics(self, patient_id: int) -> dict:
         """Obtener estadísticas del paciente"""
 
         # Tratamientos
-        total_treatments = self.db.query(Treatment).filter(
-            Treatment.patient_id == patient_id
-        ).count()
-
-        active_treatments = self.db.query(Treatment).filter(
-            and_(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE,
-                Treatment.end_date >= date.today()
-            )
-        ).count()
-
-        completed_treatments = self.db.query(Treatment).filter(
-            and_(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.COMPLETED
-            )
-        ).count()
+        treatment_stats = (await self.db.execute(
+            select(
+                func.count(Treatment.id).label('total'),
+                func.sum(case((and_(
+                    Treatment.status == TreatmentStatus.ACTIVE,
+                    Treatment.end_date >= date.today()
+                ), 1), else_=0)).label('active'),
+                func.sum(case((Treatment.status == TreatmentStatus.COMPLETED, 1), else_=0)).label('completed')
+            ).filter(Treatment.patient_id == patient_id)
+        )).first()
+
+        total_treatments = treatment_stats.total or 0
+        active_treatments = treatment_stats.active or 0
+        completed_treatments = treatment_stats.completed or 0
 
         # Dosis
-        dose_stats = self.db.query(
-            func.count(DoseRecord.id).label('total'),
-            func.sum(func.case([(DoseRecord.status == DoseStatus.TAKEN, 1)], else_=0)).label('taken'),
-            func.sum(func.case([(DoseRecord.status == DoseStatus.MISSED, 1)], else_=0)).label('missed')
-        ).filter(DoseRecord.patient_id == patient_id).first()
+        dose_stats = (await self.db.execute(
+            select(
+                func.count(DoseRecord.id).label('total'),
+                func.sum(case((DoseRecord.status == DoseStatus.TAKEN, 1), else_=0)).label('taken'),
+                func.sum(case((DoseRecord.status == DoseStatus.MISSED, 1), else_=0)).label('missed')
+            ).filter(
+                DoseRecord.patient_id == patient_id,
+                DoseRecord.scheduled_time <= datetime.utcnow()
+            )
+        )).first()
 
         total_doses = dose_stats.total or 0
         taken_doses = dose_stats.taken or 0
@@ -279,20 +325,24 @@ class PatientService:
         compliance_rate = (taken_doses / total_doses * 100) if total_doses > 0 else 0
 
         # Última y próxima dosis
-        last_dose = self.db.query(DoseRecord).filter(
-            and_(
-                DoseRecord.patient_id == patient_id,
-                DoseRecord.status == DoseStatus.TAKEN
-            )
-        ).order_by(DoseRecord.actual_time.desc()).first()
-
-        next_dose = self.db.query(DoseRecord).filter(
-            and_(
-                DoseRecord.patient_id == patient_id,
-                DoseRecord.status == DoseStatus.PENDING,
-                DoseRecord.scheduled_time > datetime.utcnow()
-            )
-        ).order_by(DoseRecord.scheduled_time.asc()).first()
+        last_dose = (await self.db.execute(
+            select(DoseRecord).filter(
+                and_(
+                    DoseRecord.patient_id == patient_id,
+                    DoseRecord.status == DoseStatus.TAKEN
+                )
+            ).order_by(DoseRecord.actual_time.desc()).limit(1)
+        )).scalars().first()
+
+        next_dose = (await self.db.execute(
+            select(DoseRecord).filter(
+                and_(
+                    DoseRecord.patient_id == patient_id,
+                    DoseRecord.status == DoseStatus.PENDING,
+                    DoseRecord.scheduled_time > datetime.utcnow()
+                )
+            ).order_by(DoseRecord.scheduled_time.asc()).limit(1)
+        )).scalars().first()
 
         return {
             "treatments": {
@@ -312,69 +362,68 @@ class PatientService:
             }
         }
 
-    def search_patients(self, caregiver_id: int, query: str) -> List[Patient]:
+    async def search_patients(self, caregiver_id: int, query: str) -> List[Patient]:
         """Buscar pacientes por texto"""
 
         search_term = f"%{query.lower()}%"
 
-        return self.db.query(Patient).filter(
-            and_(
-                Patient.caregiver_id == caregiver_id,
-                or_(
-                    func.lower(Patient.name).like(search_term),
-                    func.lower(Patient.email).like(search_term),
-                    func.lower(Patient.phone).like(search_term)
+        result = await self.db.execute(
+            select(Patient).filter(
+                and_(
+                    Patient.caregiver_id == caregiver_id,
+                    or_(
+                        func.lower(Patient.name).like(search_term),
+                        func.lower(Patient.email).like(search_term),
+                        func.lower(Patient.phone).like(search_term)
+                    )
                 )
             )
-        ).all()
+        )
+        return result.scalars().all()
 
-    def get_patients_needing_attention(self, caregiver_id: int) -> List[dict]:
+    async def get_patients_needing_attention(self, caregiver_id: int) -> List[dict]:
         """Obtener pacientes que necesitan atención"""
 
-        # Pacientes con alertas no leídas
-        patients_with_alerts = self.db.query(Patient).join(Alert).filter(
-            and_(
-                Patient.caregiver_id == caregiver_id,
-                Alert.is_read == False
-            )
-        ).distinct().all()
-
-        # Pacientes con dosis perdidas
-        patients_with_missed_doses = self.db.query(Patient).join(DoseRecord).filter(
-            and_(
-                Patient.caregiver_id == caregiver_id,
-                DoseRecord.status == DoseStatus.MISSED,
-                DoseRecord.scheduled_time >= datetime.utcnow() - timedelta(days=1)
-            )
-        ).distinct().all()
+        missed_since = datetime.utcnow() - timedelta(days=1)
 
-        attention_needed = []
+        # Pacientes con alertas no leídas (con su conteo)
+        alerts_result = await self.db.execute(
+            select(Patient, func.count(Alert.id).label('unread_alerts')).join(Alert).filter(
+                and_(
+                    Patient.caregiver_id == caregiver_id,
+                    Alert.is_read == False
+                )
+            ).group_by(Patient.id)
+        )
+        patients_with_alerts = alerts_result.all()
+
+        # Pacientes con dosis perdidas (con su conteo)
+        missed_result = await self.db.execute(
+            select(Patient, func.count(DoseRecord.id).label('missed_count')).join(DoseRecord).filter(
+                and_(
+                    Patient.caregiver_id == caregiver_id,
+                    DoseRecord.status == DoseStatus.MISSED,
+                    DoseRecord.scheduled_time >= missed_since
+                )
+            ).group_by(Patient.id)
+        )
+        patients_with_missed_doses = missed_result.all()
 
-        for patient in patients_with_alerts:
-            unread_alerts = self.db.query(Alert).filter(
-                and_(Alert.patient_id == patient.id, Alert.is_read == False)
-            ).count()
+        attention_needed = []
 
+        for patient, unread_alerts in patients_with_alerts:
             attention_needed.append({
                 "patient": patient,
                 "reason": "unread_alerts",
                 "details": f"{unread_alerts} alertas sin leer"
             })
 
-        for patient in patients_with_missed_doses:
+        for patient, missed_count in patients_with_missed_doses:
             if not any(item["patient"].id == patient.id for item in attention_needed):
-                missed_count = self.db.query(DoseRecord).filter(
-                    and_(
-                        DoseRecord.patient_id == patient.id,
-                        DoseRecord.status == DoseStatus.MISSED,
-                        DoseRecord.scheduled_time >= datetime.utcnow() - timedelta(days=1)
-                    )
-                ).count()
-
                 attention_needed.append({
                     "patient": patient,
                     "reason": "missed_doses",
                     "details": f"{missed_count} dosis perdidas en 24h"
                 })
 
-        return attention_needed
\ No newline at end of file
+        return attention_needed
@@ -0,0 +1,118 @@
+"""
+Servicio de renderizado de PDF en procesos aparte
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import List, Dict, Any
+import asyncio
+import logging
+
+from app.core.config import get_settings
+from app.utils.report_utils import render_pdf_report
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class PdfRenderTimeout(Exception):
+    """El renderizado superó PDF_RENDER_TIMEOUT"""
+
+
+class PdfRenderError(Exception):
+    """El proceso de renderizado falló"""
+
+
+class PdfRenderer:
+    """
+    Renderizador de reportes PDF.
+
+    El maquetado es CPU intensivo, así que corre fuera del event loop de la
+    API, en procesos que se reutilizan entre reportes (contexto "spawn": no
+    heredan el estado del proceso de la API) y se reciclan tras
+    max_tasks_per_child reportes para acotar la memoria.
+
+    Hay un pool de un proceso por cada uno de los max_workers lugares: una
+    tarea en curso no se puede cancelar, así que si un reporte supera el
+    timeout se termina solo el proceso de su pool y se reemplaza; los demás
+    reportes en curso siguen.
+    """
+
+    def __init__(self, max_workers: int, timeout: float, max_tasks_per_child: int):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._slots = asyncio.Semaphore(max_workers)
+        self._idle: List[ProcessPoolExecutor] = [self._new_pool() for _ in range(max_workers)]
+        self._busy: List[ProcessPoolExecutor] = []
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Los procesos se crean con el primer reporte, no al importar
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=get_context("spawn"),
+            max_tasks_per_child=self.max_tasks_per_child
+        )
+
+    @staticmethod
+    def _terminate(pool: ProcessPoolExecutor):
+        """Terminar el proceso del pool aunque esté renderizando"""
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        # Esperar al hilo del pool (ya sin procesos vivos es inmediato):
+        # cerrarlo sin esperar compite con el reciclaje de procesos
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    async def render(self, report_type: str, rows: List[Dict[str, Any]], meta: Dict[str, Any], path: str):
+        """
+        Renderizar el reporte en `path`; lanza PdfRenderTimeout si tarda
+        demasiado y PdfRenderError si el proceso falla.
+        """
+        async with self._slots:
+            pool = self._idle.pop()
+            self._busy.append(pool)
+            loop = asyncio.get_running_loop()
+            try:
+                await asyncio.wait_for(
+                    loop.run_in_executor(pool, render_pdf_report, report_type, rows, meta, path),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Renderizado PDF de {report_type} superó {self.timeout}s; terminando su proceso")
+                pool = self._replace(pool)
+                raise PdfRenderTimeout(f"El renderizado del PDF superó {self.timeout} segundos")
+            except asyncio.CancelledError:
+                # Cancelación: terminar solo este proceso
+                pool = self._replace(pool)
+                raise
+            except BrokenProcessPool as e:
+                # El proceso murió (p. ej. sin memoria)
+                pool = self._replace(pool)
+                raise PdfRenderError(f"Error renderizando PDF de {report_type}: {e}")
+            except Exception as e:
+                raise PdfRenderError(f"Error renderizando PDF de {report_type}: {type(e).__name__}: {e}")
+            finally:
+                self._busy.remove(pool)
+                self._idle.append(pool)
+
+    def _replace(self, pool: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Terminar el pool y ocupar su lugar con uno nuevo"""
+        self._terminate(pool)
+        replacement = self._new_pool()
+        self._busy[self._busy.index(pool)] = replacement
+        return replacement
+
+    def shutdown(self):
+        """Terminar los renderizados en curso (al apagar la aplicación)"""
+        for pool in self._busy:
+            self._terminate(pool)
+        for pool in self._idle:
+            pool.shutdown(wait=True)
+
+
+pdf_renderer = PdfRenderer(
+    max_workers=settings.PDF_RENDER_WORKERS,
+    timeout=settings.PDF_RENDER_TIMEOUT,
+    max_tasks_per_child=settings.PDF_RENDER_TASKS_PER_CHILD
+)
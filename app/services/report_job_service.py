@@ -0,0 +1,232 @@
+"""
+Servicio de trabajos de reporte en segundo plano
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Dict, Any, Tuple, Callable
+from datetime import datetime, timedelta
+import asyncio
+import csv
+import json
+import logging
+import os
+
+from app.core.config import get_settings
+from app.core.security import Principal
+from app.models.report_job import ReportJob, ReportJobStatus
+from app.services.pdf_service import pdf_renderer
+from app.services.report_service import ReportService, normalize_period
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+REPORT_TYPES = ["compliance", "medications", "alerts"]
+
+# Formato -> media type
+REPORT_FORMATS = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "pdf": "application/pdf"
+}
+
+# Avisos a los workers de este proceso; los de otros procesos encuentran
+# el trabajo al revisar la tabla cada REPORT_JOB_POLL_INTERVAL segundos
+job_queue: "asyncio.Queue[int]" = asyncio.Queue()
+
+
+def dedupe_key(caregiver_id: Optional[int], report_type: str, format: str, period: str) -> str:
+    """Llave que identifica solicitudes idénticas"""
+    scope = "all" if caregiver_id is None else caregiver_id
+    return f"{scope}:{report_type}:{format}:{period}"
+
+
+def render_json(rows: List[Dict[str, Any]], path: str, meta: Dict[str, Any]):
+    """Escribir reporte JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**meta, "data": rows}, f, ensure_ascii=False, default=str)
+
+
+def render_csv(rows: List[Dict[str, Any]], path: str, meta: Dict[str, Any]):
+    """Escribir reporte CSV (columnas de la primera fila)"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if not rows:
+            return
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+REPORT_RENDERERS: Dict[str, Callable[[List[Dict[str, Any]], str, Dict[str, Any]], None]] = {
+    "json": render_json,
+    "csv": render_csv
+}
+
+
+def job_to_dict(job: ReportJob) -> Dict[str, Any]:
+    """Formato de respuesta de un trabajo"""
+    data = {
+        "id": job.id,
+        "type": job.report_type,
+        "format": job.format,
+        "period": job.period,
+        "status": job.status.value,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "startedAt": job.started_at.isoformat() if job.started_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        "statusUrl": f"/api/reports/jobs/{job.id}",
+        "downloadUrl": None,
+        "error": job.error
+    }
+    if job.status == ReportJobStatus.COMPLETED:
+        data["downloadUrl"] = f"/api/reports/jobs/{job.id}/download"
+    return data
+
+
+class ReportJobService:
+    """
+    Servicio de la cola de reportes.
+
+    La API solo inserta el trabajo (enqueue); los workers de
+    app/background/report_tasks.py lo reclaman con un UPDATE condicional
+    (claim) y lo generan en REPORTS_FOLDER (run).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _pending_duplicate(self, key: str) -> Optional[ReportJob]:
+        return (await self.db.execute(
+            select(ReportJob).filter(ReportJob.dedupe_key == key)
+        )).scalar_one_or_none()
+
+    async def enqueue(
+            self,
+            principal: Principal,
+            report_type: str,
+            format: str,
+            period: str
+    ) -> Tuple[ReportJob, bool]:
+        """
+        Encolar reporte; devuelve (trabajo, creado).
+
+        Si ya hay un trabajo pendiente o en curso idéntico se devuelve ese.
+        Lanza InvalidPeriodError si el período no es válido.
+        """
+        period = normalize_period(period)
+        key = dedupe_key(principal.caregiver_scope, report_type, format, period)
+        existing = await self._pending_duplicate(key)
+        if existing:
+            return existing, False
+
+        job = ReportJob(
+            requested_by_id=principal.id,
+            caregiver_id=principal.caregiver_scope,
+            report_type=report_type,
+            format=format,
+            period=period,
+            status=ReportJobStatus.PENDING,
+            dedupe_key=key
+        )
+        self.db.add(job)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # Otra solicitud idéntica ganó la carrera
+            await self.db.rollback()
+            existing = await self._pending_duplicate(key)
+            if existing:
+                return existing, False
+            raise
+
+        await self.db.refresh(job)
+        job_queue.put_nowait(job.id)
+        logger.info(f"Reporte encolado: {job.id} ({key})")
+        return job, True
+
+    async def get_job(self, job_id: int, principal: Principal) -> Optional[ReportJob]:
+        """Trabajo visible para el usuario (admin ve todos)"""
+        job = await self.db.get(ReportJob, job_id)
+        if job is None:
+            return None
+        if principal.caregiver_scope is not None and job.caregiver_id != principal.caregiver_scope:
+            return None
+        return job
+
+    async def next_pending_id(self) -> Optional[int]:
+        """
+        Trabajo pendiente más antiguo.
+
+        Antes devuelve a pendiente los trabajos en curso que superaron
+        REPORT_JOB_TIMEOUT (p. ej. el proceso que los tenía se reinició).
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+        await self.db.execute(
+            update(ReportJob)
+            .where(ReportJob.status == ReportJobStatus.RUNNING, ReportJob.started_at < stale_before)
+            .values(status=ReportJobStatus.PENDING, started_at=None)
+        )
+        await self.db.commit()
+
+        return await self.db.scalar(
+            select(ReportJob.id)
+            .filter(ReportJob.status == ReportJobStatus.PENDING)
+            .order_by(ReportJob.created_at, ReportJob.id)
+            .limit(1)
+        )
+
+    async def claim(self, job_id: int) -> bool:
+        """Tomar el trabajo; solo un worker (de cualquier proceso) lo consigue"""
+        result = await self.db.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status == ReportJobStatus.PENDING)
+            .values(status=ReportJobStatus.RUNNING, started_at=datetime.utcnow())
+        )
+        await self.db.commit()
+        return result.rowcount == 1
+
+    async def _build(self, job: ReportJob) -> List[Dict[str, Any]]:
+        report_service = ReportService(self.db)
+        if job.report_type == "compliance":
+            return await report_service.get_compliance_trend(job.caregiver_id, job.period)
+        if job.report_type == "medications":
+            return await report_service.get_medication_distribution(job.caregiver_id)
+        return await report_service.get_alert_report(job.caregiver_id, job.period)
+
+    async def run(self, job_id: int):
+        """Generar el archivo de un trabajo ya reclamado"""
+        job = await self.db.get(ReportJob, job_id)
+        try:
+            # El nombre del archivo solo lleva el período ya validado
+            period = normalize_period(job.period)
+            rows = await self._build(job)
+            os.makedirs(settings.REPORTS_FOLDER, exist_ok=True)
+            path = os.path.join(
+                settings.REPORTS_FOLDER,
+                f"{job.report_type}_{period}_{job.id}.{job.format}"
+            )
+            meta = {
+                "type": job.report_type,
+                "period": period,
+                "generatedAt": datetime.utcnow().isoformat()
+            }
+            if job.format == "pdf":
+                # Maquetado CPU intensivo: en un proceso aparte
+                await pdf_renderer.render(job.report_type, rows, meta, path)
+            else:
+                # La escritura del archivo no bloquea el event loop
+                await asyncio.to_thread(REPORT_RENDERERS[job.format], rows, path, meta)
+
+            job.status = ReportJobStatus.COMPLETED
+            job.file_path = path
+        except Exception as e:
+            logger.error(f"Error generando reporte {job_id}: {e}")
+            await self.db.rollback()
+            job = await self.db.get(ReportJob, job_id)
+            job.status = ReportJobStatus.FAILED
+            job.error = str(e)
+
+        job.dedupe_key = None
+        job.finished_at = datetime.utcnow()
+        await self.db.commit()
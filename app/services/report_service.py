@@ -0,0 +1,567 @@
+"""
+Servicio de reportes y análisis
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, extract, literal_column, true
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable, Hashable
+from datetime import date, datetime, time, timedelta, timezone
+import re
+import logging
+
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.models.alert import Alert
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import MedicationCategory, MedicationCategoryAssignment
+from app.models.patient import Patient
+from app.models.treatment import Treatment
+from app.utils.date_utils import get_zone
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+PERIOD_PATTERN = re.compile(r"^(\d+)([dwmy])$")
+PERIOD_UNIT_DAYS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+# Nombre y color de cada categoría en los gráficos
+MEDICATION_CATEGORY_LABELS = {
+    MedicationCategory.CARDIOVASCULAR: ('Cardiovasculares', '#3B82F6'),
+    MedicationCategory.DIABETES: ('Diabetes', '#10B981'),
+    MedicationCategory.ANALGESIC: ('Analgésicos', '#F59E0B'),
+    MedicationCategory.ANTIBIOTIC: ('Antibióticos', '#EF4444'),
+    MedicationCategory.OTHER: ('Otros', '#8B5CF6')
+}
+
+
+# Período más largo que aceptan los reportes
+MAX_PERIOD_DAYS = 5 * 365
+
+
+class InvalidPeriodError(ValueError):
+    """Período con formato no válido o mayor que MAX_PERIOD_DAYS"""
+
+
+def normalize_period(period: Optional[str]) -> str:
+    """
+    Validar "30d", "12w", "6m", "1y" y devolverlo normalizado (sin espacios,
+    en minúsculas); lanza InvalidPeriodError si no es válido.
+    """
+    normalized = (period or "").strip().lower()
+    match = PERIOD_PATTERN.match(normalized)
+    if not match:
+        raise InvalidPeriodError(f"Período no válido: {period}. Usa un número y d, w, m o y (ej. 7d, 12w, 6m, 1y)")
+    if int(match.group(1)) * PERIOD_UNIT_DAYS[match.group(2)] > MAX_PERIOD_DAYS:
+        raise InvalidPeriodError(f"El período máximo es de {MAX_PERIOD_DAYS // 365} años")
+    return normalized
+
+
+def parse_period(period: str) -> int:
+    """Convertir "30d", "12w", "6m", "1y" en días; lanza InvalidPeriodError si no es válido"""
+    match = PERIOD_PATTERN.match(normalize_period(period))
+    return max(1, int(match.group(1)) * PERIOD_UNIT_DAYS[match.group(2)])
+
+
+def bucket_granularity(days: int) -> str:
+    """Diario hasta 90 días, semanal hasta un año, mensual después"""
+    if days <= 90:
+        return "day"
+    if days <= 365:
+        return "week"
+    return "month"
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Inicio del bucket (lunes para semanas, día 1 para meses)"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_range(start: date, end: date, granularity: str) -> List[date]:
+    """Inicios de todos los buckets entre start y end"""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        if granularity == "week":
+            current += timedelta(days=7)
+        elif granularity == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=1)
+    return buckets
+
+
+# Rangos del histograma de cumplimiento: (etiqueta, mínimo, color)
+COMPLIANCE_RANGES = [
+    ('90-100%', 90, '#10B981'),
+    ('80-89%', 80, '#F59E0B'),
+    ('70-79%', 70, '#EF4444'),
+    ('60-69%', 60, '#DC2626'),
+    ('<60%', None, '#7F1D1D')
+]
+
+
+def _bucket_expression(dialect: str, granularity: str):
+    """Expresión SQL del inicio del bucket para ComplianceRecord.date"""
+    column = ComplianceRecord.date
+    if granularity == "day":
+        return column
+
+    if dialect == "mysql":
+        if granularity == "week":
+            return func.date_sub(column, literal_column("INTERVAL WEEKDAY(compliance_records.date) DAY"))
+        return func.date_format(column, "%Y-%m-01")
+
+    if dialect == "sqlite":
+        if granularity == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        return func.strftime("%Y-%m-01", column)
+
+    raise NotImplementedError(f"Buckets no soportados para {dialect}")
+
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class ReportService:
+    """Servicio para reportes y análisis"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_compliance_trend(
+            self,
+            caregiver_id: Optional[int],
+            period: str = "30d"
+    ) -> List[Dict[str, Any]]:
+        """
+        Tendencia de cumplimiento desde compliance_records.
+
+        Una sola consulta agrupa por bucket (día, semana o mes según el
+        largo del período); los buckets sin dosis se devuelven en cero.
+        """
+        days = parse_period(period)
+        granularity = bucket_granularity(days)
+        end_date = date.today()
+        start_date = end_date - timedelta(days=days - 1)
+
+        dialect = self.db.get_bind().dialect.name
+        bucket = _bucket_expression(dialect, granularity).label("bucket")
+
+        query = (
+            select(
+                bucket,
+                func.count(func.distinct(ComplianceRecord.patient_id)).label("patients"),
+                func.coalesce(func.sum(ComplianceRecord.scheduled_doses), 0).label("scheduled"),
+                func.coalesce(func.sum(ComplianceRecord.taken_doses), 0).label("taken")
+            )
+            .filter(
+                ComplianceRecord.date >= start_date,
+                ComplianceRecord.date <= end_date
+            )
+            .group_by(bucket)
+        )
+        if caregiver_id is not None:
+            query = query.join(Patient, ComplianceRecord.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+
+        totals: Dict[date, Tuple[int, int, int]] = {}
+        for row in (await self.db.execute(query)).all():
+            totals[_as_date(row.bucket)] = (int(row.patients), int(row.scheduled), int(row.taken))
+
+        trend = []
+        for bucket_date in bucket_range(start_date, end_date, granularity):
+            patients, scheduled, taken = totals.get(bucket_date, (0, 0, 0))
+            trend.append({
+                "date": bucket_date.isoformat(),
+                "granularity": granularity,
+                "compliance": round(taken / scheduled * 100, 1) if scheduled else 0,
+                "patients": patients,
+                "doses": scheduled
+            })
+        return trend
+
+    async def get_compliance_ranges(self, caregiver_id: Optional[int], period: str = "30d") -> List[Dict[str, Any]]:
+        """
+        Pacientes por rango de cumplimiento en el período.
+
+        El cumplimiento de cada paciente sale de compliance_records y el
+        rango se asigna con CASE; la consulta devuelve como máximo cinco
+        filas. Los pacientes sin dosis en el período no se cuentan.
+        """
+        days = parse_period(period)
+        start_date = date.today() - timedelta(days=days - 1)
+
+        per_patient = (
+            select(
+                ComplianceRecord.patient_id,
+                (
+                    100.0 * func.sum(ComplianceRecord.taken_doses)
+                    / func.sum(ComplianceRecord.scheduled_doses)
+                ).label("rate")
+            )
+            .filter(ComplianceRecord.date >= start_date)
+            .group_by(ComplianceRecord.patient_id)
+            .having(func.sum(ComplianceRecord.scheduled_doses) > 0)
+        )
+        if caregiver_id is not None:
+            per_patient = per_patient.join(Patient, ComplianceRecord.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+        per_patient = per_patient.subquery()
+
+        bucket = case(
+            *[(per_patient.c.rate >= minimum, label) for label, minimum, _ in COMPLIANCE_RANGES if minimum is not None],
+            else_=COMPLIANCE_RANGES[-1][0]
+        ).label("bucket")
+        query = select(bucket, func.count().label("patients")).group_by(bucket)
+
+        counts = {row.bucket: int(row.patients) for row in (await self.db.execute(query)).all()}
+        return [
+            {
+                "range": label,
+                "patients": counts.get(label, 0),
+                "color": color
+            }
+            for label, _, color in COMPLIANCE_RANGES
+        ]
+
+    async def get_medication_distribution(self, caregiver_id: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Distribución de tratamientos por categoría de medicamento.
+
+        Un GROUP BY sobre medication_categories; los medicamentos sin
+        categoría asignada cuentan como "Otros".
+        """
+        query = (
+            select(MedicationCategoryAssignment.category, func.count(Treatment.id).label("treatments"))
+            .select_from(Treatment)
+            .outerjoin(
+                MedicationCategoryAssignment,
+                MedicationCategoryAssignment.medication_id == Treatment.medication_id
+            )
+            .group_by(MedicationCategoryAssignment.category)
+        )
+        if caregiver_id is not None:
+            query = query.join(Patient, Treatment.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+
+        counts: Dict[MedicationCategory, int] = {}
+        for category, treatments in (await self.db.execute(query)).all():
+            category = category or MedicationCategory.OTHER
+            counts[category] = counts.get(category, 0) + int(treatments)
+
+        total = sum(counts.values()) or 1
+        distribution = []
+        for category, count in counts.items():
+            name, color = MEDICATION_CATEGORY_LABELS[category]
+            distribution.append({
+                "name": name,
+                "value": round((count / total) * 100, 1),
+                "count": count,
+                "color": color
+            })
+        return distribution
+
+    async def get_alert_report(self, caregiver_id: Optional[int], period: str = "30d") -> List[Dict[str, Any]]:
+        """Alertas del período, de la más reciente a la más antigua"""
+        days = parse_period(period)
+        since = date.today() - timedelta(days=days - 1)
+
+        query = (
+            select(
+                Alert.id,
+                Alert.created_at,
+                Patient.name.label("patient"),
+                Alert.treatment_id,
+                Alert.type,
+                Alert.severity,
+                Alert.message,
+                Alert.is_read
+            )
+            .join(Patient, Alert.patient_id == Patient.id)
+            .filter(Alert.created_at >= since)
+            .order_by(Alert.created_at.desc(), Alert.id.desc())
+        )
+        if caregiver_id is not None:
+            query = query.filter(Patient.caregiver_id == caregiver_id)
+
+        return [
+            {
+                "id": row.id,
+                "createdAt": row.created_at.isoformat() if row.created_at else None,
+                "patient": row.patient,
+                "treatmentId": row.treatment_id,
+                "type": row.type.value,
+                "severity": row.severity.value,
+                "message": row.message,
+                "isRead": bool(row.is_read)
+            }
+            for row in (await self.db.execute(query)).all()
+        ]
+
+    async def get_overview_stats(self, caregiver_id: Optional[int], period: str = "30d") -> Dict[str, Any]:
+        """
+        Estadísticas del período comparadas con el período anterior.
+
+        Una sola consulta: cada sección (cumplimiento, tratamientos,
+        alertas, pacientes) es un agregado de una fila que lee ambos rangos
+        a la vez con sumas condicionales, y se combinan con JOIN ON TRUE.
+        """
+        days = parse_period(period)
+        start_date = date.today() - timedelta(days=days - 1)
+        previous_start = start_date - timedelta(days=days)
+        start_at = datetime.combine(start_date, time.min)
+        previous_start_at = datetime.combine(previous_start, time.min)
+
+        def sum_if(condition, value=1):
+            return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+        def scoped(query, patient_column):
+            if caregiver_id is None:
+                return query
+            return query.join(Patient, patient_column == Patient.id).filter(Patient.caregiver_id == caregiver_id)
+
+        current_day = ComplianceRecord.date >= start_date
+        compliance = scoped(
+            select(
+                sum_if(current_day, ComplianceRecord.scheduled_doses).label("doses"),
+                sum_if(current_day, ComplianceRecord.taken_doses).label("taken"),
+                sum_if(current_day, ComplianceRecord.missed_doses).label("missed"),
+                sum_if(~current_day, ComplianceRecord.scheduled_doses).label("previous_doses"),
+                sum_if(~current_day, ComplianceRecord.taken_doses).label("previous_taken"),
+                sum_if(~current_day, ComplianceRecord.missed_doses).label("previous_missed")
+            ).filter(ComplianceRecord.date >= previous_start),
+            ComplianceRecord.patient_id
+        ).subquery()
+
+        treatments = scoped(
+            select(
+                sum_if(Treatment.created_at >= start_at).label("treatments"),
+                sum_if(Treatment.created_at < start_at).label("previous_treatments")
+            ).filter(Treatment.created_at >= previous_start_at),
+            Treatment.patient_id
+        ).subquery()
+
+        alerts = scoped(
+            select(
+                sum_if(Alert.created_at >= start_at).label("alerts"),
+                sum_if(Alert.created_at < start_at).label("previous_alerts")
+            ).filter(Alert.created_at >= previous_start_at),
+            Alert.patient_id
+        ).subquery()
+
+        patients = select(func.count(Patient.id).label("patients"))
+        if caregiver_id is not None:
+            patients = patients.filter(Patient.caregiver_id == caregiver_id)
+        patients = patients.subquery()
+
+        query = (
+            select(compliance, treatments, alerts, patients)
+            .select_from(compliance)
+            .join(treatments, true())
+            .join(alerts, true())
+            .join(patients, true())
+        )
+        row = (await self.db.execute(query)).one()
+
+        def rate(taken, doses):
+            return round(int(taken) / int(doses) * 100, 1) if doses else 0
+
+        def change(current, previous):
+            """Variación porcentual; None si no hay base de comparación"""
+            return round((int(current) - int(previous)) / int(previous) * 100, 1) if previous else None
+
+        compliance_rate = rate(row.taken, row.doses)
+        previous_rate = rate(row.previous_taken, row.previous_doses)
+
+        return {
+            "totalPatients": int(row.patients),
+            "totalTreatments": int(row.treatments),
+            "averageCompliance": compliance_rate,
+            "totalDoses": int(row.doses),
+            "missedDoses": int(row.missed),
+            "alerts": int(row.alerts),
+            # Puntos porcentuales de cumplimiento contra el período anterior
+            "improvementRate": round(compliance_rate - previous_rate, 1) if row.previous_doses else 0,
+            "previous": {
+                "totalTreatments": int(row.previous_treatments),
+                "averageCompliance": previous_rate,
+                "totalDoses": int(row.previous_doses),
+                "missedDoses": int(row.previous_missed),
+                "alerts": int(row.previous_alerts)
+            },
+            "changes": {
+                "totalTreatments": change(row.treatments, row.previous_treatments),
+                "totalDoses": change(row.doses, row.previous_doses),
+                "missedDoses": change(row.missed, row.previous_missed),
+                "alerts": change(row.alerts, row.previous_alerts)
+            },
+            "period": {
+                "start": start_date.isoformat(),
+                "end": date.today().isoformat(),
+                "previousStart": previous_start.isoformat()
+            }
+        }
+
+    async def get_hourly_patterns(self, caregiver_id: Optional[int], period: str = "30d") -> List[Dict[str, Any]]:
+        """
+        Cumplimiento real por hora local del paciente a partir de dose_records.
+
+        SQL agrupa por día y hora UTC de la dosis y zona del paciente; aquí
+        cada grupo se pasa a la hora local con el desfase de ese día (así
+        respeta el horario de verano). Las dosis pendientes no cuentan y el
+        cumplimiento es tomadas / (tomadas + omitidas).
+        """
+        since = datetime.combine(date.today() - timedelta(days=parse_period(period) - 1), time.min)
+        day = func.date(DoseRecord.scheduled_time).label("day")
+        hour = extract("hour", DoseRecord.scheduled_time).label("hour")
+
+        query = (
+            select(
+                day,
+                hour,
+                Patient.timezone,
+                func.count(DoseRecord.id).label("doses"),
+                func.coalesce(func.sum(case((DoseRecord.status == DoseStatus.TAKEN, 1), else_=0)), 0).label("taken"),
+                func.coalesce(func.sum(case((DoseRecord.status == DoseStatus.MISSED, 1), else_=0)), 0).label("missed")
+            )
+            .join(Patient, DoseRecord.patient_id == Patient.id)
+            .filter(
+                DoseRecord.scheduled_time >= since,
+                DoseRecord.status != DoseStatus.PENDING
+            )
+            .group_by(day, hour, Patient.timezone)
+        )
+        if caregiver_id is not None:
+            query = query.filter(Patient.caregiver_id == caregiver_id)
+
+        totals: Dict[int, List[int]] = {}
+        for row in (await self.db.execute(query)).all():
+            utc_start = datetime.combine(_as_date(row.day), time(int(row.hour)), tzinfo=timezone.utc)
+            local_hour = utc_start.astimezone(get_zone(row.timezone)).hour
+            counts = totals.setdefault(local_hour, [0, 0, 0])
+            counts[0] += int(row.doses)
+            counts[1] += int(row.taken)
+            counts[2] += int(row.missed)
+
+        patterns = []
+        for local_hour in sorted(totals):
+            doses, taken, missed = totals[local_hour]
+            resolved = taken + missed
+            patterns.append({
+                "hour": f"{local_hour:02d}:00",
+                "doses": doses,
+                "taken": taken,
+                "missed": missed,
+                "compliance": round(taken / resolved * 100, 1) if resolved else 0
+            })
+        return patterns
+
+    async def get_treatment_types(self, caregiver_id: Optional[int]) -> List[Dict[str, Any]]:
+        """Tratamientos por tipo según su duración (una consulta agregada)"""
+        query = select(
+            func.count(Treatment.id).label("total"),
+            func.coalesce(func.sum(case((Treatment.duration_days > 90, 1), else_=0)), 0).label("chronic"),
+            func.coalesce(func.sum(case((Treatment.duration_days <= 14, 1), else_=0)), 0).label("acute")
+        )
+        if caregiver_id is not None:
+            query = query.join(Patient, Treatment.patient_id == Patient.id).filter(
+                Patient.caregiver_id == caregiver_id
+            )
+
+        row = (await self.db.execute(query)).one()
+        chronic_count = int(row.chronic)
+        acute_count = int(row.acute)
+        preventive_count = int(row.total) - chronic_count - acute_count
+        total = int(row.total) or 1
+
+        return [
+            {
+                "type": "Crónicos",
+                "count": chronic_count,
+                "percentage": round((chronic_count / total) * 100)
+            },
+            {
+                "type": "Agudos",
+                "count": acute_count,
+                "percentage": round((acute_count / total) * 100)
+            },
+            {
+                "type": "Preventivos",
+                "count": preventive_count,
+                "percentage": round((preventive_count / total) * 100)
+            }
+        ]
+
+
+class ReportCache:
+    """
+    Cache de resultados de reportes por (endpoint, cuidador, período).
+
+    Cada cuidador tiene una versión de datos que los servicios incrementan
+    al escribir pacientes, tratamientos o alarmas (bump); una entrada solo
+    se usa si se calculó con la versión vigente, así que la invalidación es
+    exacta sin recorrer el cache. La vista global del admin (None) cambia
+    con cualquier escritura. El TTL acota la deriva por escrituras hechas
+    en otros procesos y el día forma parte de la llave porque los períodos
+    son relativos a hoy.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[Optional[int], int] = {}
+        self._global_version = 0
+
+    def version(self, caregiver_id: Optional[int]) -> Tuple[int, int]:
+        """Versión de los datos visibles para el cuidador"""
+        return self._global_version, self._versions.get(caregiver_id, 0)
+
+    async def get_or_compute(
+            self,
+            endpoint: str,
+            caregiver_id: Optional[int],
+            period: Optional[str],
+            compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Resultado en cache o calculado con `compute`"""
+        key: Hashable = (endpoint, caregiver_id, period, date.today())
+        # La versión se toma antes de calcular: si hay una escritura en
+        # medio, el resultado queda guardado con la versión vieja y se
+        # descarta en la siguiente lectura
+        version = self.version(caregiver_id)
+        entry = self._results.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        result = await compute()
+        self._results.set(key, (version, result))
+        return result
+
+    def bump(self, caregiver_id: Optional[int]):
+        """Marcar como cambiados los datos del cuidador (y la vista global)"""
+        if caregiver_id is not None:
+            self._versions[caregiver_id] = self._versions.get(caregiver_id, 0) + 1
+        self._versions[None] = self._versions.get(None, 0) + 1
+
+    def bump_all(self):
+        """Invalidar todo (p. ej. cambios en el catálogo de medicamentos)"""
+        self._global_version += 1
+
+    def clear(self):
+        """Vaciar el cache"""
+        self._results.clear()
+
+
+report_cache = ReportCache(
+    maxsize=settings.REPORT_CACHE_SIZE,
+    ttl=settings.REPORT_CACHE_TTL
+)
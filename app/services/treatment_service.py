@@ -1,27 +1,47 @@
 """
 Servicio de gestión de tratamientos
 """
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, delete, func
 from typing import List, Optional, Dict, Any
 from datetime import date, datetime, timedelta
 
+from app.core.access_index import access_index
 from app.models.treatment import Treatment, TreatmentStatus
 from app.models.medication import Medication
 from app.models.patient import Patient
 from app.models.alarm import Alarm
-from app.schemas.treatment import TreatmentCreate, TreatmentUpdate
+from app.models.activity_event import ActivityType
+from app.schemas.treatment import TreatmentCreate, TreatmentUpdate, DoseEvent, DoseEventCreate
+from app.services.activity_service import ActivityService
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.dose_schedule_service import schedule_changes
+from app.services.dose_service import DoseService
+from app.services.report_service import report_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _after_treatment_write(treatment_id: int, caregiver_id: Optional[int]):
+    """
+    Propagar una escritura ya confirmada de un tratamiento o sus alarmas:
+    rematerializar sus dosis (de ahí salen las próximas dosis) y descartar
+    los reportes del cuidador.
+    """
+    schedule_changes.treatment_changed(treatment_id)
+    if caregiver_id is not None:
+        report_cache.bump(caregiver_id)
+
+
 class TreatmentService:
     """Servicio completo para gestión de tratamientos"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_treatments_by_caregiver(
+    async def get_treatments_by_caregiver(
             self,
             caregiver_id: int,
             skip: int = 0,
@@ -35,7 +55,7 @@ class TreatmentService:
             logger.info(f"Obteniendo tratamientos para cuidador {caregiver_id}")
 
             # Query básico - necesitarás ajustar según tu estructura de DB
-            query = self.db.query(Treatment)
+            query = select(Treatment)
 
             # Filtros básicos
             if patient_id:
@@ -47,7 +67,8 @@ class TreatmentService:
             if medication_id:
                 query = query.filter(Treatment.medication_id == medication_id)
 
-            treatments = query.offset(skip).limit(limit).all()
+            result = await self.db.execute(query.offset(skip).limit(limit))
+            treatments = result.scalars().all()
             logger.info(f"Encontrados {len(treatments)} tratamientos")
             return treatments
 
@@ -55,25 +76,28 @@ class TreatmentService:
             logger.error(f"Error obteniendo tratamientos: {e}")
             return []
 
-    def medication_exists(self, medication_id: int) -> bool:
+    async def medication_exists(self, medication_id: int) -> bool:
         """Verificar si el medicamento existe"""
         try:
-            exists = self.db.query(Medication).filter(Medication.id == medication_id).first() is not None
+            exists = await self.db.get(Medication, medication_id) is not None
             logger.info(f"Medicamento {medication_id} existe: {exists}")
             return exists
         except Exception as e:
             logger.error(f"Error verificando medicamento {medication_id}: {e}")
             return False
 
-    def check_medication_conflicts(self, patient_id: int, medication_id: int) -> Optional[dict]:
+    async def check_medication_conflicts(self, patient_id: int, medication_id: int) -> Optional[dict]:
         """Verificar conflictos de medicamentos"""
         try:
             # Implementación básica - expandir según necesidades
             # Buscar tratamientos activos del paciente con medicamentos que podrían causar conflictos
-            active_treatments = self.db.query(Treatment).filter(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE
-            ).all()
+            result = await self.db.execute(
+                select(Treatment).filter(
+                    Treatment.patient_id == patient_id,
+                    Treatment.status == TreatmentStatus.ACTIVE
+                )
+            )
+            active_treatments = result.scalars().all()
 
             # Aquí podrías implementar lógica de verificación de interacciones
             # Por ahora devolvemos None (sin conflictos)
@@ -84,7 +108,19 @@ class TreatmentService:
             logger.error(f"Error verificando conflictos: {e}")
             return None
 
-    def create_treatment(self, treatment_data: TreatmentCreate, created_by_id: int) -> Treatment:
+    async def _notify_status_change(self, treatment: Treatment, old_status: Optional[TreatmentStatus]):
+        """Propagar alta o cambio de estado al snapshot del dashboard"""
+        if old_status == treatment.status:
+            return
+
+        caregiver_id = access_index.owner_of(treatment.patient_id)
+        if caregiver_id is None:
+            caregiver_id = await self.db.scalar(
+                select(Patient.caregiver_id).filter(Patient.id == treatment.patient_id)
+            )
+        dashboard_snapshots.treatment_status_changed(caregiver_id, old_status, treatment.status)
+
+    async def create_treatment(self, treatment_data: TreatmentCreate, created_by_id: int) -> Treatment:
         """Crear nuevo tratamiento"""
         try:
             logger.info(f"Creando tratamiento para paciente {treatment_data.patient_id}")
@@ -104,21 +140,35 @@ class TreatmentService:
             )
 
             self.db.add(db_treatment)
-            self.db.commit()
-            self.db.refresh(db_treatment)
+            await self.db.flush()
+            event = await ActivityService(self.db).record_treatment_event(
+                db_treatment.id, ActivityType.TREATMENT_CREATED, "Tratamiento iniciado", status="new"
+            )
+            await self.db.commit()
+            await self.db.refresh(db_treatment)
+            access_index.add_treatment(db_treatment.patient_id, db_treatment.id)
+            _after_treatment_write(db_treatment.id, event.caregiver_id if event else None)
+            await self._notify_status_change(db_treatment, None)
 
             logger.info(f"Tratamiento creado exitosamente: ID {db_treatment.id}")
             return db_treatment
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error creando tratamiento: {e}")
             raise e
 
-    def get_treatment_detail(self, treatment_id: int) -> Optional[Treatment]:
+    async def get_treatment_detail(self, treatment_id: int) -> Optional[Treatment]:
         """Obtener detalles de tratamiento"""
         try:
-            treatment = self.db.query(Treatment).filter(Treatment.id == treatment_id).first()
+            # Cargar relaciones por adelantado: no hay lazy load en sesiones async
+            result = await self.db.execute(
+                select(Treatment).options(
+                    selectinload(Treatment.patient),
+                    selectinload(Treatment.medication)
+                ).filter(Treatment.id == treatment_id)
+            )
+            treatment = result.scalars().first()
             if treatment:
                 logger.info(f"Tratamiento {treatment_id} encontrado")
             else:
@@ -128,10 +178,10 @@ class TreatmentService:
             logger.error(f"Error obteniendo detalles del tratamiento {treatment_id}: {e}")
             return None
 
-    def get_treatment_by_id(self, treatment_id: int) -> Optional[Treatment]:
+    async def get_treatment_by_id(self, treatment_id: int) -> Optional[Treatment]:
         """Obtener tratamiento por ID"""
         try:
-            treatment = self.db.query(Treatment).filter(Treatment.id == treatment_id).first()
+            treatment = await self.db.get(Treatment, treatment_id)
             if treatment:
                 logger.info(f"Tratamiento {treatment_id} obtenido")
             else:
@@ -141,17 +191,18 @@ class TreatmentService:
             logger.error(f"Error obteniendo tratamiento {treatment_id}: {e}")
             return None
 
-    def update_treatment(self, treatment_id: int, treatment_update: TreatmentUpdate) -> Optional[Treatment]:
+    async def update_treatment(self, treatment_id: int, treatment_update: TreatmentUpdate) -> Optional[Treatment]:
         """Actualizar tratamiento"""
         try:
             logger.info(f"Actualizando tratamiento {treatment_id}")
 
-            treatment = self.get_treatment_by_id(treatment_id)
+            treatment = await self.get_treatment_by_id(treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado para actualizar")
                 return None
 
             update_data = treatment_update.dict(exclude_unset=True)
+            old_status = treatment.status
 
             for field, value in update_data.items():
                 if hasattr(treatment, field):
@@ -161,71 +212,89 @@ class TreatmentService:
             # Actualizar timestamp de modificación
             treatment.updated_at = datetime.utcnow()
 
-            self.db.commit()
-            self.db.refresh(treatment)
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.TREATMENT_UPDATED, "Tratamiento actualizado"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self.db.refresh(treatment)
+            await self._notify_status_change(treatment, old_status)
 
             logger.info(f"Tratamiento {treatment_id} actualizado exitosamente")
             return treatment
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error actualizando tratamiento {treatment_id}: {e}")
             raise e
 
-    def cancel_treatment(self, treatment_id: int) -> bool:
+    async def cancel_treatment(self, treatment_id: int) -> bool:
         """Cancelar tratamiento"""
         try:
             logger.info(f"Cancelando tratamiento {treatment_id}")
 
-            treatment = self.get_treatment_by_id(treatment_id)
+            treatment = await self.get_treatment_by_id(treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado para cancelar")
                 return False
 
+            old_status = treatment.status
             treatment.status = TreatmentStatus.CANCELLED
             treatment.updated_at = datetime.utcnow()
-            self.db.commit()
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.TREATMENT_STATUS_CHANGED, "Tratamiento cancelado"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self._notify_status_change(treatment, old_status)
 
             logger.info(f"Tratamiento {treatment_id} cancelado exitosamente")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error cancelando tratamiento {treatment_id}: {e}")
             return False
 
-    def activate_treatment(self, treatment_id: int) -> bool:
+    async def activate_treatment(self, treatment_id: int) -> bool:
         """Activar tratamiento"""
         try:
             logger.info(f"Activando tratamiento {treatment_id}")
 
-            treatment = self.get_treatment_by_id(treatment_id)
+            treatment = await self.get_treatment_by_id(treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado para activar")
                 return False
 
+            old_status = treatment.status
             treatment.status = TreatmentStatus.ACTIVE
             treatment.updated_at = datetime.utcnow()
-            self.db.commit()
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.TREATMENT_STATUS_CHANGED, "Tratamiento activado"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self._notify_status_change(treatment, old_status)
 
             logger.info(f"Tratamiento {treatment_id} activado exitosamente")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error activando tratamiento {treatment_id}: {e}")
             return False
 
-    def suspend_treatment(self, treatment_id: int, reason: str) -> bool:
+    async def suspend_treatment(self, treatment_id: int, reason: str) -> bool:
         """Suspender tratamiento"""
         try:
             logger.info(f"Suspendiendo tratamiento {treatment_id} por: {reason}")
 
-            treatment = self.get_treatment_by_id(treatment_id)
+            treatment = await self.get_treatment_by_id(treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado para suspender")
                 return False
 
+            old_status = treatment.status
             treatment.status = TreatmentStatus.SUSPENDED
             # Agregar reason a notes
             if treatment.notes:
@@ -234,26 +303,32 @@ class TreatmentService:
                 treatment.notes = f"Suspendido: {reason}"
 
             treatment.updated_at = datetime.utcnow()
-            self.db.commit()
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.TREATMENT_STATUS_CHANGED, "Tratamiento suspendido"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self._notify_status_change(treatment, old_status)
 
             logger.info(f"Tratamiento {treatment_id} suspendido exitosamente")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error suspendiendo tratamiento {treatment_id}: {e}")
             return False
 
-    def complete_treatment(self, treatment_id: int, notes: Optional[str] = None) -> bool:
+    async def complete_treatment(self, treatment_id: int, notes: Optional[str] = None) -> bool:
         """Completar tratamiento"""
         try:
             logger.info(f"Completando tratamiento {treatment_id}")
 
-            treatment = self.get_treatment_by_id(treatment_id)
+            treatment = await self.get_treatment_by_id(treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado para completar")
                 return False
 
+            old_status = treatment.status
             treatment.status = TreatmentStatus.COMPLETED
             if notes:
                 if treatment.notes:
@@ -262,19 +337,24 @@ class TreatmentService:
                     treatment.notes = f"Completado: {notes}"
 
             treatment.updated_at = datetime.utcnow()
-            self.db.commit()
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.TREATMENT_STATUS_CHANGED, "Tratamiento completado"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self._notify_status_change(treatment, old_status)
 
             logger.info(f"Tratamiento {treatment_id} completado exitosamente")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error completando tratamiento {treatment_id}: {e}")
             return False
 
     # ===== MÉTODOS DE ALARMAS - IMPLEMENTACIÓN COMPLETA =====
 
-    def get_treatment_alarms(self, treatment_id: int) -> List[Dict]:
+    async def get_treatment_alarms(self, treatment_id: int) -> List[Dict]:
         """
         Obtener todas las alarmas de un tratamiento
         """
@@ -282,15 +362,18 @@ class TreatmentService:
             logger.info(f"Obteniendo alarmas para tratamiento {treatment_id}")
 
             # Verificar que el tratamiento existe
-            treatment = self.db.query(Treatment).filter(Treatment.id == treatment_id).first()
+            treatment = await self.db.get(Treatment, treatment_id)
             if not treatment:
                 logger.warning(f"Tratamiento {treatment_id} no encontrado")
                 return []
 
             # Obtener alarmas ordenadas por hora
-            alarms = self.db.query(Alarm).filter(
-                Alarm.treatment_id == treatment_id
-            ).order_by(Alarm.time).all()
+            result = await self.db.execute(
+                select(Alarm).filter(
+                    Alarm.treatment_id == treatment_id
+                ).order_by(Alarm.time)
+            )
+            alarms = result.scalars().all()
 
             result = []
             for alarm in alarms:
@@ -312,7 +395,7 @@ class TreatmentService:
             logger.error(f"Error obteniendo alarmas del tratamiento {treatment_id}: {e}")
             return []
 
-    def create_alarm(self, treatment_id: int, alarm_data: Dict) -> Dict:
+    async def create_alarm(self, treatment_id: int, alarm_data: Dict, record_activity: bool = True) -> Dict:
         """
         Crear una nueva alarma para un tratamiento
         """
@@ -320,7 +403,7 @@ class TreatmentService:
             logger.info(f"Creando alarma para tratamiento {treatment_id}: {alarm_data}")
 
             # Verificar que el tratamiento existe
-            treatment = self.db.query(Treatment).filter(Treatment.id == treatment_id).first()
+            treatment = await self.db.get(Treatment, treatment_id)
             if not treatment:
                 raise ValueError(f"Tratamiento {treatment_id} no encontrado")
 
@@ -347,8 +430,14 @@ class TreatmentService:
             )
 
             self.db.add(new_alarm)
-            self.db.commit()
-            self.db.refresh(new_alarm)
+            event = None
+            if record_activity:
+                event = await ActivityService(self.db).record_treatment_event(
+                    treatment_id, ActivityType.ALARM_CREATED, f"Alarma creada ({time_str})"
+                )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self.db.refresh(new_alarm)
 
             result = {
                 "id": new_alarm.id,
@@ -364,21 +453,24 @@ class TreatmentService:
             return result
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error creando alarma para tratamiento {treatment_id}: {e}")
             raise e
 
-    def update_alarm(self, treatment_id: int, alarm_id: int, alarm_data: Dict) -> Dict:
+    async def update_alarm(self, treatment_id: int, alarm_id: int, alarm_data: Dict) -> Dict:
         """
         Actualizar una alarma existente
         """
         try:
             logger.info(f"Actualizando alarma {alarm_id} del tratamiento {treatment_id}: {alarm_data}")
 
-            alarm = self.db.query(Alarm).filter(
-                Alarm.id == alarm_id,
-                Alarm.treatment_id == treatment_id
-            ).first()
+            result = await self.db.execute(
+                select(Alarm).filter(
+                    Alarm.id == alarm_id,
+                    Alarm.treatment_id == treatment_id
+                )
+            )
+            alarm = result.scalars().first()
 
             if not alarm:
                 raise ValueError(f"Alarma {alarm_id} no encontrada para el tratamiento {treatment_id}")
@@ -401,8 +493,12 @@ class TreatmentService:
             if "description" in alarm_data:
                 alarm.description = alarm_data["description"]
 
-            self.db.commit()
-            self.db.refresh(alarm)
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.ALARM_UPDATED, f"Alarma actualizada ({alarm.time})"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+            await self.db.refresh(alarm)
 
             result = {
                 "id": alarm.id,
@@ -418,38 +514,45 @@ class TreatmentService:
             return result
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error actualizando alarma {alarm_id}: {e}")
             raise e
 
-    def delete_alarm(self, treatment_id: int, alarm_id: int) -> bool:
+    async def delete_alarm(self, treatment_id: int, alarm_id: int) -> bool:
         """
         Eliminar una alarma específica
         """
         try:
             logger.info(f"Eliminando alarma {alarm_id} del tratamiento {treatment_id}")
 
-            alarm = self.db.query(Alarm).filter(
-                Alarm.id == alarm_id,
-                Alarm.treatment_id == treatment_id
-            ).first()
+            result = await self.db.execute(
+                select(Alarm).filter(
+                    Alarm.id == alarm_id,
+                    Alarm.treatment_id == treatment_id
+                )
+            )
+            alarm = result.scalars().first()
 
             if not alarm:
                 logger.warning(f"Alarma {alarm_id} no encontrada para el tratamiento {treatment_id}")
                 return False
 
-            self.db.delete(alarm)
-            self.db.commit()
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.ALARM_DELETED, f"Alarma eliminada ({alarm.time})"
+            )
+            await self.db.delete(alarm)
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
 
             logger.info(f"Alarma {alarm_id} eliminada exitosamente")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error eliminando alarma {alarm_id}: {e}")
             return False
 
-    def delete_all_treatment_alarms(self, treatment_id: int) -> bool:
+    async def delete_all_treatment_alarms(self, treatment_id: int) -> bool:
         """
         Eliminar todas las alarmas de un tratamiento
         """
@@ -457,28 +560,35 @@ class TreatmentService:
             logger.info(f"Eliminando todas las alarmas del tratamiento {treatment_id}")
 
             # Contar alarmas antes de eliminar
-            alarm_count = self.db.query(Alarm).filter(
-                Alarm.treatment_id == treatment_id
-            ).count()
+            alarm_count = await self.db.scalar(
+                select(func.count(Alarm.id)).filter(Alarm.treatment_id == treatment_id)
+            )
 
             logger.info(f"Encontradas {alarm_count} alarmas para eliminar")
 
             # Eliminar todas las alarmas
-            deleted_count = self.db.query(Alarm).filter(
-                Alarm.treatment_id == treatment_id
-            ).delete()
+            result = await self.db.execute(
+                delete(Alarm).filter(Alarm.treatment_id == treatment_id)
+            )
+            deleted_count = result.rowcount
+            caregiver_id = await self.db.scalar(
+                select(Patient.caregiver_id)
+                .join(Treatment, Treatment.patient_id == Patient.id)
+                .filter(Treatment.id == treatment_id)
+            )
 
-            self.db.commit()
+            await self.db.commit()
+            _after_treatment_write(treatment_id, caregiver_id)
 
             logger.info(f"Eliminadas {deleted_count} alarmas del tratamiento {treatment_id}")
             return True
 
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error eliminando alarmas del tratamiento {treatment_id}: {e}")
             return False
 
-    def sync_treatment_alarms(self, treatment_id: int, new_alarms: List[Dict]) -> List[Dict]:
+    async def sync_treatment_alarms(self, treatment_id: int, new_alarms: List[Dict]) -> List[Dict]:
         """
         Sincronizar alarmas de un tratamiento (eliminar existentes y crear nuevas)
         """
@@ -486,20 +596,27 @@ class TreatmentService:
             logger.info(f"Sincronizando {len(new_alarms)} alarmas para tratamiento {treatment_id}")
 
             # Paso 1: Eliminar alarmas existentes
-            self.delete_all_treatment_alarms(treatment_id)
+            await self.delete_all_treatment_alarms(treatment_id)
 
             # Paso 2: Crear nuevas alarmas
             created_alarms = []
             for i, alarm_data in enumerate(new_alarms):
                 try:
                     logger.info(f"Creando alarma {i+1}/{len(new_alarms)}: {alarm_data}")
-                    created_alarm = self.create_alarm(treatment_id, alarm_data)
+                    created_alarm = await self.create_alarm(treatment_id, alarm_data, record_activity=False)
                     created_alarms.append(created_alarm)
                 except Exception as alarm_error:
                     logger.error(f"Error creando alarma {i+1}: {alarm_error}")
                     # Continuar con las demás alarmas
                     continue
 
+            event = await ActivityService(self.db).record_treatment_event(
+                treatment_id, ActivityType.ALARM_UPDATED,
+                f"Horario de alarmas actualizado ({len(created_alarms)} alarmas)"
+            )
+            await self.db.commit()
+            _after_treatment_write(treatment_id, event.caregiver_id if event else None)
+
             logger.info(f"Sincronización completada: {len(created_alarms)}/{len(new_alarms)} alarmas creadas")
             return created_alarms
 
@@ -509,13 +626,14 @@ class TreatmentService:
 
     # ===== MÉTODOS AUXILIARES Y DE DEBUGGING =====
 
-    def debug_treatment_alarms(self, treatment_id: int) -> Dict:
+    async def debug_treatment_alarms(self, treatment_id: int) -> Dict:
         """
         Método de debugging para verificar el estado de las alarmas
         """
         try:
-            treatment = self.db.query(Treatment).filter(Treatment.id == treatment_id).first()
-            alarms = self.db.query(Alarm).filter(Alarm.treatment_id == treatment_id).all()
+            treatment = await self.db.get(Treatment, treatment_id)
+            result = await self.db.execute(select(Alarm).filter(Alarm.treatment_id == treatment_id))
+            alarms = result.scalars().all()
 
             return {
                 "treatment_exists": treatment is not None,
@@ -545,13 +663,16 @@ class TreatmentService:
 
     # ===== MÉTODOS EXISTENTES MANTENIDOS =====
 
-    def get_active_treatments_by_patient(self, patient_id: int) -> List[Treatment]:
+    async def get_active_treatments_by_patient(self, patient_id: int) -> List[Treatment]:
         """Obtener tratamientos activos del paciente"""
         try:
-            treatments = self.db.query(Treatment).filter(
-                Treatment.patient_id == patient_id,
-                Treatment.status == TreatmentStatus.ACTIVE
-            ).all()
+            result = await self.db.execute(
+                select(Treatment).filter(
+                    Treatment.patient_id == patient_id,
+                    Treatment.status == TreatmentStatus.ACTIVE
+                )
+            )
+            treatments = result.scalars().all()
             logger.info(f"Encontrados {len(treatments)} tratamientos activos para paciente {patient_id}")
             return treatments
         except Exception as e:
@@ -560,42 +681,43 @@ class TreatmentService:
 
     # ===== MÉTODOS PLACEHOLDER MANTENIDOS (para compatibilidad) =====
 
-    def get_dose_records(self, treatment_id: int, start_date=None, end_date=None):
+    async def get_dose_records(self, treatment_id: int, start_date=None, end_date=None):
         """Placeholder para registros de dosis"""
         logger.info(f"get_dose_records llamado para tratamiento {treatment_id} (placeholder)")
         return []
 
-    def record_dose(self, treatment_id: int, dose_data: dict):
-        """Placeholder para registrar dosis"""
-        logger.info(f"record_dose llamado para tratamiento {treatment_id} (placeholder)")
-        return {"message": "Función por implementar"}
+    async def record_dose(self, treatment_id: int, dose_data: DoseEventCreate) -> Dict[str, Any]:
+        """Registrar una dosis (el acceso al tratamiento ya se verificó)"""
+        event = DoseEvent(treatment_id=treatment_id, **dose_data.dict())
+        results = await DoseService(self.db).ingest([event], caregiver_id=None)
+        return results[0]
 
-    def get_compliance_report(self, treatment_id: int, days: int):
+    async def get_compliance_report(self, treatment_id: int, days: int):
         """Placeholder para reporte de cumplimiento"""
         logger.info(f"get_compliance_report llamado para tratamiento {treatment_id} (placeholder)")
         return {"message": "Función por implementar"}
 
-    def get_treatment_statistics(self, treatment_id: int):
+    async def get_treatment_statistics(self, treatment_id: int):
         """Placeholder para estadísticas"""
         logger.info(f"get_treatment_statistics llamado para tratamiento {treatment_id} (placeholder)")
         return {"message": "Función por implementar"}
 
-    def get_expiring_treatments(self, caregiver_id: int, days_ahead: int):
+    async def get_expiring_treatments(self, caregiver_id: int, days_ahead: int):
         """Placeholder para tratamientos que expiran"""
         logger.info(f"get_expiring_treatments llamado para cuidador {caregiver_id} (placeholder)")
         return []
 
-    def get_dashboard_summary(self, caregiver_id: int):
+    async def get_dashboard_summary(self, caregiver_id: int):
         """Placeholder para resumen del dashboard"""
         logger.info(f"get_dashboard_summary llamado para cuidador {caregiver_id} (placeholder)")
         return {"message": "Función por implementar"}
 
-    def create_bulk_treatments(self, treatments_data: list, created_by_id: int):
+    async def create_bulk_treatments(self, treatments_data: list, created_by_id: int):
         """Placeholder para creación en lote"""
         logger.info(f"create_bulk_treatments llamado (placeholder)")
         return {"success": [], "errors": []}
 
-    def get_compliance_analytics(self, caregiver_id: int, start_date=None, end_date=None, patient_id=None):
+    async def get_compliance_analytics(self, caregiver_id: int, start_date=None, end_date=None, patient_id=None):
         """Placeholder para análisis de cumplimiento"""
         logger.info(f"get_compliance_analytics llamado para cuidador {caregiver_id} (placeholder)")
         return {"message": "Función por implementar"}
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Utilidades de fecha y zona horaria
+"""
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Iterator, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """Zona horaria por nombre; usa DEFAULT_TIMEZONE (o UTC) si no es válida"""
+    for candidate in (name, settings.DEFAULT_TIMEZONE):
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return ZoneInfo("UTC")
+
+
+def parse_alarm_time(value: str) -> time:
+    """Convertir "HH:MM" en time"""
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
+
+
+def next_fire_time(
+        alarm_time: str,
+        zone_name: Optional[str],
+        after: datetime,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+) -> Optional[datetime]:
+    """
+    Siguiente disparo (en UTC) de una alarma diaria "HH:MM" en la zona del paciente.
+
+    Devuelve el primer instante estrictamente posterior a `after` dentro de
+    [start_date, end_date] (fechas locales del paciente), o None si el
+    tratamiento ya terminó.
+    """
+    zone = get_zone(zone_name)
+    fire_at = parse_alarm_time(alarm_time)
+    if after.tzinfo is None:
+        after = after.replace(tzinfo=timezone.utc)
+
+    local_day = after.astimezone(zone).date()
+    if start_date and local_day < start_date:
+        local_day = start_date
+
+    # Como máximo dos días: hoy si aún no pasa la hora, si no mañana
+    for _ in range(2):
+        if end_date and local_day > end_date:
+            return None
+        candidate = datetime.combine(local_day, fire_at, tzinfo=zone).astimezone(timezone.utc)
+        if candidate > after:
+            return candidate
+        local_day += timedelta(days=1)
+
+    return None
+
+
+def fire_times_between(
+        alarm_time: str,
+        zone_name: Optional[str],
+        after: datetime,
+        until: datetime,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+) -> Iterator[datetime]:
+    """Disparos (en UTC) de una alarma diaria en el intervalo (after, until]"""
+    fire_at = next_fire_time(alarm_time, zone_name, after, start_date, end_date)
+    while fire_at is not None and fire_at <= until:
+        yield fire_at
+        fire_at = next_fire_time(alarm_time, zone_name, fire_at, start_date, end_date)
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Fecha en UTC sin zona (como se guardan las dosis); sin zona se asume UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,71 @@
+"""
+Reglas de clasificación automática de medicamentos
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import unicodedata
+
+from app.models.medication import MedicationCategory
+
+
+@dataclass(frozen=True)
+class CategoryRule:
+    """Regla: si algún término aparece en los campos, asigna la categoría"""
+    category: MedicationCategory
+    keywords: Tuple[str, ...]
+    fields: Tuple[str, ...] = ("name", "generic_name", "brand_name")
+
+
+# Se evalúan en orden; gana la primera que coincide. La descripción se
+# revisa al final porque es texto libre y produce más falsos positivos.
+CATEGORY_RULES: Tuple[CategoryRule, ...] = (
+    CategoryRule(MedicationCategory.DIABETES, (
+        "metformina", "glibenclamida", "insulina", "glimepirida", "sitagliptina",
+        "dapagliflozina", "empagliflozina", "pioglitazona"
+    )),
+    CategoryRule(MedicationCategory.CARDIOVASCULAR, (
+        "enalapril", "losartan", "metoprolol", "amlodipino", "amlodipina", "captopril",
+        "valsartan", "atenolol", "carvedilol", "atorvastatina", "simvastatina",
+        "hidroclorotiazida", "furosemida", "clopidogrel", "warfarina"
+    )),
+    CategoryRule(MedicationCategory.ANTIBIOTIC, (
+        "amoxicilina", "azitromicina", "ciprofloxacino", "cefalexina", "claritromicina",
+        "doxiciclina", "levofloxacino", "trimetoprima", "nitrofurantoina", "penicilina"
+    )),
+    CategoryRule(MedicationCategory.ANALGESIC, (
+        "paracetamol", "acetaminofen", "ibuprofeno", "diclofenaco", "naproxeno",
+        "ketorolaco", "metamizol", "tramadol", "celecoxib"
+    )),
+    CategoryRule(MedicationCategory.CARDIOVASCULAR, ("hipertension", "antihipertensivo", "cardio"), ("description",)),
+    CategoryRule(MedicationCategory.DIABETES, ("diabetes", "glucosa", "hipoglucemiante"), ("description",)),
+    CategoryRule(MedicationCategory.ANTIBIOTIC, ("antibiotico", "infeccion bacteriana"), ("description",)),
+    CategoryRule(MedicationCategory.ANALGESIC, ("analgesico", "dolor", "antiinflamatorio"), ("description",)),
+)
+
+
+def _normalize(value: Optional[str]) -> str:
+    """Minúsculas y sin acentos ("Losartán" -> "losartan")"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def classify_medication(
+        name: str,
+        generic_name: Optional[str] = None,
+        brand_name: Optional[str] = None,
+        description: Optional[str] = None
+) -> MedicationCategory:
+    """Categoría según CATEGORY_RULES (OTHER si ninguna coincide)"""
+    values = {
+        "name": _normalize(name),
+        "generic_name": _normalize(generic_name),
+        "brand_name": _normalize(brand_name),
+        "description": _normalize(description)
+    }
+    for rule in CATEGORY_RULES:
+        text = " ".join(values[field] for field in rule.fields)
+        if any(keyword in text for keyword in rule.keywords):
+            return rule.category
+    return MedicationCategory.OTHER
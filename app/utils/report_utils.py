@@ -0,0 +1,121 @@
+"""
+Utilidades de renderizado de reportes en PDF
+"""
+from typing import List, Dict, Any
+import os
+import textwrap
+
+from jinja2 import Environment, FileSystemLoader
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "reports")
+
+# Carta, Courier 9pt: texto monoespaciado para que las tablas se alineen
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 50
+FONT_SIZE = 9
+LEADING = 12
+CHARS_PER_LINE = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING - 2  # reservar pie de página
+
+_environment = None
+
+
+def get_template_environment() -> Environment:
+    """Entorno Jinja2 de las plantillas de reportes (uno por proceso)"""
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=False
+        )
+    return _environment
+
+
+def _escape(text: str) -> bytes:
+    """Texto como literal de cadena PDF (WinAnsi)"""
+    raw = text.encode("cp1252", "replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _wrap(lines: List[str]) -> List[str]:
+    wrapped = []
+    for line in lines:
+        if len(line) <= CHARS_PER_LINE:
+            wrapped.append(line)
+        else:
+            wrapped.extend(textwrap.wrap(line, CHARS_PER_LINE, subsequent_indent="  ") or [""])
+    return wrapped
+
+
+def build_pdf(lines: List[str], title: str) -> bytes:
+    """
+    Documento PDF de texto paginado.
+
+    Usa la fuente estándar Courier (no se incrusta), así que no requiere
+    dependencias ni archivos de fuentes.
+    """
+    lines = _wrap(lines)
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+    # 1: catálogo, 2: árbol de páginas, 3: fuente, 4: info; después página + contenido
+    objects: List[bytes] = [b"", b"", b"", b""]
+    page_ids = []
+    for number, page_lines in enumerate(pages, start=1):
+        stream = [b"BT", f"/F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td".encode()]
+        for line in page_lines:
+            stream.append(b"(" + _escape(line) + b") Tj T*")
+        stream.append(b"ET")
+        footer = f"Página {number} de {len(pages)}"
+        stream.append(
+            f"BT /F1 {FONT_SIZE - 1} Tf {MARGIN} {MARGIN / 2:.0f} Td (".encode()
+            + _escape(footer) + b") Tj ET"
+        )
+        content = b"\n".join(stream)
+
+        content_id = len(objects) + 2
+        page_ids.append(len(objects) + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    objects[2] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"
+    objects[3] = b"<< /Title (" + _escape(title) + b") /Producer (PillCare 360) >>"
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{object_id} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(output)
+
+
+def render_pdf_report(report_type: str, rows: List[Dict[str, Any]], meta: Dict[str, Any], path: str):
+    """
+    Renderizar la plantilla `<report_type>.txt` y escribir el PDF en `path`.
+
+    Se ejecuta en un proceso de PdfRenderer, por eso recibe solo
+    datos serializables.
+    """
+    template = get_template_environment().get_template(f"{report_type}.txt")
+    text = template.render(rows=rows, meta=meta)
+    title = text.splitlines()[0] if text else report_type
+
+    with open(path, "wb") as f:
+        f.write(build_pdf(text.splitlines(), title))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark del detector de dosis omitidas (DoseService.mark_missed)
+
+Crea un cuidador temporal con pacientes, un tratamiento por paciente y N
+dosis PENDING vencidas repartidas entre ellos, mide cuánto tarda el
+detector en marcarlas como MISSED y elimina los datos al terminar. Usar
+contra una base de datos de pruebas, nunca contra producción.
+
+    python scripts/benchmark_missed_doses.py --rows 10000000 --patients 10000
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+from datetime import date, datetime, timedelta
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, insert, delete, func
+
+from app.core.config import get_settings
+from app.core.database import engine, AsyncSessionLocal, dispose_async_engine
+from app.models.alert import Alert
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import Medication, MedicationUnit
+from app.models.patient import Patient, Gender
+from app.models.treatment import Treatment, TreatmentStatus
+from app.models.user import User, UserRole
+from app.services.dose_service import DoseService
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+BATCH_SIZE = 10000
+BENCHMARK_EMAIL = "benchmark.missed-doses@pillcare.local"
+
+
+def create_fixtures(patients: int):
+    """Cuidador, medicamento y un tratamiento activo por paciente"""
+    cleanup()
+    today = date.today()
+    with engine.begin() as conn:
+        caregiver_id = conn.execute(insert(User).values(
+            email=BENCHMARK_EMAIL,
+            name="Benchmark",
+            hashed_password="!",
+            role=UserRole.CAREGIVER
+        )).inserted_primary_key[0]
+        medication_id = conn.execute(insert(Medication).values(
+            name="Benchmark",
+            dosage="1",
+            unit=MedicationUnit.tablets
+        )).inserted_primary_key[0]
+
+        conn.execute(insert(Patient), [
+            {
+                "name": f"Paciente {i}",
+                "email": f"bench-missed-{caregiver_id}-{i}@pillcare.local",
+                "phone": "5550000000",
+                "date_of_birth": date(1950, 1, 1),
+                "gender": Gender.OTHER,
+                "address": "N/A",
+                "emergency_contact": {"name": "N/A", "phone": "5550000000", "relationship": "N/A"},
+                "caregiver_id": caregiver_id
+            }
+            for i in range(patients)
+        ])
+        patient_ids = conn.execute(
+            select(Patient.id).filter(Patient.caregiver_id == caregiver_id).order_by(Patient.id)
+        ).scalars().all()
+
+        conn.execute(insert(Treatment), [
+            {
+                "patient_id": patient_id,
+                "medication_id": medication_id,
+                "created_by_id": caregiver_id,
+                "dosage": "1 tableta",
+                "frequency": 1,
+                "duration_days": 3650,
+                "start_date": today - timedelta(days=3650),
+                "end_date": today,
+                "status": TreatmentStatus.ACTIVE
+            }
+            for patient_id in patient_ids
+        ])
+        treatments = conn.execute(
+            select(Treatment.id, Treatment.patient_id)
+            .filter(Treatment.patient_id.in_(patient_ids))
+        ).all()
+
+    return caregiver_id, medication_id, treatments
+
+
+def seed_doses(treatments, rows: int, interval_hours: int):
+    """
+    Insertar `rows` dosis PENDING vencidas por lotes, una cada
+    `interval_hours` por tratamiento.
+
+    Empiezan antes de la ventana de alertas para medir solo el cambio de
+    estado (el caso de un backlog tras días con el job detenido).
+    """
+    newest = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(
+        hours=settings.MISSED_DOSE_ALERT_MAX_AGE_HOURS + 1
+    )
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            treatment_id, patient_id = treatments[i % len(treatments)]
+            batch.append({
+                "treatment_id": treatment_id,
+                "patient_id": patient_id,
+                "scheduled_time": newest - timedelta(hours=interval_hours * (i // len(treatments))),
+                "status": DoseStatus.PENDING
+            })
+            if len(batch) == BATCH_SIZE:
+                conn.execute(insert(DoseRecord), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(DoseRecord), batch)
+
+
+def cleanup():
+    """Eliminar los datos del benchmark"""
+    with engine.begin() as conn:
+        caregiver_id = conn.scalar(select(User.id).filter(User.email == BENCHMARK_EMAIL))
+        if caregiver_id is None:
+            return
+        patient_ids = select(Patient.id).filter(Patient.caregiver_id == caregiver_id).scalar_subquery()
+        medication_ids = conn.execute(
+            select(Treatment.medication_id).filter(Treatment.created_by_id == caregiver_id).distinct()
+        ).scalars().all()
+
+        conn.execute(delete(Alert).where(Alert.patient_id.in_(patient_ids)))
+        conn.execute(delete(ComplianceRecord).where(ComplianceRecord.patient_id.in_(patient_ids)))
+        conn.execute(delete(DoseRecord).where(DoseRecord.patient_id.in_(patient_ids)))
+        conn.execute(delete(Treatment).where(Treatment.created_by_id == caregiver_id))
+        conn.execute(delete(Patient).where(Patient.caregiver_id == caregiver_id))
+        conn.execute(delete(Medication).where(Medication.id.in_(medication_ids)))
+        conn.execute(delete(User).where(User.id == caregiver_id))
+
+
+async def run(rows: int, patients: int, interval_hours: int):
+    _, _, treatments = create_fixtures(patients)
+    try:
+        started = time.perf_counter()
+        seed_doses(treatments, rows, interval_hours)
+        logger.info(f"{rows} dosis insertadas en {time.perf_counter() - started:.1f}s")
+
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            marked = await DoseService(db).mark_missed()
+            elapsed = time.perf_counter() - started
+
+            remaining = await db.scalar(
+                select(func.count(DoseRecord.id)).filter(
+                    DoseRecord.patient_id.in_({patient_id for _, patient_id in treatments}),
+                    DoseRecord.status == DoseStatus.PENDING
+                )
+            )
+
+        logger.info(
+            f"{marked} dosis marcadas en {elapsed:.1f}s "
+            f"({marked / elapsed:,.0f} filas/s, lote {settings.MISSED_DOSE_BATCH_SIZE}); "
+            f"pendientes restantes: {remaining}"
+        )
+    finally:
+        cleanup()
+        await dispose_async_engine()
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Dosis vencidas a generar")
+    parser.add_argument("--patients", type=int, default=10000, help="Pacientes (un tratamiento cada uno)")
+    parser.add_argument("--interval-hours", type=int, default=8, help="Horas entre dosis de un tratamiento")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rows, args.patients, args.interval_hours))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark de /dashboard/patient-metrics: agregación en SQL vs. carga de pacientes
+
+Crea un cuidador temporal con N pacientes sintéticos (acumulando hasta cada
+tamaño pedido), mide ambas implementaciones y elimina los datos al terminar.
+Usar contra una base de datos de pruebas, nunca contra producción.
+
+    python scripts/benchmark_patient_metrics.py --sizes 1000 10000 100000 500000
+"""
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+from datetime import date, timedelta
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, insert, delete
+
+from app.core.database import engine, AsyncSessionLocal, dispose_async_engine
+from app.models.user import User, UserRole
+from app.models.patient import Patient, Gender
+from app.services.dashboard_service import (
+    DashboardService,
+    empty_patient_metrics,
+    add_patient_to_metrics
+)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+BENCHMARK_EMAIL = "benchmark.patient-metrics@pillcare.local"
+
+
+def create_caregiver() -> int:
+    """Crear el cuidador temporal del benchmark"""
+    with engine.begin() as conn:
+        conn.execute(delete(User).where(User.email == BENCHMARK_EMAIL))
+        result = conn.execute(insert(User).values(
+            email=BENCHMARK_EMAIL,
+            name="Benchmark",
+            hashed_password="!",
+            role=UserRole.CAREGIVER
+        ))
+        return result.inserted_primary_key[0]
+
+
+def seed_patients(caregiver_id: int, start: int, end: int):
+    """Insertar pacientes sintéticos [start, end) por lotes"""
+    genders = list(Gender)
+    today = date.today()
+
+    with engine.begin() as conn:
+        for batch_start in range(start, end, BATCH_SIZE):
+            rows = []
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, end)):
+                rows.append({
+                    "name": f"Paciente {i}",
+                    "email": f"bench-{caregiver_id}-{i}@pillcare.local",
+                    "phone": "5550000000",
+                    "date_of_birth": today - timedelta(days=random.randint(0, 95 * 365)),
+                    "gender": random.choice(genders),
+                    "address": "N/A",
+                    "emergency_contact": {"name": "N/A", "phone": "5550000000", "relationship": "N/A"},
+                    "medical_history": ["hipertensión"] if i % 3 == 0 else [],
+                    "allergies": ["penicilina"] if i % 7 == 0 else [],
+                    "caregiver_id": caregiver_id
+                })
+            conn.execute(insert(Patient), rows)
+
+
+def cleanup(caregiver_id: int):
+    """Eliminar los datos del benchmark"""
+    with engine.begin() as conn:
+        conn.execute(delete(Patient).where(Patient.caregiver_id == caregiver_id))
+        conn.execute(delete(User).where(User.id == caregiver_id))
+
+
+async def time_sql(caregiver_id: int, repeat: int):
+    """Implementación actual: GROUP BY en la base de datos"""
+    timings = []
+    metrics = None
+    async with AsyncSessionLocal() as db:
+        service = DashboardService(db)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            metrics = await service.get_patient_metrics(caregiver_id)
+            timings.append(time.perf_counter() - started)
+    return min(timings), metrics
+
+
+async def time_orm(caregiver_id: int, repeat: int):
+    """Implementación anterior: cargar todos los pacientes y contar en Python"""
+    timings = []
+    metrics = None
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            patients = (await db.execute(
+                select(Patient).filter(Patient.caregiver_id == caregiver_id)
+            )).scalars().all()
+            metrics = empty_patient_metrics()
+            today = date.today()
+            for patient in patients:
+                add_patient_to_metrics(metrics, patient, today)
+            timings.append(time.perf_counter() - started)
+            db.expunge_all()
+    return min(timings), metrics
+
+
+async def run(sizes, repeat: int, skip_orm: bool):
+    caregiver_id = create_caregiver()
+    seeded = 0
+    try:
+        logger.info(f"{'pacientes':>10} {'sql (ms)':>10} {'orm (ms)':>10}")
+        for size in sorted(sizes):
+            seed_patients(caregiver_id, seeded, size)
+            seeded = size
+
+            sql_time, sql_metrics = await time_sql(caregiver_id, repeat)
+            orm_ms = "-"
+            if not skip_orm:
+                orm_time, orm_metrics = await time_orm(caregiver_id, repeat)
+                if orm_metrics != sql_metrics:
+                    logger.error(f"❌ Resultados distintos: {sql_metrics} != {orm_metrics}")
+                orm_ms = f"{orm_time * 1000:.1f}"
+
+            logger.info(f"{size:>10} {sql_time * 1000:>10.1f} {orm_ms:>10}")
+    finally:
+        cleanup(caregiver_id)
+        await dispose_async_engine()
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=5, help="Mediciones por tamaño (se reporta la mejor)")
+    parser.add_argument("--skip-orm", action="store_true", help="No medir la implementación anterior")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.sizes, args.repeat, args.skip_orm))
+
+
+if __name__ == "__main__":
+    main()
@@ -61,7 +61,9 @@ def verify_tables():
 
     expected_tables = [
         'users', 'patients', 'medications', 'treatments',
-        'alarms', 'dose_records', 'alerts', 'compliance_records'
+        'alarms', 'dose_records', 'alerts', 'compliance_records',
+        'activity_events', 'report_jobs', 'medication_categories',
+        'job_watermarks', 'job_leases'
     ]
 
     logger.info("📋 Verificando tablas creadas:")
@@ -0,0 +1,167 @@
+"""
+Fixtures compartidas de las pruebas
+
+Cada prueba corre contra una base SQLite nueva en un directorio temporal
+(el mismo esquema que create_tables crea en MySQL).
+"""
+import os
+
+# La configuración exige estas variables al importar la aplicación
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+
+import json
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import app.core.database as database
+from app.core.access_index import access_index
+from app.core.security import create_access_token, principal_cache
+from app.models.medication import Medication, MedicationUnit
+from app.models.patient import Patient, Gender
+from app.models.treatment import Treatment
+from app.models.user import User, UserRole
+from app.services.alert_service import alert_events
+from app.services.dashboard_service import dashboard_snapshots
+from app.services.report_service import report_cache
+
+
+def _json_length(value):
+    """JSON_LENGTH de MySQL, usado por las métricas del dashboard"""
+    return None if value is None else len(json.loads(value))
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Los caches en memoria no deben sobrevivir a la base de cada prueba"""
+    yield
+    for cache in (access_index, principal_cache, dashboard_snapshots, report_cache):
+        cache.clear()
+    alert_events.drain()
+
+
+@pytest.fixture
+def engines(tmp_path, monkeypatch):
+    """Engines síncrono y asíncrono sobre una base SQLite con todas las tablas"""
+    path = tmp_path / "test.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    # Sin pool: las conexiones no quedan atadas al event loop de una prueba
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+
+    @event.listens_for(sync_engine, "connect")
+    def register_sync(connection, _):
+        connection.create_function("json_length", 1, _json_length)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def register_async(connection, _):
+        connection.run_async(lambda driver: driver.create_function("json_length", 1, _json_length))
+
+    monkeypatch.setattr(database, "engine", sync_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=sync_engine, autoflush=False))
+    monkeypatch.setattr(database, "async_engine", async_engine)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(
+        bind=async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    ))
+    database.create_tables()
+
+    yield SimpleNamespace(sync=sync_engine, async_=async_engine)
+    sync_engine.dispose()
+
+
+@pytest.fixture
+def sync_db(engines):
+    """Sesión síncrona para preparar datos"""
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest_asyncio.fixture
+async def db(engines):
+    """Sesión asíncrona para llamar a los servicios"""
+    async with database.AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def client(engines):
+    """Cliente HTTP de la aplicación (sin lifespan: no arranca los jobs)"""
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_treatment(sync_db):
+    """
+    Crear cuidador, paciente, medicamento y tratamiento activo; devuelve
+    sus ids y los headers de autenticación del cuidador.
+    """
+    count = 0
+
+    def factory(caregiver_id=None, timezone="UTC", start_date=None, days=30):
+        nonlocal count
+        count += 1
+        if caregiver_id is None:
+            caregiver = User(
+                email=f"cuidador{count}@example.com",
+                name=f"Cuidador {count}",
+                hashed_password="x",
+                role=UserRole.CAREGIVER
+            )
+            sync_db.add(caregiver)
+            sync_db.flush()
+            caregiver_id = caregiver.id
+
+        patient = Patient(
+            name=f"Paciente {count}",
+            email=f"paciente{count}@example.com",
+            phone="5551234567",
+            date_of_birth=date(1950, 1, 1),
+            gender=Gender.FEMALE,
+            address="Calle 1",
+            emergency_contact={"name": "Contacto", "phone": "5551234567", "relationship": "hija"},
+            caregiver_id=caregiver_id,
+            timezone=timezone
+        )
+        medication = Medication(name=f"Medicamento {count}", dosage="10", unit=MedicationUnit.mg)
+        sync_db.add_all([patient, medication])
+        sync_db.flush()
+
+        start_date = start_date or date.today() - timedelta(days=2)
+        treatment = Treatment(
+            patient_id=patient.id,
+            medication_id=medication.id,
+            created_by_id=caregiver_id,
+            dosage="1 tableta",
+            frequency=1,
+            duration_days=days,
+            start_date=start_date,
+            end_date=start_date + timedelta(days=days - 1)
+        )
+        sync_db.add(treatment)
+        sync_db.commit()
+
+        token = create_access_token({"sub": str(caregiver_id)})
+        return SimpleNamespace(
+            caregiver_id=caregiver_id,
+            patient_id=patient.id,
+            medication_id=medication.id,
+            treatment_id=treatment.id,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+    return factory
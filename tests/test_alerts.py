@@ -0,0 +1,139 @@
+"""
+Pruebas de la deduplicación de alertas (AlertService)
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select, update
+
+from app.models.alert import Alert, AlertType, AlertSeverity
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.services.alert_service import AlertService, MissedDose
+
+
+# Dos días UTC consecutivos (mediodía, para no cruzar la medianoche)
+YESTERDAY = datetime.combine(date.today() - timedelta(days=1), time(12))
+TODAY = YESTERDAY + timedelta(days=1)
+
+
+def _missed(sample, *scheduled_times):
+    doses = [
+        MissedDose(
+            treatment_id=sample.treatment_id,
+            patient_id=sample.patient_id,
+            caregiver_id=sample.caregiver_id,
+            scheduled_time=scheduled_time,
+            timezone="UTC",
+            medication_name="Enalapril",
+            dosage="1 tableta"
+        )
+        for scheduled_time in scheduled_times
+    ]
+    return {sample.treatment_id: doses}
+
+
+async def _alerts(db, type):
+    return (await db.execute(
+        select(Alert.dedupe_key, Alert.is_read).filter(Alert.type == type).order_by(Alert.id)
+    )).all()
+
+
+async def _mark_read(db):
+    await db.execute(update(Alert).values(is_read=True))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_missed_dose_alert_once_per_utc_day(db, make_treatment):
+    sample = make_treatment()
+    service = AlertService(db)
+
+    assert await service.generate(_missed(sample, YESTERDAY, YESTERDAY + timedelta(hours=2)), None) == 1
+    # Más omitidas del mismo día no generan otra, leída o no
+    assert await service.generate(_missed(sample, YESTERDAY + timedelta(hours=4)), None) == 0
+    await _mark_read(db)
+    assert await service.generate(_missed(sample, YESTERDAY + timedelta(hours=6)), None) == 0
+    assert await _alerts(db, AlertType.MISSED_DOSE) == [
+        (f"missed_dose:{sample.treatment_id}:{YESTERDAY.date().isoformat()}", True)
+    ]
+
+    # Al día siguiente se crea otra aunque la anterior siga sin leer
+    await db.execute(update(Alert).values(is_read=False))
+    await db.commit()
+    assert await service.generate(_missed(sample, TODAY), None) == 1
+    assert [key for key, _ in await _alerts(db, AlertType.MISSED_DOSE)] == [
+        f"missed_dose:{sample.treatment_id}:{YESTERDAY.date().isoformat()}",
+        f"missed_dose:{sample.treatment_id}:{TODAY.date().isoformat()}"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_dedupe_key_is_skipped(db, make_treatment):
+    sample = make_treatment()
+    row = {
+        "patient_id": sample.patient_id,
+        "treatment_id": sample.treatment_id,
+        "caregiver_id": sample.caregiver_id,
+        "type": AlertType.TREATMENT_END,
+        "dedupe_key": f"treatment_end:{sample.treatment_id}",
+        "severity": AlertSeverity.LOW,
+        "message": "El tratamiento termina hoy",
+        "is_read": False
+    }
+
+    # Dos workers que revisaron a la vez insertan la misma alerta
+    first, second = AlertService(db), AlertService(db)
+    assert await first._insert([dict(row)]) == 1
+    assert await second._insert([dict(row)]) == 0
+    await db.commit()
+
+    assert await db.scalar(select(func.count(Alert.id))) == 1
+    # Sin saber cuáles se omitieron, los contadores del cuidador se recalculan
+    assert second._stale == {sample.caregiver_id}
+
+
+@pytest.mark.asyncio
+async def test_low_compliance_alert_respects_cooldown(db, make_treatment):
+    sample = make_treatment()
+    today = date.today()
+    await db.execute(insert(ComplianceRecord), [
+        {
+            "patient_id": sample.patient_id,
+            "date": today - timedelta(days=days),
+            "scheduled_doses": 2,
+            "taken_doses": 0,
+            "missed_doses": 2,
+            "compliance_rate": 0.0
+        }
+        for days in range(3)
+    ])
+    await db.execute(insert(DoseRecord), [
+        {
+            "treatment_id": sample.treatment_id,
+            "patient_id": sample.patient_id,
+            "scheduled_time": datetime.utcnow() - timedelta(hours=hours),
+            "status": DoseStatus.MISSED
+        }
+        for hours in (2, 26)
+    ])
+    await db.commit()
+    service = AlertService(db)
+
+    assert await service.generate({}, {sample.patient_id}) == 1
+    assert await service.generate({}, {sample.patient_id}) == 0
+    # Leída dentro del cooldown tampoco se repite
+    await _mark_read(db)
+    assert await service.generate({}, None, sweep=True) == 0
+    assert len(await _alerts(db, AlertType.LOW_COMPLIANCE)) == 1
+
+
+@pytest.mark.asyncio
+async def test_treatment_end_alert_once(db, make_treatment):
+    sample = make_treatment(start_date=date.today() - timedelta(days=28))
+    service = AlertService(db)
+
+    assert await service.generate({}, None, sweep=True) == 1
+    await _mark_read(db)
+    assert await service.generate({}, None, sweep=True) == 0
+    assert await _alerts(db, AlertType.TREATMENT_END) == [(f"treatment_end:{sample.treatment_id}", True)]
@@ -0,0 +1,73 @@
+"""
+Pruebas del rollup incremental de cumplimiento (ComplianceService)
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select, update
+
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.services.compliance_service import ComplianceService
+
+# Días UTC con dosis, lejos de cualquier ventana "reciente"
+OLD_DAY = date.today() - timedelta(days=40)
+OTHER_DAY = date.today() - timedelta(days=20)
+
+
+async def _compliance(db):
+    rows = (await db.execute(
+        select(ComplianceRecord.date, ComplianceRecord.scheduled_doses, ComplianceRecord.taken_doses)
+        .order_by(ComplianceRecord.date)
+    )).all()
+    return [tuple(row) for row in rows]
+
+
+@pytest.fixture
+def sample(make_treatment):
+    # 02:00 UTC todavía es el día anterior en Ciudad de México
+    return make_treatment(timezone="America/Mexico_City")
+
+
+@pytest_asyncio.fixture
+async def doses(db, sample):
+    await db.execute(insert(DoseRecord), [
+        {
+            "treatment_id": sample.treatment_id,
+            "patient_id": sample.patient_id,
+            "scheduled_time": datetime.combine(day, time(2, minute)),
+            "status": DoseStatus.TAKEN,
+            "updated_at": datetime.combine(day, time(3))
+        }
+        for day in (OLD_DAY, OTHER_DAY)
+        for minute in (0, 30)
+    ])
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_first_rollup_rebuilds_by_utc_day(db, doses):
+    assert await ComplianceService(db).rollup() == 2
+    assert await _compliance(db) == [(OLD_DAY, 2, 2), (OTHER_DAY, 2, 2)]
+
+
+@pytest.mark.asyncio
+async def test_rollup_recomputes_only_touched_days(db, doses, sample):
+    service = ComplianceService(db)
+    await service.rollup(now=datetime.utcnow() - timedelta(hours=1))
+
+    # Una dosis antigua cambia (onupdate asigna updated_at) y otro día se
+    # altera a mano: solo el día de la dosis modificada se recalcula
+    await db.execute(
+        update(DoseRecord)
+        .where(DoseRecord.scheduled_time == datetime.combine(OLD_DAY, time(2)))
+        .values(status=DoseStatus.MISSED)
+    )
+    await db.execute(
+        update(ComplianceRecord).where(ComplianceRecord.date == OTHER_DAY).values(taken_doses=0)
+    )
+    await db.commit()
+
+    assert await service.rollup() == 1
+    assert await _compliance(db) == [(OLD_DAY, 2, 1), (OTHER_DAY, 2, 0)]
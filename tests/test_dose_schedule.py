@@ -0,0 +1,100 @@
+"""
+Pruebas de la materialización de dosis pendientes (DoseScheduleService)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models.alarm import Alarm
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.patient import Patient
+from app.services.alarm_service import UpcomingDoseService
+from app.services.dose_schedule_service import DoseScheduleService
+
+# 48 h de horizonte con una alarma diaria
+NOW = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+async def _doses(db):
+    rows = (await db.execute(
+        select(DoseRecord.scheduled_time, DoseRecord.status).order_by(DoseRecord.scheduled_time)
+    )).all()
+    return [(scheduled_time.strftime("%H:%M"), status) for scheduled_time, status in rows]
+
+
+@pytest.fixture
+def alarm_id(make_treatment, sync_db):
+    sample = make_treatment()
+    alarm = Alarm(treatment_id=sample.treatment_id, time="08:00")
+    sync_db.add(alarm)
+    sync_db.commit()
+    return alarm.id
+
+
+@pytest.mark.asyncio
+async def test_materialize_is_idempotent(db, alarm_id):
+    service = DoseScheduleService(db)
+
+    assert await service.materialize(now=NOW) == {"created": 2, "removed": 0}
+    assert await service.materialize(now=NOW) == {"created": 0, "removed": 0}
+    assert await _doses(db) == [("08:00", DoseStatus.PENDING)] * 2
+
+
+@pytest.mark.asyncio
+async def test_materialize_follows_alarm_changes(db, sync_db, alarm_id):
+    service = DoseScheduleService(db)
+    await service.materialize(now=NOW)
+
+    # El dispositivo registró la primera; luego la alarma cambia de hora
+    first = (await db.execute(select(DoseRecord.id).order_by(DoseRecord.scheduled_time))).scalars().first()
+    await db.execute(update(DoseRecord).where(DoseRecord.id == first).values(status=DoseStatus.TAKEN))
+    await db.commit()
+    sync_db.execute(update(Alarm).where(Alarm.id == alarm_id).values(time="09:30"))
+    sync_db.commit()
+
+    assert await service.materialize(now=NOW) == {"created": 2, "removed": 1}
+    # La dosis registrada no se toca; la pendiente obsoleta se reemplaza
+    assert await _doses(db) == [
+        ("08:00", DoseStatus.TAKEN),
+        ("09:30", DoseStatus.PENDING),
+        ("09:30", DoseStatus.PENDING)
+    ]
+    assert await service.materialize(now=NOW) == {"created": 0, "removed": 0}
+
+
+@pytest.mark.asyncio
+async def test_materialize_keeps_doses_inserted_concurrently(db, alarm_id, monkeypatch):
+    service = DoseScheduleService(db)
+    await service.materialize(now=NOW)
+    await db.execute(update(DoseRecord).values(status=DoseStatus.SNOOZED))
+    await db.commit()
+
+    # Una pasada concurrente que no vio las dosis existentes no las duplica
+    # ni las sobrescribe (la llave única las protege)
+    async def no_rows(*args):
+        return []
+
+    monkeypatch.setattr(service, "_load_future", no_rows)
+    await service.materialize(now=NOW)
+    assert await _doses(db) == [("08:00", DoseStatus.SNOOZED)] * 2
+
+
+@pytest.mark.asyncio
+async def test_upcoming_doses_read_materialized_calendar(db, make_treatment, alarm_id):
+    await DoseScheduleService(db).materialize(now=NOW)
+    service = UpcomingDoseService(db)
+    caregiver_id = (await db.execute(select(Patient.caregiver_id))).scalar()
+
+    upcoming = await service.get_upcoming(caregiver_id, limit=5, now=NOW)
+    assert [fire_at for fire_at, _ in upcoming] == [
+        NOW.replace(hour=8) + timedelta(days=1), NOW.replace(hour=8) + timedelta(days=2)
+    ]
+    assert await service.get_upcoming(caregiver_id, limit=1, now=NOW) == upcoming[:1]
+    # Lo ve cualquier worker y deja de aparecer en cuanto se registra
+    await db.execute(update(DoseRecord).where(DoseRecord.id == upcoming[0][1]["id"]).values(status=DoseStatus.TAKEN))
+    await db.commit()
+    assert await service.get_upcoming(None, limit=5, now=NOW) == upcoming[1:]
+
+    other = make_treatment()
+    assert await service.get_upcoming(other.caregiver_id, limit=5, now=NOW) == []
@@ -0,0 +1,89 @@
+"""
+Pruebas de los trabajos periódicos con varios workers
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.medication import Medication, MedicationCategory, MedicationCategoryAssignment
+from app.services import job_lease_service, medication_service
+from app.services.alert_service import alert_events
+from app.services.dose_service import DoseService
+from app.services.job_lease_service import JobLeaseService
+from app.services.medication_service import MedicationService
+
+
+@pytest.mark.asyncio
+async def test_lease_has_a_single_owner(db, engines, monkeypatch):
+    leases = JobLeaseService(db)
+    assert await leases.acquire("trabajo", 60)
+    # El dueño la renueva en cada ciclo
+    assert await leases.acquire("trabajo", 60)
+
+    monkeypatch.setattr(job_lease_service, "worker_id", lambda: "otro-host:2")
+    assert not await leases.acquire("trabajo", 60)
+    # Otros trabajos son independientes
+    assert await leases.acquire("otro_trabajo", 60)
+
+
+@pytest.mark.asyncio
+async def test_lease_taken_over_when_expired_or_released(db, engines, monkeypatch):
+    leases = JobLeaseService(db)
+    assert await leases.acquire("vence", 0)
+    assert await leases.acquire("liberada", 60)
+    await leases.release_all()
+
+    monkeypatch.setattr(job_lease_service, "worker_id", lambda: "otro-host:2")
+    assert await leases.acquire("vence", 60)
+    assert await leases.acquire("liberada", 60)
+
+
+@pytest.mark.asyncio
+async def test_mark_missed_publishes_each_dose_once(db, make_treatment):
+    sample = make_treatment()
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    await db.execute(insert(DoseRecord), [
+        {
+            "treatment_id": sample.treatment_id,
+            "patient_id": sample.patient_id,
+            "scheduled_time": now - timedelta(hours=hours),
+            "status": DoseStatus.PENDING
+        }
+        for hours in (2, 3)
+    ])
+    await db.commit()
+
+    assert await DoseService(db).mark_missed() == 2
+    missed_doses, patient_ids = alert_events.drain()
+    assert len(missed_doses[sample.treatment_id]) == 2
+
+    # Una segunda pasada (u otro worker) no vuelve a publicar las mismas
+    assert await DoseService(db).mark_missed() == 0
+    assert alert_events.drain() == ({}, set())
+    assert (await db.execute(select(DoseRecord.status))).scalars().all() == [DoseStatus.MISSED] * 2
+
+
+@pytest.mark.asyncio
+async def test_assign_missing_categories_tolerates_concurrent_worker(db, sync_db, make_treatment, monkeypatch):
+    make_treatment()
+    make_treatment()
+    first, second = sync_db.scalars(select(Medication.id).order_by(Medication.id)).all()
+
+    # Otro worker clasifica el primero entre la consulta y el insert
+    def classify(name, *args):
+        if name == "Medicamento 1" and sync_db.get(MedicationCategoryAssignment, first) is None:
+            sync_db.add(MedicationCategoryAssignment(
+                medication_id=first, category=MedicationCategory.OTHER, source="manual"
+            ))
+            sync_db.commit()
+        return MedicationCategory.OTHER
+
+    monkeypatch.setattr(medication_service, "classify_medication", classify)
+    assert await MedicationService(db).assign_missing_categories() == 1
+    assert (await db.execute(
+        select(MedicationCategoryAssignment.medication_id, MedicationCategoryAssignment.source)
+        .order_by(MedicationCategoryAssignment.medication_id)
+    )).all() == [(first, "manual"), (second, "rule")]
+    assert await MedicationService(db).assign_missing_categories() == 0
@@ -0,0 +1,159 @@
+"""
+Pruebas de períodos y buckets de los reportes
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.compliance import ComplianceRecord
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.models.report_job import ReportJob
+from app.services.report_service import (
+    ReportService, InvalidPeriodError, MAX_PERIOD_DAYS, parse_period, normalize_period,
+    bucket_granularity, bucket_start, bucket_range
+)
+
+
+@pytest.mark.parametrize("period, days", [
+    ("7d", 7),
+    ("30d", 30),
+    ("12w", 84),
+    ("6m", 180),
+    ("1y", 365),
+    (" 2W ", 14),
+    ("0d", 1),
+])
+def test_parse_period(period, days):
+    assert parse_period(period) == days
+
+
+@pytest.mark.parametrize("period", ["", None, "30", "d30", "3x", "-5d", "1.5w", "6y", "1826d", "99999y"])
+def test_parse_period_rejects_invalid_or_too_long(period):
+    with pytest.raises(InvalidPeriodError):
+        parse_period(period)
+
+
+def test_parse_period_accepts_maximum():
+    assert parse_period("5y") == MAX_PERIOD_DAYS
+    assert normalize_period(" 5Y ") == "5y"
+
+
+@pytest.mark.parametrize("url", [
+    "/api/reports/compliance/trend?period=99999y",
+    "/api/reports/stats/overview?period=abc",
+    "/api/reports/patterns/hourly?period=30",
+])
+def test_report_endpoints_reject_invalid_period(client, make_treatment, url):
+    sample = make_treatment()
+    response = client.get(url, headers=sample.headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("days, granularity", [
+    (1, "day"),
+    (90, "day"),
+    (91, "week"),
+    (365, "week"),
+    (366, "month"),
+    (730, "month"),
+])
+def test_bucket_granularity(days, granularity):
+    assert bucket_granularity(days) == granularity
+
+
+def test_bucket_start():
+    # 2024-05-16 es jueves
+    day = date(2024, 5, 16)
+    assert bucket_start(day, "day") == day
+    assert bucket_start(day, "week") == date(2024, 5, 13)
+    assert bucket_start(day, "month") == date(2024, 5, 1)
+
+
+def test_bucket_range():
+    assert bucket_range(date(2024, 5, 30), date(2024, 6, 1), "day") == [
+        date(2024, 5, 30), date(2024, 5, 31), date(2024, 6, 1)
+    ]
+    assert bucket_range(date(2024, 5, 16), date(2024, 5, 28), "week") == [
+        date(2024, 5, 13), date(2024, 5, 20), date(2024, 5, 27)
+    ]
+    assert bucket_range(date(2023, 12, 31), date(2024, 3, 1), "month") == [
+        date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("period, granularity", [("30d", "day"), ("6m", "week"), ("2y", "month")])
+async def test_compliance_trend_buckets(db, make_treatment, period, granularity):
+    sample = make_treatment()
+    today = date.today()
+    days = parse_period(period)
+    await db.execute(insert(ComplianceRecord), [
+        {
+            "patient_id": sample.patient_id,
+            "date": today - timedelta(days=offset),
+            "scheduled_doses": 2,
+            "taken_doses": 1,
+            "missed_doses": 1,
+            "compliance_rate": 50.0
+        }
+        for offset in range(days)
+    ])
+    await db.commit()
+
+    trend = await ReportService(db).get_compliance_trend(sample.caregiver_id, period)
+
+    # Los buckets que agrupa SQL coinciden con los que genera Python
+    start = today - timedelta(days=days - 1)
+    assert [point["date"] for point in trend] == [
+        bucket.isoformat() for bucket in bucket_range(start, today, granularity)
+    ]
+    assert {point["granularity"] for point in trend} == {granularity}
+    assert sum(point["doses"] for point in trend) == 2 * days
+    assert all(point["compliance"] == 50.0 for point in trend)
+
+
+@pytest.mark.asyncio
+async def test_hourly_patterns_use_patient_local_time(db, make_treatment):
+    mexico = make_treatment(timezone="America/Mexico_City")
+    utc = make_treatment(caregiver_id=mexico.caregiver_id, timezone="UTC")
+    # 14:00 UTC son las 08:00 en Ciudad de México (UTC-6, sin horario de verano)
+    scheduled = datetime.combine(date.today() - timedelta(days=1), time(14))
+    await db.execute(insert(DoseRecord), [
+        {
+            "treatment_id": sample.treatment_id,
+            "patient_id": sample.patient_id,
+            "scheduled_time": scheduled + timedelta(minutes=minutes),
+            "status": status
+        }
+        for sample in (mexico, utc)
+        for minutes, status in ((0, DoseStatus.TAKEN), (30, DoseStatus.MISSED))
+    ])
+    await db.commit()
+
+    patterns = await ReportService(db).get_hourly_patterns(mexico.caregiver_id, "7d")
+
+    assert [(point["hour"], point["doses"], point["compliance"]) for point in patterns] == [
+        ("08:00", 2, 50.0),
+        ("14:00", 2, 50.0)
+    ]
+
+
+def test_generate_report_validates_period(client, make_treatment, sync_db):
+    sample = make_treatment()
+
+    response = client.post(
+        "/api/reports/generate",
+        params={"report_type": "compliance", "period": "../../etc/passwd"},
+        headers=sample.headers
+    )
+    assert response.status_code == 400
+    assert sync_db.scalars(select(ReportJob)).all() == []
+
+    response = client.post(
+        "/api/reports/generate",
+        params={"report_type": "compliance", "period": " 7D "},
+        headers=sample.headers
+    )
+    assert response.status_code == 202
+    assert sync_db.scalars(select(ReportJob.period)).all() == ["7d"]
@@ -0,0 +1,103 @@
+"""
+Pruebas del registro de dosis en lote (/api/treatments/dose-records/batch)
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.api.treatments import settings
+from app.models.dose_record import DoseRecord, DoseStatus
+from app.services.alert_service import alert_events
+
+BATCH_URL = "/api/treatments/dose-records/batch"
+
+
+def _event(treatment_id, scheduled_time, status="taken", **extra):
+    return {"treatment_id": treatment_id, "scheduled_time": scheduled_time.isoformat(), "status": status, **extra}
+
+
+def _outcomes(response):
+    return [result["result"] for result in response.json()["results"]]
+
+
+def test_batch_creates_then_is_idempotent(client, make_treatment, sync_db):
+    sample = make_treatment()
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+    batch = {"events": [_event(sample.treatment_id, scheduled - timedelta(hours=hours)) for hours in range(3)]}
+
+    response = client.post(BATCH_URL, json=batch, headers=sample.headers)
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+    assert _outcomes(response) == ["created"] * 3
+
+    # Reenviar el mismo lote no duplica ni cambia nada
+    response = client.post(BATCH_URL, json=batch, headers=sample.headers)
+    assert _outcomes(response) == ["unchanged"] * 3
+    assert len(sync_db.scalars(select(DoseRecord)).all()) == 3
+
+
+def test_batch_updates_existing_dose(client, make_treatment, sync_db):
+    sample = make_treatment()
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+    client.post(BATCH_URL, json={"events": [_event(sample.treatment_id, scheduled, "snoozed")]}, headers=sample.headers)
+
+    response = client.post(
+        BATCH_URL,
+        json={"events": [_event(sample.treatment_id, scheduled, "taken", actual_time=scheduled.isoformat())]},
+        headers=sample.headers
+    )
+    assert _outcomes(response) == ["updated"]
+    dose = sync_db.scalars(select(DoseRecord)).one()
+    assert dose.status == DoseStatus.TAKEN
+    assert dose.actual_time is not None
+
+
+def test_batch_last_event_wins(client, make_treatment, sync_db):
+    sample = make_treatment()
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+    events = [_event(sample.treatment_id, scheduled, "snoozed"), _event(sample.treatment_id, scheduled, "taken")]
+
+    response = client.post(BATCH_URL, json={"events": events}, headers=sample.headers)
+    assert _outcomes(response) == ["superseded", "created"]
+    assert sync_db.scalars(select(DoseRecord.status)).all() == [DoseStatus.TAKEN]
+
+
+def test_batch_reports_errors_per_event(client, make_treatment, sync_db):
+    sample = make_treatment()
+    other = make_treatment()
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+    events = [
+        _event(sample.treatment_id, scheduled),
+        _event(other.treatment_id, scheduled),
+        _event(sample.treatment_id, scheduled - timedelta(hours=1), "pending"),
+        _event(999, scheduled)
+    ]
+
+    response = client.post(BATCH_URL, json={"events": events}, headers=sample.headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert _outcomes(response) == ["created", "error", "error", "error"]
+    assert body["results"][1]["error"] == "Tratamiento no encontrado"
+    assert body["results"][2]["error"].startswith("Estado no válido")
+    # Los errores no impiden guardar el resto del lote
+    assert sync_db.scalars(select(DoseRecord.treatment_id)).all() == [sample.treatment_id]
+
+
+def test_batch_missed_dose_publishes_alert_event(client, make_treatment):
+    sample = make_treatment()
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+
+    client.post(BATCH_URL, json={"events": [_event(sample.treatment_id, scheduled, "missed")]}, headers=sample.headers)
+    missed_doses, patient_ids = alert_events.drain()
+    assert [dose.treatment_id for dose in missed_doses[sample.caregiver_id]] == [sample.treatment_id]
+    assert patient_ids == {sample.patient_id}
+
+
+def test_batch_rejects_too_many_events(client, make_treatment, monkeypatch):
+    sample = make_treatment()
+    monkeypatch.setattr(settings, "DOSE_SYNC_MAX_EVENTS", 2)
+    scheduled = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=2)
+    events = [_event(sample.treatment_id, scheduled - timedelta(hours=hours)) for hours in range(3)]
+
+    response = client.post(BATCH_URL, json={"events": events}, headers=sample.headers)
+    assert response.status_code == 413